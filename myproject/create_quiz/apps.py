@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CreateQuizConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'create_quiz'
+
+    def ready(self):
+        from . import signals  # noqa: F401
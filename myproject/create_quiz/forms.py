@@ -1,16 +1,93 @@
+import re
+
 from django import forms
 from django.forms import BaseInlineFormSet, inlineformset_factory
-from myapp.models import Quiz, Question, Choice
+from myapp.answer_rules import check_rule
+from myapp.models import AcceptedAnswer, Quiz, Question, Choice
 
 QTYPE_CHOICES = Question._meta.get_field("qtype").choices
 
 class QuizForm(forms.ModelForm):
     class Meta:
         model = Quiz
-        fields = ["title", "description", "time_limit_minutes"]
+        fields = ["title", "description", "time_limit_minutes", "draw_count", "shuffle_questions", "shuffle_choices"]
+        widgets = {
+            "shuffle_questions": forms.CheckboxInput(attrs={"class": "form-check-input"}),
+            "shuffle_choices": forms.CheckboxInput(attrs={"class": "form-check-input"}),
+        }
+
+    # derive every attempt's layout (myapp.layout); changing them would
+    # re-order the questions of attempts already started
+    LAYOUT_FIELDS = ("draw_count", "shuffle_questions", "shuffle_choices")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.layout_locked = bool(self.instance.pk) and self.instance.attempts.exists()
+        if self.layout_locked:
+            for name in self.LAYOUT_FIELDS:
+                self.fields[name].disabled = True
+
+_RULE_PREFIX = re.compile(r"^(%s):\s*" % "|".join(k for k, _ in AcceptedAnswer.KIND_CHOICES))
+_TOLERANCE = re.compile(r"\s*(?:±|\+-|\+/-)\s*")
+
+
+def parse_accepted_answers(text):
+    """
+    Read accepted-answer rules written one per line as ``answer`` (a
+    normalized match), ``exact: answer``, ``numeric: 3.14 ± 0.01`` or
+    ``regex: pattern``. Returns ``[(kind, value, tolerance)]``.
+    """
+    rules, errors = [], []
+    for n, line in enumerate((text or "").splitlines(), 1):
+        line = line.strip()
+        if not line:
+            continue
+        match = _RULE_PREFIX.match(line)
+        kind = match.group(1) if match else AcceptedAnswer.KIND_NORMALIZED
+        value = line[match.end():] if match else line
+        tolerance = 0
+        if kind == AcceptedAnswer.KIND_NUMERIC:
+            value, *raw = _TOLERANCE.split(value, maxsplit=1)
+            raw = raw[0] if raw else ""
+            try:
+                tolerance = float(raw) if raw else 0
+            except ValueError:
+                errors.append(f"line {n}: the tolerance {raw!r} is not a number")
+                continue
+        try:
+            check_rule(kind, value, tolerance)
+        except ValueError as exc:
+            errors.append(f"line {n}: {exc}")
+            continue
+        rules.append((kind, value, tolerance))
+    if errors:
+        raise forms.ValidationError(errors)
+    return rules
+
+
+def format_accepted_answers(rules):
+    lines = []
+    for kind, value, tolerance in rules:
+        if kind == AcceptedAnswer.KIND_NORMALIZED:
+            lines.append(value)
+        elif kind == AcceptedAnswer.KIND_NUMERIC and tolerance:
+            lines.append(f"{kind}: {value} ± {tolerance:g}")
+        else:
+            lines.append(f"{kind}: {value}")
+    return "\n".join(lines)
+
 
 class QuestionForm(forms.ModelForm):
     qtype = forms.ChoiceField(choices=QTYPE_CHOICES, initial="short", required=True)
+    accepted_answers = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={"rows": 4, "class": "form-control font-monospace"}),
+        help_text=(
+            "Short answers only; one per line. A plain line matches ignoring case, spacing, "
+            "Thai/Arabic digits and mark order. Prefix with exact:, numeric: (e.g. numeric: 3.14 ± 0.01) "
+            "or regex: for other rules. Leave empty to grade by hand."
+        ),
+    )
 
     class Meta:
         model = Question
@@ -19,21 +96,54 @@ class QuestionForm(forms.ModelForm):
             "order": forms.HiddenInput(),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk and self.instance.qtype == "short" and not self.is_bound:
+            self.initial["accepted_answers"] = format_accepted_answers(
+                self.instance.accepted_answers.order_by("id").values_list("kind", "value", "tolerance")
+            )
+
+    def clean_accepted_answers(self):
+        return parse_accepted_answers(self.cleaned_data.get("accepted_answers"))
+
+    def save_accepted_answers(self, question):
+        """
+        Replace the accepted answers of ``question`` (none unless it is a
+        short question). Returns True when they changed.
+        """
+        rules = self.cleaned_data["accepted_answers"] if question.qtype == "short" else []
+        current = list(question.accepted_answers.order_by("id").values_list("kind", "value", "tolerance"))
+        if current == rules:
+            return False
+        question.accepted_answers.all().delete()
+        AcceptedAnswer.objects.bulk_create([
+            AcceptedAnswer(question=question, kind=kind, value=value, tolerance=tolerance)
+            for kind, value, tolerance in rules
+        ])
+        return True
+
+def validate_choices(qtype, choices):
+    """
+    Rules every question must satisfy, however it is created (formset or
+    import). ``choices`` is a list of ``(text, is_correct)``; blank texts
+    are ignored.
+    """
+    choices = [(text, is_correct) for text, is_correct in choices if text]
+    if qtype == "mcq":
+        if len(choices) < 2:
+            raise forms.ValidationError("at least 2 choices")
+        if sum(1 for _, is_correct in choices if is_correct) != 1:
+            raise forms.ValidationError("exactly one choice must be marked correct")
+
+
 class BaseChoiceInlineFormSet(BaseInlineFormSet):
     def clean(self):
         super().clean()
         choices = []
-        correct_count = 0
         for form in self.forms:
             if form.cleaned_data.get("DELETE", False):
                 continue
-            text = form.cleaned_data.get("text")
-            is_correct = form.cleaned_data.get("is_correct", False)
-            if not text:
-                continue
-            choices.append(text)
-            if is_correct:
-                correct_count += 1
+            choices.append((form.cleaned_data.get("text"), form.cleaned_data.get("is_correct", False)))
 
         qtype = None
         if hasattr(self.instance, "qtype") and getattr(self.instance, "qtype", None):
@@ -41,11 +151,7 @@ class BaseChoiceInlineFormSet(BaseInlineFormSet):
         else:
             qtype = getattr(self, "_parent_qtype", None)
 
-        if qtype == "mcq":
-            if len(choices) < 2:
-                raise forms.ValidationError("at least 2 choices")
-            if correct_count != 1:
-                raise forms.ValidationError("exactly one choice must be marked correct")
+        validate_choices(qtype, choices)
 
 
 def make_choice_formset(extra=0, can_delete=True):
@@ -57,3 +163,32 @@ def make_choice_formset(extra=0, can_delete=True):
         can_delete=can_delete,
         formset=BaseChoiceInlineFormSet
     )
+
+
+class QuestionImportForm(forms.Form):
+    FORMAT_CHOICES = [
+        ("", "Detect from file name"),
+        ("json", "JSON"),
+        ("jsonl", "JSON Lines"),
+        ("csv", "CSV"),
+        ("gift", "GIFT (Moodle)"),
+        ("aiken", "Aiken"),
+    ]
+
+    file = forms.FileField()
+    format = forms.ChoiceField(choices=FORMAT_CHOICES, required=False)
+    strict = forms.BooleanField(
+        required=False, help_text="Import nothing if any question has an error."
+    )
+
+    def clean(self):
+        cleaned = super().clean()
+        upload = cleaned.get("file")
+        if upload and not cleaned.get("format"):
+            from .importers import detect_format
+
+            fmt = detect_format(upload.name)
+            if fmt is None:
+                raise forms.ValidationError("Cannot tell the format from the file name; choose one.")
+            cleaned["format"] = fmt
+        return cleaned
@@ -0,0 +1,336 @@
+"""
+Bulk import of questions from files.
+
+Parsers turn a text stream into ``ImportedQuestion`` items one at a
+time. JSON is the exception: a JSON document has to be loaded whole, so
+use JSON Lines for very large banks. ``import_questions`` checks each
+item against the same rules as the question form (``validate_choices``)
+and writes the valid ones with batched ``bulk_create`` inside one
+transaction. It returns every item's error with its line number, plus
+the throughput.
+
+Supported formats:
+
+* ``json``/``jsonl`` - objects ``{"text", "type", "choices": [{"text", "correct"}]}``
+  (``choices`` may also be plain strings with an ``answer`` letter/number);
+* ``csv``   - header with ``text``, optional ``type``, ``answer`` and any
+  number of ``choice...`` columns;
+* ``gift``  - Moodle GIFT: multiple choice, true/false and essay questions;
+* ``aiken`` - ``A. ...`` options followed by ``ANSWER: X``.
+"""
+import csv
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+
+from django import forms
+from django.db import transaction
+
+from myapp.models import Quiz, Question, Choice
+from myapp.signals import quiz_content_changed
+from .forms import validate_choices
+from .ordering import GAP, next_order
+from .signals import schedule_reindex
+
+QUESTION_TYPES = {"mcq", "short"}
+CHOICE_MAX_LENGTH = Choice._meta.get_field("text").max_length
+
+
+@dataclass
+class ImportedQuestion:
+    line: int
+    text: str = ""
+    qtype: str = "mcq"
+    choices: list = field(default_factory=list)  # [(text, is_correct)]
+    error: str = None
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    errors: list = field(default_factory=list)  # [(line, message)]
+    seconds: float = 0.0
+    rolled_back: bool = False
+
+    @property
+    def questions_per_second(self):
+        return self.created / self.seconds if self.seconds else 0.0
+
+
+def detect_format(filename):
+    ext = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    return {"json": "json", "jsonl": "jsonl", "ndjson": "jsonl", "csv": "csv", "gift": "gift"}.get(ext)
+
+
+def _resolve_answer(answer, choice_texts):
+    """Index of the correct choice from a letter, a 1-based number or the choice text."""
+    answer = str(answer if answer is not None else "").strip()
+    if len(answer) == 1 and answer.isalpha():
+        return ord(answer.upper()) - ord("A")
+    if answer.isdigit():
+        return int(answer) - 1
+    return choice_texts.index(answer) if answer in choice_texts else None
+
+
+def _from_mapping(line, data):
+    if not isinstance(data, dict):
+        return ImportedQuestion(line, error="expected an object")
+    text = str(data.get("text") or data.get("question") or "").strip()
+    raw = data.get("choices") or []
+    qtype = str(data.get("type") or data.get("qtype") or ("mcq" if raw else "short")).lower()
+    if raw and all(isinstance(c, dict) for c in raw):
+        choices = [
+            (str(c.get("text", "")).strip(), bool(c.get("correct", c.get("is_correct", False))))
+            for c in raw
+        ]
+    else:
+        texts = [str(c).strip() for c in raw]
+        correct = _resolve_answer(data.get("answer"), texts)
+        choices = [(t, i == correct) for i, t in enumerate(texts)]
+    return ImportedQuestion(line, text, qtype, choices)
+
+
+def parse_json(stream):
+    try:
+        data = json.load(stream)
+    except ValueError as exc:
+        yield ImportedQuestion(1, error=f"invalid JSON: {exc}")
+        return
+    if isinstance(data, dict):
+        data = data.get("questions", [])
+    if not isinstance(data, list):
+        yield ImportedQuestion(1, error='expected a list or {"questions": [...]}')
+        return
+    for index, item in enumerate(data, start=1):
+        yield _from_mapping(index, item)  # "line" is the item's position
+
+
+def parse_jsonl(stream):
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield _from_mapping(line_no, json.loads(line))
+        except ValueError as exc:
+            yield ImportedQuestion(line_no, error=f"invalid JSON: {exc}")
+
+
+def parse_csv(stream):
+    reader = csv.reader(stream)
+    header = [h.strip().lower() for h in next(reader, [])]
+    text_col = next((i for i, h in enumerate(header) if h in ("text", "question")), None)
+    if text_col is None:
+        yield ImportedQuestion(1, error="missing a 'text' column")
+        return
+    type_col = next((i for i, h in enumerate(header) if h in ("type", "qtype")), None)
+    answer_col = next((i for i, h in enumerate(header) if h in ("answer", "correct")), None)
+    choice_cols = [i for i, h in enumerate(header) if h.startswith(("choice", "option"))]
+
+    for row in reader:
+        line_no = reader.line_num
+        if not any(cell.strip() for cell in row):
+            continue
+        row = row + [""] * (len(header) - len(row))
+        texts = [row[i].strip() for i in choice_cols if row[i].strip()]
+        correct = _resolve_answer(row[answer_col], texts) if answer_col is not None else None
+        qtype = row[type_col].strip().lower() if type_col is not None and row[type_col].strip() else (
+            "mcq" if texts else "short"
+        )
+        yield ImportedQuestion(line_no, row[text_col].strip(), qtype, [(t, i == correct) for i, t in enumerate(texts)])
+
+
+def _blocks(stream, comment=None):
+    """Yield ``(first_line_no, [lines])`` for blank-line separated blocks."""
+    block, start = [], None
+    for line_no, line in enumerate(stream, start=1):
+        line = line.rstrip("\r\n")
+        if comment and line.lstrip().startswith(comment):
+            continue
+        if line.strip():
+            if start is None:
+                start = line_no
+            block.append(line)
+        elif block:
+            yield start, block
+            block, start = [], None
+    if block:
+        yield start, block
+
+
+_GIFT_SPECIAL = re.compile(r"\\([~=#{}:n])")
+_GIFT_MARKER = re.compile(r"(?<!\\)[=~]")
+
+
+def _gift_unescape(text):
+    return _GIFT_SPECIAL.sub(lambda m: "\n" if m.group(1) == "n" else m.group(1), text).strip()
+
+
+def _gift_find(text, char, start=0):
+    i = start
+    while True:
+        i = text.find(char, i)
+        if i <= 0 or text[i - 1] != "\\":
+            return i
+        i += 1
+
+
+def _parse_gift_block(line_no, lines):
+    text = " ".join(line.strip() for line in lines)
+    if text.startswith("$CATEGORY:"):
+        return None
+    text = re.sub(r"^::.*?(?<!\\)::", "", text).strip()  # optional ::title::
+    text = re.sub(r"^\[(html|moodle|plain|markdown)\]", "", text).strip()
+    open_at = _gift_find(text, "{")
+    close_at = _gift_find(text, "}", open_at + 1) if open_at >= 0 else -1
+    if open_at < 0 or close_at < 0:
+        return ImportedQuestion(line_no, error="missing {answer} block")
+    stem = text[:open_at].strip()
+    tail = text[close_at + 1:].strip()
+    body = text[open_at + 1:close_at].strip()
+    question = _gift_unescape(f"{stem} _____ {tail}" if tail else stem)
+
+    if not body:
+        return ImportedQuestion(line_no, question, "short")  # essay
+    if body.startswith("#") or "->" in body:
+        return ImportedQuestion(line_no, question, error="numeric and matching questions are not supported")
+    if body.split("#")[0].strip().upper() in ("T", "TRUE", "F", "FALSE"):
+        truth = body.split("#")[0].strip().upper().startswith("T")
+        return ImportedQuestion(line_no, question, "mcq", [("True", truth), ("False", not truth)])
+
+    marks = [m.start() for m in _GIFT_MARKER.finditer(body)]
+    answers = []
+    for start, end in zip(marks, marks[1:] + [len(body)]):
+        raw = body[start + 1:end]
+        feedback = _gift_find(raw, "#")
+        if feedback >= 0:
+            raw = raw[:feedback]
+        weight = re.match(r"\s*%(-?\d+(?:\.\d+)?)%", raw)
+        correct = body[start] == "=" or bool(weight and float(weight.group(1)) >= 100)
+        if weight:
+            raw = raw[weight.end():]
+        answers.append((_gift_unescape(raw), correct))
+    if answers and all(correct for _, correct in answers) and len(answers) == sum(
+        1 for m in marks if body[m] == "="
+    ):
+        # "{=a =b}" is a GIFT short-answer question; answers are free text here
+        return ImportedQuestion(line_no, question, "short")
+    return ImportedQuestion(line_no, question, "mcq", answers)
+
+
+def parse_gift(stream):
+    for line_no, lines in _blocks(stream, comment="//"):
+        item = _parse_gift_block(line_no, lines)
+        if item is not None:
+            yield item
+
+
+_AIKEN_OPTION = re.compile(r"^([A-Z])\s*[.)]\s+(.*)$")
+_AIKEN_ANSWER = re.compile(r"^ANSWER\s*:\s*([A-Z])\s*$", re.IGNORECASE)
+
+
+def parse_aiken(stream):
+    stem, options, start = [], [], None
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        if start is None:
+            start = line_no
+        answer = _AIKEN_ANSWER.match(line)
+        option = _AIKEN_OPTION.match(line)
+        if answer:
+            letters = [letter for letter, _ in options]
+            picked = answer.group(1).upper()
+            if picked not in letters:
+                yield ImportedQuestion(start, " ".join(stem), error=f"answer {picked} is not one of the options")
+            else:
+                yield ImportedQuestion(start, " ".join(stem), "mcq", [(t, l == picked) for l, t in options])
+            stem, options, start = [], [], None
+        elif option and stem:
+            options.append((option.group(1), option.group(2).strip()))
+        elif options:
+            yield ImportedQuestion(start, " ".join(stem), error="missing ANSWER: line")
+            stem, options, start = [line], [], line_no
+        else:
+            stem.append(line)
+    if stem or options:
+        yield ImportedQuestion(start, " ".join(stem), error="missing ANSWER: line")
+
+
+PARSERS = {
+    "json": parse_json,
+    "jsonl": parse_jsonl,
+    "csv": parse_csv,
+    "gift": parse_gift,
+    "aiken": parse_aiken,
+}
+
+
+def check(item):
+    """Raise ``forms.ValidationError`` if ``item`` cannot be imported."""
+    if item.error:
+        raise forms.ValidationError(item.error)
+    if not item.text:
+        raise forms.ValidationError("question text is empty")
+    if item.qtype not in QUESTION_TYPES:
+        raise forms.ValidationError(f"unknown question type {item.qtype!r}")
+    if any(len(text) > CHOICE_MAX_LENGTH for text, _ in item.choices):
+        raise forms.ValidationError(f"choice text longer than {CHOICE_MAX_LENGTH} characters")
+    validate_choices(item.qtype, item.choices)
+
+
+def _insert(quiz, items, first_order):
+    questions = Question.objects.bulk_create([
+        Question(quiz=quiz, text=item.text, qtype=item.qtype, order=first_order + i * GAP)
+        for i, item in enumerate(items)
+    ])
+    Choice.objects.bulk_create([
+        Choice(question=question, text=text, is_correct=is_correct)
+        for question, item in zip(questions, items) if item.qtype == "mcq"
+        for text, is_correct in item.choices if text
+    ])
+
+
+def import_questions(quiz, items, batch_size=500, strict=False):
+    """
+    Append the valid ``items`` to ``quiz``, ``batch_size`` questions per
+    INSERT. With ``strict`` nothing is saved if any item is invalid.
+    """
+    result = ImportResult()
+    started = time.perf_counter()
+    with transaction.atomic():
+        # lock the quiz so concurrent imports do not interleave orders
+        Quiz.objects.select_for_update().filter(pk=quiz.pk).exists()
+        order = next_order(quiz)
+        batch = []
+        for item in items:
+            try:
+                check(item)
+            except forms.ValidationError as exc:
+                result.errors.append((item.line, "; ".join(exc.messages)))
+                continue
+            batch.append(item)
+            if len(batch) >= batch_size:
+                _insert(quiz, batch, order)
+                order += len(batch) * GAP
+                result.created += len(batch)
+                batch = []
+        if batch:
+            _insert(quiz, batch, order)
+            result.created += len(batch)
+
+        if strict and result.errors:
+            transaction.set_rollback(True)
+            result.created, result.rolled_back = 0, True
+        elif result.created:
+            # bulk_create skips post_save: refresh cached snapshots and search
+            quiz_content_changed.send(sender=Quiz, quiz_id=quiz.pk)
+            schedule_reindex(quiz.pk)
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def import_file(quiz, stream, fmt, **kwargs):
+    return import_questions(quiz, PARSERS[fmt](stream), **kwargs)
@@ -0,0 +1,267 @@
+"""
+Item analysis (classical test theory) for a quiz's multiple-choice items.
+
+Everything is derived from a few running sums over graded attempts,
+where ``S[a, j]`` is 1 when attempt ``a`` was shown item ``j`` (a quiz
+with ``draw_count`` shows each attempt only part of its items, see
+``myapp.layout``), ``X[a, j]`` is 1 when it answered item ``j``
+correctly and ``T[a] = sum_j X[a, j]``. Per item, over the attempts
+shown it:
+
+    n_j = sum_a S[a, j], sum_a X[a, j], sum_a X[a, j] * T[a],
+    sum_a S[a, j] * T[a], sum_a S[a, j] * T[a]**2,
+
+plus the number of times each choice was selected.
+
+These are computed with NumPy from one query over the finished attempts
+and one streamed query over ``Answer``. They are cached per quiz content
+version and updated in place as ``take_quiz.grading`` grades attempts,
+without querying the database again. On read, a cheap COUNT of finished
+attempts checks the sums. If it disagrees (cache eviction, a lost
+concurrent update, a rolled-back submit), the sums are rebuilt from
+scratch.
+
+Reported per item, over the attempts shown it: the p-value
+(difficulty), the corrected point-biserial discrimination (item vs. rest
+of test), and the selection rate of every choice. Also reported per
+quiz: Cronbach's alpha, when every attempt was shown every item (it is
+undefined for a pooled quiz).
+"""
+from itertools import chain
+from typing import NamedTuple
+
+import numpy as np
+from django.core.cache import cache
+
+from myapp.answer_key import get_answer_key
+from myapp.layout import draw_question_ids
+from myapp.models import Attempt, Answer
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class ChoiceStats(NamedTuple):
+    choice_id: int
+    text: str
+    is_correct: bool
+    rate: float
+
+
+class ItemStats(NamedTuple):
+    question_id: int
+    text: str
+    # attempts shown the item
+    shown: int
+    p_value: float  # None when no attempt was shown the item
+    discrimination: float  # None when undefined (no variance)
+    unanswered_rate: float
+    choices: tuple
+
+
+class QuizAnalysis(NamedTuple):
+    quiz_id: int
+    attempt_count: int
+    alpha: float  # None when undefined
+    items: tuple
+
+
+class _Layout:
+    """Column layout of a quiz's MCQ items, derived from its answer key."""
+
+    def __init__(self, key):
+        self.positions = [i for i, t in enumerate(key.qtypes) if t == "mcq"]
+        self.question_ids = np.array([key.question_ids[i] for i in self.positions], dtype=np.int64)
+        # 0 never matches a stored choice id, so items without a key never score
+        self.correct = np.array([key.correct_choice_ids[i] or 0 for i in self.positions], dtype=np.int64)
+        self.choice_ids = np.array(
+            [cid for i in self.positions for cid in key.choice_ids[i]], dtype=np.int64
+        )
+        self.choice_item = np.array(
+            [j for j, i in enumerate(self.positions) for _ in key.choice_ids[i]], dtype=np.int64
+        )
+        self._q_order = np.argsort(self.question_ids)
+        self._c_order = np.argsort(self.choice_ids)
+
+    @property
+    def k(self):
+        return len(self.positions)
+
+    def _lookup(self, values, sorted_ids_order, ids):
+        if not len(ids):
+            return np.zeros(len(values), dtype=bool), np.zeros(len(values), dtype=np.int64)
+        sorted_ids = ids[sorted_ids_order]
+        pos = np.minimum(np.searchsorted(sorted_ids, values), len(ids) - 1)
+        return sorted_ids[pos] == values, sorted_ids_order[pos]
+
+    def empty_stats(self):
+        return {
+            "n": 0,
+            "shown": np.zeros(self.k, dtype=np.int64),
+            "correct": np.zeros(self.k, dtype=np.int64),
+            "cross": np.zeros(self.k, dtype=np.int64),
+            "total": np.zeros(self.k, dtype=np.int64),
+            "total_sq": np.zeros(self.k, dtype=np.int64),
+            "choice_counts": np.zeros(len(self.choice_ids), dtype=np.int64),
+        }
+
+    def shown(self, key, quiz, attempts):
+        """
+        ``S`` for ``attempts``, an iterable of ``(seed, question_ids)`` as
+        stored on ``Attempt``: the questions each attempt drew.
+        """
+        attempts = list(attempts)
+        S = np.ones((len(attempts), self.k), dtype=bool)
+        column = {qid: j for j, qid in enumerate(self.question_ids.tolist())}
+        for a, (seed, question_ids) in enumerate(attempts):
+            if question_ids is None and not quiz.draw_count:
+                continue
+            S[a] = False
+            S[a, [column[qid] for qid in draw_question_ids(key, quiz, seed, question_ids) if qid in column]] = True
+        return S
+
+    def accumulate(self, stats, attempt_ids, S, responses):
+        """
+        Add a batch of attempts to ``stats``: ``attempt_ids`` and their
+        ``S`` rows (see ``shown``), and ``responses``, an (r, 3) int array
+        of (attempt_id, question_id, selected_choice_id) rows. Items shown
+        without a row count as wrong; items not shown do not count.
+        """
+        attempt_ids = np.asarray(attempt_ids, dtype=np.int64)
+        stats["n"] += len(attempt_ids)
+        if not len(attempt_ids) or not self.k:
+            return stats
+        X = np.zeros((len(attempt_ids), self.k), dtype=np.int64)
+        if len(responses):
+            resp_attempts, question_ids, choices = responses.T
+            known, item = self._lookup(question_ids, self._q_order, self.question_ids)
+            in_batch, row = self._lookup(resp_attempts, np.argsort(attempt_ids), attempt_ids)
+            known &= in_batch
+            row, item, choices = row[known], item[known], choices[known]
+            shown = S[row, item]
+            row, item, choices = row[shown], item[shown], choices[shown]
+            hit = choices == self.correct[item]
+            X[row[hit], item[hit]] = 1
+            valid, choice_index = self._lookup(choices, self._c_order, self.choice_ids)
+            stats["choice_counts"] += np.bincount(choice_index[valid], minlength=len(self.choice_ids))
+        S = S.astype(np.int64)
+        X *= S
+        T = X.sum(axis=1)
+        stats["shown"] += S.sum(axis=0)
+        stats["correct"] += X.sum(axis=0)
+        stats["cross"] += X.T @ T
+        stats["total"] += S.T @ T
+        stats["total_sq"] += S.T @ (T * T)
+        return stats
+
+
+def cache_key(quiz_id, version):
+    # "item_stats": the per-item sums replaced the per-quiz ones of "item_analysis"
+    return f"item_stats:{quiz_id}:{version}"
+
+
+def _responses(quiz_id):
+    rows = (
+        Answer.objects.filter(
+            attempt__quiz_id=quiz_id,
+            attempt__finished_at__isnull=False,
+            selected_choice__isnull=False,
+        )
+        .values_list("attempt_id", "question_id", "selected_choice_id")
+        .iterator(chunk_size=10_000)
+    )
+    return np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, 3)
+
+
+def compute_stats(quiz):
+    """Rebuild the running sums of ``quiz`` from the database and cache them."""
+    key = get_answer_key(quiz)
+    layout = _Layout(key)
+    attempts = list(
+        Attempt.objects.filter(quiz=quiz, finished_at__isnull=False).values_list("pk", "seed", "question_ids")
+    )
+    S = layout.shown(key, quiz, ((seed, qids) for _, seed, qids in attempts))
+    stats = layout.accumulate(layout.empty_stats(), [pk for pk, _, _ in attempts], S, _responses(quiz.pk))
+    cache.set(cache_key(quiz.pk, key.version), stats, CACHE_TIMEOUT)
+    return stats
+
+
+def record_graded(attempts, selected):
+    """
+    Fold freshly graded ``attempts`` into cached sums, if any. ``selected``
+    maps attempt id to ``{question_id: choice_id}``, as read by
+    ``grade_stored``. Costs no query.
+    """
+    by_quiz = {}
+    for attempt in attempts:
+        by_quiz.setdefault(attempt.quiz_id, []).append(attempt)
+    for group in by_quiz.values():
+        quiz = group[0].quiz
+        key = get_answer_key(quiz)
+        ckey = cache_key(key.quiz_id, key.version)
+        stats = cache.get(ckey)
+        if stats is None:
+            continue
+        layout = _Layout(key)
+        responses = np.array(
+            [(a.pk, qid, cid) for a in group for qid, cid in selected.get(a.pk, {}).items()],
+            dtype=np.int64,
+        ).reshape(-1, 3)
+        S = layout.shown(key, quiz, ((a.seed, a.question_ids) for a in group))
+        cache.set(ckey, layout.accumulate(stats, [a.pk for a in group], S, responses), CACHE_TIMEOUT)
+
+
+def summarize(key, stats):
+    layout = _Layout(key)
+    n = stats["n"]
+    if n == 0 or layout.k == 0:
+        return QuizAnalysis(key.quiz_id, n, None, ())
+
+    shown = stats["shown"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = stats["correct"] / shown
+        var_item = p * (1 - p)
+        mean_total = stats["total"] / shown
+        var_total = stats["total_sq"] / shown - mean_total ** 2
+        cov_total = stats["cross"] / shown - p * mean_total
+        # correlate each item with the rest of the test, not with a total that includes it
+        cov_rest = cov_total - var_item
+        var_rest = var_total - 2 * cov_total + var_item
+        discrimination = cov_rest / np.sqrt(var_item * var_rest)
+        rates = stats["choice_counts"] / shown[layout.choice_item]
+
+    scored = layout.correct > 0
+    k = int(scored.sum())
+    alpha = None
+    # with every item shown to every attempt, the totals are the same for all items
+    if k > 1 and (shown == n).all() and var_total[0] > 0:
+        alpha = float(k / (k - 1) * (1 - var_item[scored].sum() / var_total[0]))
+
+    answered = np.bincount(layout.choice_item, weights=stats["choice_counts"], minlength=layout.k)
+    items = []
+    for j, i in enumerate(layout.positions):
+        mask = layout.choice_item == j
+        d = discrimination[j]
+        seen = int(shown[j])
+        items.append(ItemStats(
+            question_id=key.question_ids[i],
+            text=key.question_texts[i],
+            shown=seen,
+            p_value=float(p[j]) if seen else None,
+            discrimination=float(d) if np.isfinite(d) else None,
+            unanswered_rate=float(1 - answered[j] / seen) if seen else 0.0,
+            choices=tuple(
+                ChoiceStats(int(cid), text, int(cid) == key.correct_choice_ids[i], float(rate) if seen else 0.0)
+                for cid, text, rate in zip(layout.choice_ids[mask], key.choice_texts[i], rates[mask])
+            ),
+        ))
+    return QuizAnalysis(key.quiz_id, n, alpha, tuple(items))
+
+
+def get_item_analysis(quiz, refresh=False):
+    """Item analysis of ``quiz``; one COUNT query when the cached sums are current."""
+    key = get_answer_key(quiz)
+    finished = Attempt.objects.filter(quiz=quiz, finished_at__isnull=False).count()
+    stats = None if refresh else cache.get(cache_key(quiz.pk, key.version))
+    if stats is None or stats["n"] != finished:
+        stats = compute_stats(quiz)
+    return summarize(key, stats)
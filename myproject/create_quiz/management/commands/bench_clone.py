@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from myapp.benchmarking import scratch_database, summarize, timer
+from myapp.cloning import clone_quizzes
+from myapp.models import Quiz, Question, Choice
+from room.models import Room
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Time deep-cloning a quiz (bulk inserts with in-memory id remapping) "
+        "against a per-object save() copy, and cloning a batch of quizzes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--questions", type=int, default=200)
+        parser.add_argument("--choices", type=int, default=4)
+        parser.add_argument("--runs", type=int, default=20)
+        parser.add_argument("--batch", type=int, default=50, help="Quizzes cloned together in the batch run.")
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            teacher = User.objects.create(username="bench-teacher")
+            room = Room.objects.create(name="Bench room", owner=teacher)
+            quiz = self._quiz(teacher, options["questions"], options["choices"])
+
+            samples = []
+            for _ in range(options["runs"]):
+                with CaptureQueriesContext(connection) as queries, timer() as elapsed:
+                    clone_quizzes([quiz], room=room, assigned_by=teacher)
+                samples.append(elapsed["seconds"])
+            self.stdout.write(summarize(f"bulk clone, {options['questions']} questions", samples))
+            self.stdout.write(f"  {len(queries)} queries per clone")
+
+            samples = []
+            for _ in range(max(1, options["runs"] // 4)):
+                with timer() as elapsed:
+                    self._naive_clone(quiz)
+                samples.append(elapsed["seconds"])
+            self.stdout.write(summarize(f"save() per object, {options['questions']} questions", samples))
+
+            with CaptureQueriesContext(connection) as queries, timer() as elapsed:
+                clone_quizzes([quiz] * options["batch"], room=room, assigned_by=teacher)
+            self.stdout.write(
+                f"batch of {options['batch']} quizzes: {elapsed['seconds'] * 1000:.1f}ms, {len(queries)} queries"
+            )
+
+    def _quiz(self, teacher, n_questions, n_choices):
+        quiz = Quiz.objects.create(title="Bench quiz", creator=teacher, is_published=True)
+        questions = Question.objects.bulk_create([
+            Question(quiz=quiz, text=f"Question {i} " + "x" * 80, qtype="mcq", order=i + 1)
+            for i in range(n_questions)
+        ])
+        Choice.objects.bulk_create([
+            Choice(question=q, text=f"Choice {k}", is_correct=(k == 0))
+            for q in questions for k in range(n_choices)
+        ])
+        return quiz
+
+    def _naive_clone(self, quiz):
+        copy = Quiz.objects.create(title=quiz.title, description=quiz.description, creator=quiz.creator)
+        for question in quiz.questions.prefetch_related("choices"):
+            choices = list(question.choices.all())
+            question.pk = None
+            question.quiz = copy
+            question.save()
+            for choice in choices:
+                choice.pk = None
+                choice.question = question
+                choice.save()
+        return copy
@@ -0,0 +1,94 @@
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from myapp import export
+from myapp.benchmarking import scratch_database, timer
+from myapp.models import Quiz, Question, Choice, Attempt, Answer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure peak Python memory (tracemalloc) and time of the streaming "
+        "exports at two result sizes, against building the whole CSV in memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--answers", type=int, default=1_000_000)
+        parser.add_argument("--questions", type=int, default=50)
+        parser.add_argument("--batch-size", type=int, default=20_000)
+
+    def handle(self, *args, **options):
+        per_attempt = options["questions"]
+        with scratch_database():
+            teacher = User.objects.create(username="bench-teacher")
+            # the small quiz gets a tenth of the answers: peak memory should not follow
+            large = self._load(teacher, "large", options["answers"] // per_attempt, per_attempt, options)
+            small = self._load(teacher, "small", max(1, options["answers"] // per_attempt // 10), per_attempt, options)
+
+            for label, quiz in (("small", small), ("large", large)):
+                attempts = Attempt.objects.filter(quiz=quiz)
+                for fmt, writer in export.WRITERS.items():
+                    peak, seconds, size = self._measure(lambda: sum(
+                        len(chunk) for chunk in writer(export.export_rows(attempts))
+                    ))
+                    self.stdout.write(
+                        f"{label:5} {fmt:5}: {size / 1e6:8.1f} MB out in {seconds:6.1f}s, "
+                        f"peak Python memory {peak / 1e6:6.1f} MB"
+                    )
+                peak, seconds, size = self._measure(lambda: len("".join(
+                    export.iter_csv(list(export_rows_materialized(attempts)))
+                )))
+                self.stdout.write(
+                    f"{label:5} csv materialized: {size / 1e6:8.1f} MB out in {seconds:6.1f}s, "
+                    f"peak Python memory {peak / 1e6:6.1f} MB"
+                )
+
+    def _measure(self, fn):
+        tracemalloc.start()
+        try:
+            with timer() as elapsed:
+                size = fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak, elapsed["seconds"], size
+
+    def _load(self, teacher, name, n_attempts, per_attempt, options):
+        quiz = Quiz.objects.create(title=f"Export {name}", creator=teacher, is_published=True)
+        questions = Question.objects.bulk_create([
+            Question(quiz=quiz, text=f"Question {i} " + "x" * 60, qtype="mcq" if i % 5 else "short", order=i + 1)
+            for i in range(per_attempt)
+        ])
+        choices = {
+            c.question_id: c.id
+            for c in Choice.objects.bulk_create([
+                Choice(question=q, text="Choice", is_correct=True) for q in questions if q.qtype == "mcq"
+            ])
+        }
+        now = timezone.now()
+        students = User.objects.bulk_create([User(username=f"{name}-{i}") for i in range(n_attempts)])
+        step = max(1, options["batch_size"] // per_attempt)
+        for start in range(0, n_attempts, step):
+            attempts = Attempt.objects.bulk_create([
+                Attempt(quiz=quiz, taker=u, finished_at=now, score=80.0) for u in students[start:start + step]
+            ])
+            Answer.objects.bulk_create([
+                Answer(attempt=a, question=q, selected_choice_id=choices.get(q.id),
+                       text="" if q.qtype == "mcq" else "free text answer " * 3)
+                for a in attempts for q in questions
+            ])
+        return quiz
+
+
+def export_rows_materialized(attempts):
+    """The non-streaming baseline: the whole result set as a list."""
+    return list(
+        attempts.filter(finished_at__isnull=False)
+        .order_by("pk", "answers__question__order", "answers__question_id")
+        .values_list(*(field for _, field in export.COLUMNS))
+    )
@@ -0,0 +1,99 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from create_quiz import item_analysis
+from myapp.answer_key import get_answer_key
+from myapp.benchmarking import scratch_database, timer
+from myapp.models import Quiz, Question, Choice, Attempt, Answer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the NumPy item analysis (full rebuild, incremental update, "
+        "cached read) against a per-question ORM loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--attempts", type=int, default=100_000)
+        parser.add_argument("--questions", type=int, default=20)
+        parser.add_argument("--choices", type=int, default=4)
+        parser.add_argument("--naive-attempts", type=int, default=2_000,
+                            help="The ORM loop runs on this many attempts only (slow).")
+        parser.add_argument("--batch-size", type=int, default=20_000)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with scratch_database():
+            teacher = User.objects.create(username="bench-teacher")
+            quiz = Quiz.objects.create(title="Item analysis", creator=teacher, is_published=True)
+            questions = Question.objects.bulk_create([
+                Question(quiz=quiz, text=f"Q{i}", qtype="mcq", order=i + 1) for i in range(options["questions"])
+            ])
+            choices = Choice.objects.bulk_create([
+                Choice(question=q, text=str(k), is_correct=(k == 0))
+                for q in questions for k in range(options["choices"])
+            ])
+            by_question = {}
+            for c in choices:
+                by_question.setdefault(c.question_id, []).append(c.id)
+            # per-question difficulty, so the statistics are not degenerate
+            difficulty = {q.id: rng.uniform(0.3, 0.9) for q in questions}
+
+            with timer() as load:
+                now = timezone.now()
+                remaining = options["attempts"]
+                while remaining:
+                    size = min(remaining, max(1, options["batch_size"] // options["questions"]))
+                    attempts = Attempt.objects.bulk_create(
+                        [Attempt(quiz=quiz, taker=teacher, finished_at=now) for _ in range(size)]
+                    )
+                    answers = []
+                    for attempt in attempts:
+                        ability = rng.gauss(0, 0.15)
+                        for q in questions:
+                            ids = by_question[q.id]
+                            pick = ids[0] if rng.random() < difficulty[q.id] + ability else rng.choice(ids[1:])
+                            answers.append(Answer(attempt=attempt, question=q, selected_choice_id=pick))
+                    Answer.objects.bulk_create(answers)
+                    remaining -= size
+
+            cache.clear()
+            with timer() as full:
+                analysis = item_analysis.get_item_analysis(quiz, refresh=True)
+            with timer() as cached:
+                item_analysis.get_item_analysis(quiz)
+
+            key = get_answer_key(quiz)
+            new = Attempt(pk=-1, quiz=quiz, taker=teacher, finished_at=now)
+            picks = {q.id: by_question[q.id][0] for q in questions}
+            with timer() as incremental:
+                item_analysis.record_graded([new], {-1: picks})
+
+            naive_ids = list(
+                Attempt.objects.filter(quiz=quiz).order_by("pk").values_list("pk", flat=True)[:options["naive_attempts"]]
+            )
+            with timer() as naive:
+                for qid, correct in zip(key.question_ids, key.correct_choice_ids):
+                    rows = list(Answer.objects.filter(attempt_id__in=naive_ids, question_id=qid))
+                    sum(1 for a in rows if a.selected_choice_id == correct) / max(1, len(naive_ids))
+
+        n = options["attempts"]
+        self.stdout.write(
+            f"attempts={n} questions={options['questions']} answers={n * options['questions']} "
+            f"(loaded in {load['seconds']:.1f}s) alpha={analysis.alpha:.3f}"
+        )
+        self.stdout.write(f"numpy full rebuild: {full['seconds'] * 1000:.0f}ms")
+        self.stdout.write(f"cached read (COUNT only): {cached['seconds'] * 1000:.1f}ms")
+        self.stdout.write(f"incremental update per graded attempt: {incremental['seconds'] * 1000:.2f}ms")
+        per = naive["seconds"] / max(1, len(naive_ids))
+        self.stdout.write(
+            f"ORM loop, p-values only: {naive['seconds'] * 1000:.0f}ms for {len(naive_ids)} attempts "
+            f"(~{per * n:.1f}s extrapolated to {n})"
+        )
@@ -0,0 +1,103 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from create_quiz.search import get_backend, rebuild_index, search_quizzes
+from myapp.benchmarking import scratch_database, summarize, timer
+from myapp.models import Quiz, Question
+
+User = get_user_model()
+
+THAI_WORDS = [
+    "คณิตศาสตร์", "วิทยาศาสตร์", "ประวัติศาสตร์", "ภาษาไทย", "สมการ", "เศษส่วน", "พลังงาน",
+    "แรงโน้มถ่วง", "เซลล์", "พืช", "สัตว์", "ดาวเคราะห์", "ภูมิศาสตร์", "ทวีป", "แม่น้ำ",
+    "รัฐธรรมนูญ", "ไวยากรณ์", "คำนาม", "คำกริยา", "ตรีโกณมิติ", "ความน่าจะเป็น", "สถิติ",
+]
+ENGLISH_WORDS = [
+    "algebra", "geometry", "photosynthesis", "molecule", "velocity", "democracy", "grammar",
+    "fraction", "equation", "ecosystem", "continent", "electricity", "probability", "verb",
+    "noun", "history", "planet", "gravity", "triangle", "element", "reaction", "volcano",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare indexed quiz search with a naive icontains scan of "
+        "Question.text on a generated Thai/English corpus."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--questions", type=int, default=1_000_000)
+        parser.add_argument("--per-quiz", type=int, default=50)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--naive-queries", type=int, default=5, help="Rare-tag icontains scans; slow, so sample fewer.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        vocabulary = THAI_WORDS + ENGLISH_WORDS
+
+        def sentence():
+            return " ".join(rng.choice(vocabulary) for _ in range(rng.randint(4, 10)))
+
+        with scratch_database():
+            teacher = User.objects.create(username="bench-teacher")
+            n_quizzes = max(1, options["questions"] // options["per_quiz"])
+            with timer() as load:
+                quizzes = Quiz.objects.bulk_create(
+                    [Quiz(title=sentence(), creator=teacher) for _ in range(n_quizzes)],
+                    batch_size=options["batch_size"],
+                )
+                batch = []
+                for i, quiz in enumerate(quizzes):
+                    for order in range(1, options["per_quiz"] + 1):
+                        # a rare tag per question, for selective queries
+                        text = f"{sentence()} tag{i}x{order}"
+                        batch.append(Question(quiz=quiz, text=text, qtype="short", order=order))
+                    if len(batch) >= options["batch_size"]:
+                        Question.objects.bulk_create(batch)
+                        batch = []
+                Question.objects.bulk_create(batch)
+            with timer() as build:
+                rebuild_index(batch_size=500)
+
+            self.stdout.write(
+                f"corpus: {n_quizzes} quizzes, {n_quizzes * options['per_quiz']} questions "
+                f"(loaded in {load['seconds']:.1f}s, indexed in {build['seconds']:.1f}s) "
+                f"backend={type(get_backend()).__name__}"
+            )
+
+            def rare_tag():
+                return f"tag{rng.randrange(n_quizzes)}x{rng.randint(1, options['per_quiz'])}"
+
+            def terms():
+                # a rare tag, one or two common words, or a Thai fragment from inside a word
+                if rng.random() < 0.25:
+                    return rare_tag()
+                word = rng.choice(vocabulary)
+                if word in THAI_WORDS and rng.random() < 0.5:
+                    start = rng.randrange(0, max(1, len(word) - 3))
+                    return word[start:start + 3]
+                return word if rng.random() < 0.5 else f"{word} {rng.choice(vocabulary)}"
+
+            base = Quiz.objects.filter(creator=teacher)
+            indexed = []
+            for _ in range(options["queries"]):
+                query = terms()
+                with timer() as t:
+                    list(search_quizzes(base, query).values_list("pk", flat=True)[:50])
+                indexed.append(t["seconds"])
+
+            naive = []
+            for _ in range(options["naive_queries"]):
+                with timer() as t:
+                    list(
+                        base.filter(questions__text__icontains=rare_tag())
+                        .distinct().values_list("pk", flat=True)[:50]
+                    )
+                naive.append(t["seconds"])
+
+        self.stdout.write(summarize("indexed search", indexed))
+        self.stdout.write(summarize("naive icontains", naive))
@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from create_quiz.importers import PARSERS, detect_format, import_file
+from myapp.models import Quiz
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Import questions from a JSON, JSON Lines, CSV, GIFT or Aiken file into an "
+        "existing quiz (--quiz) or a new draft (--title and --creator)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--quiz", type=int, help="Id of the quiz to append to.")
+        parser.add_argument("--title", help="Create a new unpublished quiz with this title.")
+        parser.add_argument("--creator", help="Username owning the new quiz.")
+        parser.add_argument("--format", choices=sorted(PARSERS), help="Default: from the file extension.")
+        parser.add_argument("--strict", action="store_true", help="Import nothing if any item is invalid.")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or detect_format(options["path"])
+        if fmt is None:
+            raise CommandError("Cannot tell the format from the file name; pass --format.")
+
+        with transaction.atomic():
+            quiz = self._quiz(options)
+            try:
+                with open(options["path"], encoding="utf-8-sig", newline="") as stream:
+                    result = import_file(
+                        quiz, stream, fmt, strict=options["strict"], batch_size=options["batch_size"]
+                    )
+            except (OSError, UnicodeDecodeError) as exc:
+                raise CommandError(f"Cannot read {options['path']}: {exc}")
+            if result.rolled_back:
+                transaction.set_rollback(True)  # do not keep an empty new quiz either
+
+        for line, message in result.errors:
+            self.stderr.write(f"line {line}: {message}")
+        if result.rolled_back:
+            raise CommandError(f"{len(result.errors)} invalid item(s); nothing imported.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} question(s) into quiz {quiz.pk} in {result.seconds:.2f}s "
+            f"({result.questions_per_second:.0f} questions/s), skipped {len(result.errors)}."
+        ))
+
+    def _quiz(self, options):
+        if options["quiz"]:
+            try:
+                return Quiz.objects.get(pk=options["quiz"])
+            except Quiz.DoesNotExist:
+                raise CommandError(f"Quiz {options['quiz']} does not exist.")
+        if not (options["title"] and options["creator"]):
+            raise CommandError("Pass --quiz, or --title and --creator.")
+        try:
+            creator = User.objects.get(username=options["creator"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['creator']} does not exist.")
+        return Quiz.objects.create(title=options["title"], creator=creator, is_published=False)
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Value, Window
+from django.db.models.functions import Lag
+
+from create_quiz.ordering import GAP, rebalance
+from myapp.models import Quiz, Question
+from myapp.signals import quiz_content_changed
+
+
+class Command(BaseCommand):
+    help = (
+        "Respace question ranks of quizzes whose neighbouring questions are "
+        "closer than --min-gap, so later moves stay single-row writes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("quiz_ids", nargs="*", type=int, help="Quiz ids; omit to scan every quiz.")
+        parser.add_argument("--min-gap", type=int, default=GAP // 64)
+
+    def handle(self, *args, **options):
+        gaps = Question.objects.annotate(
+            gap=F("order") - Window(
+                Lag("order", default=Value(0)), partition_by=[F("quiz_id")], order_by=[F("order"), F("id")]
+            )
+        ).filter(gap__lt=options["min_gap"])
+        if options["quiz_ids"]:
+            gaps = gaps.filter(quiz_id__in=options["quiz_ids"])
+        crowded = set(gaps.values_list("quiz_id", flat=True))
+        for quiz in Quiz.objects.filter(pk__in=crowded).iterator():
+            with transaction.atomic():
+                rebalance(quiz)
+                quiz_content_changed.send(sender=Quiz, quiz_id=quiz.pk)
+        self.stdout.write(self.style.SUCCESS(f"Rebalanced {len(crowded)} quiz(zes)."))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('myapp', '0006_quiz_catalogue_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizSearchEntry',
+            fields=[
+                ('quiz', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_entry', serialize=False, to='myapp.quiz')),
+                ('tokens', models.TextField(blank=True, default='')),
+            ],
+        ),
+    ]
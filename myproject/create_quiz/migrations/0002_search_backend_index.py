@@ -0,0 +1,115 @@
+import re
+import unicodedata
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+FTS_TABLE = 'create_quiz_quizsearch_fts'
+ENTRY_TABLE = 'create_quiz_quizsearchentry'
+
+SQLITE_FORWARD = [
+    # tokens are pre-normalized by create_quiz.search; the ascii tokenizer
+    # only splits on ASCII separators, so Thai bigrams stay intact
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        tokens, content='{ENTRY_TABLE}', content_rowid='quiz_id', tokenize='ascii'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {ENTRY_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, tokens) VALUES (new.quiz_id, new.tokens);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {ENTRY_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, tokens) VALUES ('delete', old.quiz_id, old.tokens);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {ENTRY_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, tokens) VALUES ('delete', old.quiz_id, old.tokens);
+        INSERT INTO {FTS_TABLE}(rowid, tokens) VALUES (new.quiz_id, new.tokens);
+    END""",
+]
+SQLITE_REVERSE = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRES_FORWARD = [
+    f"""CREATE INDEX quizsearch_tokens_gin ON {ENTRY_TABLE}
+        USING gin (array_to_tsvector(string_to_array(btrim(tokens), ' ')))""",
+]
+POSTGRES_REVERSE = ["DROP INDEX IF EXISTS quizsearch_tokens_gin"]
+
+
+def create_backend_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+                cursor.execute("DROP TABLE temp.fts5_probe")
+        except OperationalError:
+            return  # SQLite built without FTS5: search falls back to substring matching
+        statements = SQLITE_FORWARD
+    elif vendor == 'postgresql':
+        statements = POSTGRES_FORWARD
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_backend_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}.get(vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+# A frozen copy of create_quiz.search.document_tokens as it stood when
+# this migration was written, so later tokenizer changes do not change
+# what the migration produces. Run rebuild_search_index after changing
+# the live tokenizer.
+_TOKEN_RE = re.compile(r"([\u0E00-\u0E7F]+)|([^\W_\u0E00-\u0E7F]+)")
+
+
+def _tokenize(text):
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    for thai, word in _TOKEN_RE.findall(text):
+        if word:
+            yield word
+        elif len(thai) == 1:
+            yield thai
+        else:
+            for i in range(len(thai) - 1):
+                yield thai[i:i + 2]
+
+
+def document_tokens(*texts):
+    seen = dict.fromkeys(token for text in texts for token in _tokenize(text))
+    return f" {' '.join(seen)} " if seen else ""
+
+
+def index_existing_quizzes(apps, schema_editor):
+    Quiz = apps.get_model('myapp', 'Quiz')
+    Question = apps.get_model('myapp', 'Question')
+    QuizSearchEntry = apps.get_model('create_quiz', 'QuizSearchEntry')
+    texts = {}
+    for quiz_id, text in Question.objects.filter(quiz__isnull=False).values_list('quiz_id', 'text'):
+        texts.setdefault(quiz_id, []).append(text)
+    QuizSearchEntry.objects.bulk_create(
+        [
+            QuizSearchEntry(quiz_id=pk, tokens=document_tokens(title, description, *texts.get(pk, ())))
+            for pk, title, description in Quiz.objects.values_list('pk', 'title', 'description')
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('create_quiz', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_backend_index, drop_backend_index),
+        migrations.RunPython(index_existing_quizzes, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,21 @@
 from django.db import models
 
-# Create your models here.
+
+class QuizSearchEntry(models.Model):
+    """
+    Search document of one quiz: the normalized tokens of its title,
+    description and question texts (see ``create_quiz.search``).
+
+    ``tokens`` is kept space-padded (`` tok1 tok2 ``). The migration
+    indexes it with an FTS5 table on SQLite and a GIN index on Postgres.
+    """
+    quiz = models.OneToOneField(
+        'myapp.Quiz',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_entry',
+    )
+    tokens = models.TextField(blank=True, default='')
+
+    def __str__(self):
+        return f"search entry for quiz {self.quiz_id}"
@@ -0,0 +1,82 @@
+"""
+Question order as gapped integer ranks.
+
+``Question.order`` values are spaced ``GAP`` apart, so moving a question
+only rewrites that one row: it takes the midpoint of its new neighbours.
+When two neighbours have no integer left between them (about log2(GAP)
+moves into the same spot), the quiz is renumbered with one CASE UPDATE.
+The same UPDATE applies a full permutation from the bulk reorder
+endpoint. Only the relative order matters; templates number questions
+by position.
+"""
+from django.db import transaction
+from django.db.models import Case, Max, Value, When
+
+from myapp.models import Quiz, Question
+
+GAP = 1024
+
+
+def next_order(quiz):
+    """Rank for a question appended to ``quiz``."""
+    return (quiz.questions.aggregate(m=Max("order"))["m"] or 0) + GAP
+
+
+def apply_order(quiz, question_ids):
+    """
+    Renumber ``quiz``'s questions as ``question_ids`` (first to last) in a
+    single UPDATE. Questions left out keep their relative order after them.
+    Raises ``ValueError`` if an id is not a question of ``quiz``.
+    """
+    current = list(quiz.questions.order_by("order", "id").values_list("pk", flat=True))
+    question_ids = list(dict.fromkeys(question_ids))
+    if set(question_ids) - set(current):
+        raise ValueError("not a question of this quiz")
+    listed = set(question_ids)
+    ranked = question_ids + [pk for pk in current if pk not in listed]
+    if ranked:
+        quiz.questions.filter(pk__in=ranked).update(order=Case(
+            *[When(pk=pk, then=Value((i + 1) * GAP)) for i, pk in enumerate(ranked)],
+        ))
+    return ranked
+
+
+def rebalance(quiz):
+    """Respace ``quiz``'s ranks ``GAP`` apart, keeping the current order."""
+    return apply_order(quiz, [])
+
+
+def move_after(question, after_id=None):
+    """
+    Place ``question`` right after question ``after_id`` of the same quiz
+    (first when None). Writes one row unless the quiz needs rebalancing.
+    Returns False when the question was already there. Raises
+    ``Question.DoesNotExist`` for an unknown ``after_id``.
+    """
+    quiz = question.quiz
+    with transaction.atomic():
+        # serialize moves within a quiz so two midpoints cannot collide
+        Quiz.objects.select_for_update().filter(pk=quiz.pk).exists()
+        siblings = quiz.questions.exclude(pk=question.pk)
+        if after_id is None:
+            low = 0
+        else:
+            low = siblings.values_list("order", flat=True).get(pk=after_id)
+        high = siblings.filter(order__gte=low).exclude(pk=after_id).order_by("order", "id")
+        high = high.values_list("order", flat=True).first()
+        if low < question.order and (high is None or question.order < high):
+            return False  # already there
+        if high is None:
+            rank = low + GAP
+        else:
+            rank = (low + high) // 2
+        if low < rank < (high if high is not None else rank + 1):
+            Question.objects.filter(pk=question.pk).update(order=rank)
+            question.order = rank
+            return True
+        # no room between the neighbours: renumber the whole quiz
+        ranked = list(siblings.order_by("order", "id").values_list("pk", flat=True))
+        ranked.insert(0 if after_id is None else ranked.index(after_id) + 1, question.pk)
+        apply_order(quiz, ranked)
+        question.order = (ranked.index(question.pk) + 1) * GAP
+        return True
@@ -0,0 +1,172 @@
+"""
+Full-text search over quizzes and their questions.
+
+Each quiz has one ``QuizSearchEntry`` holding the normalized tokens of
+its title, description and question texts, refreshed after commit by
+the signals in ``create_quiz.signals`` (``rebuild_index`` after bulk
+loads). Matching runs through a backend chosen per database:
+
+* SQLite: an external-content FTS5 table kept in sync by triggers;
+* Postgres: a GIN index over ``array_to_tsvector`` of the tokens;
+* anything else: substring matching on the padded token string.
+
+Thai is written without spaces between words, so Thai runs are indexed
+as overlapping character bigrams. Any substring of two or more characters
+is then found without a dictionary, and the query is split the same way
+as the indexed text.
+
+Set ``TAKEQ_SEARCH_BACKEND`` to a dotted path to plug in another backend
+(any class with a ``matching_ids(query_terms)`` method returning a
+subquery of quiz ids).
+"""
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from myapp.models import Quiz, Question
+from .models import QuizSearchEntry
+
+FTS_TABLE = "create_quiz_quizsearch_fts"
+
+_TOKEN_RE = re.compile(r"([\u0E00-\u0E7F]+)|([^\W_\u0E00-\u0E7F]+)")  # Thai run | other word
+
+
+def _terms(text):
+    """Yield ``(token, is_thai)`` for every token of ``text``."""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    for thai, word in _TOKEN_RE.findall(text):
+        if word:
+            yield word, False
+        elif len(thai) == 1:
+            yield thai, True
+        else:
+            for i in range(len(thai) - 1):
+                yield thai[i:i + 2], True
+
+
+def tokenize(text):
+    """Tokens of ``text``: casefolded words and Thai character bigrams."""
+    return [token for token, _ in _terms(text)]
+
+
+def document_tokens(*texts):
+    """The padded, de-duplicated token string stored in ``QuizSearchEntry``."""
+    seen = dict.fromkeys(token for text in texts for token in tokenize(text))
+    return f" {' '.join(seen)} " if seen else ""
+
+
+def query_terms(query):
+    """
+    Split a search query into ``(token, prefix)`` pairs; all must match.
+    The last word and lone Thai characters match as prefixes so results
+    appear while the user is still typing.
+    """
+    terms = list(_terms(query))
+    return [
+        (token, (is_thai and len(token) == 1) or (not is_thai and i == len(terms) - 1))
+        for i, (token, is_thai) in enumerate(terms)
+    ]
+
+
+class ContainsBackend:
+    """Fallback: substring matches on the padded token string (scans)."""
+
+    def matching_ids(self, terms):
+        qs = QuizSearchEntry.objects.all()
+        for token, prefix in terms:
+            qs = qs.filter(tokens__contains=f" {token}" if prefix else f" {token} ")
+        return qs.values("quiz_id")
+
+
+class Fts5Backend:
+    def matching_ids(self, terms):
+        expr = " AND ".join(
+            '"{}"{}'.format(token.replace('"', '""'), "*" if prefix else "") for token, prefix in terms
+        )
+        return RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expr])
+
+
+class PostgresBackend:
+    def matching_ids(self, terms):
+        expr = " & ".join(
+            "'{}'{}".format(token.replace("\\", "\\\\").replace("'", "''"), ":*" if prefix else "")
+            for token, prefix in terms
+        )
+        # must stay identical to the indexed expression (see the migration)
+        return RawSQL(
+            "SELECT quiz_id FROM create_quiz_quizsearchentry "
+            "WHERE array_to_tsvector(string_to_array(btrim(tokens), ' ')) @@ %s::tsquery",
+            [expr],
+        )
+
+
+_fts5_available = {}
+
+
+def _has_fts5():
+    name = connection.settings_dict["NAME"]
+    if name not in _fts5_available:
+        _fts5_available[name] = FTS_TABLE in connection.introspection.table_names()
+    return _fts5_available[name]
+
+
+def get_backend():
+    path = getattr(settings, "TAKEQ_SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == "postgresql":
+        return PostgresBackend()
+    if connection.vendor == "sqlite" and _has_fts5():
+        return Fts5Backend()
+    return ContainsBackend()
+
+
+def search_quizzes(queryset, query):
+    """Narrow a ``Quiz`` queryset to quizzes matching every term of ``query``."""
+    terms = query_terms(query)
+    if not terms:
+        return queryset
+    return queryset.filter(pk__in=get_backend().matching_ids(terms))
+
+
+def reindex_quiz(quiz_id):
+    """Refresh one quiz's search entry (dropping it if the quiz is gone)."""
+    quiz = Quiz.objects.filter(pk=quiz_id).values_list("title", "description").first()
+    if quiz is None:
+        QuizSearchEntry.objects.filter(quiz_id=quiz_id).delete()
+        return
+    texts = Question.objects.filter(quiz_id=quiz_id).values_list("text", flat=True)
+    _save_entries([QuizSearchEntry(quiz_id=quiz_id, tokens=document_tokens(*quiz, *texts))])
+
+
+def rebuild_index(batch_size=500):
+    """Re-index every quiz in batches of ``batch_size``; returns the count."""
+    total, last_pk = 0, 0
+    while True:
+        quizzes = list(
+            Quiz.objects.filter(pk__gt=last_pk).order_by("pk")
+            .values_list("pk", "title", "description")[:batch_size]
+        )
+        if not quizzes:
+            return total
+        last_pk = quizzes[-1][0]
+        texts = {}
+        for quiz_id, text in Question.objects.filter(
+            quiz_id__in=[pk for pk, _, _ in quizzes]
+        ).order_by("quiz_id", "order", "id").values_list("quiz_id", "text"):
+            texts.setdefault(quiz_id, []).append(text)
+        _save_entries([
+            QuizSearchEntry(quiz_id=pk, tokens=document_tokens(title, description, *texts.get(pk, ())))
+            for pk, title, description in quizzes
+        ])
+        total += len(quizzes)
+
+
+def _save_entries(entries):
+    QuizSearchEntry.objects.bulk_create(
+        entries, update_conflicts=True, unique_fields=["quiz"], update_fields=["tokens"]
+    )
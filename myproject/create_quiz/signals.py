@@ -0,0 +1,28 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from myapp.models import Quiz, Question
+from .search import reindex_quiz
+
+SEARCHED_QUIZ_FIELDS = {"title", "description"}
+
+
+def schedule_reindex(quiz_id):
+    # after commit, so a quiz deleted together with its questions is not
+    # re-indexed halfway through the cascade
+    transaction.on_commit(lambda: reindex_quiz(quiz_id))
+
+
+@receiver(post_save, sender=Quiz)
+def _on_quiz_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields and not SEARCHED_QUIZ_FIELDS & set(update_fields)):
+        return
+    schedule_reindex(instance.pk)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def _on_question_changed(sender, instance, raw=False, **kwargs):
+    if not raw and instance.quiz_id:
+        schedule_reindex(instance.quiz_id)
@@ -1,11 +1,24 @@
 # create_quiz/tests.py
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+import io
 import json
 
-from myapp.models import Quiz, Question, Choice
+from myapp.models import Quiz, Question, Choice, Attempt
+from create_quiz.models import QuizSearchEntry
+from create_quiz.search import tokenize, search_quizzes, rebuild_index
+from create_quiz.item_analysis import get_item_analysis
+from create_quiz.importers import PARSERS, import_file
+from create_quiz.ordering import GAP, apply_order, move_after, next_order
+from django.core.management import call_command
+from room.models import Room, RoomMembership
+from take_quiz.grading import finalize_attempt
 
 User = get_user_model()
 
@@ -40,6 +53,23 @@ class CreateQuizFlowTests(TestCase):
         self.assertIsNotNone(q)
         self.assertEqual(q.creator, self.teacher)
 
+    def test_layout_settings_lock_once_attempted(self):
+        assert self.client.login(username="teacher", password="teachpw")
+        url = reverse("create_quiz:quiz_edit", args=[self.quiz.pk])
+        data = {"title": "Initial Quiz", "description": "desc", "time_limit_minutes": "",
+                "draw_count": "3", "shuffle_questions": "on"}
+        self.client.post(url, data)
+        self.quiz.refresh_from_db()
+        self.assertEqual((self.quiz.draw_count, self.quiz.shuffle_questions), (3, True))
+
+        Attempt.objects.create(quiz=self.quiz, taker=self.other)
+        self.assertContains(self.client.get(url), "locked because this quiz has attempts")
+        self.client.post(url, dict(data, title="Renamed", draw_count="1", shuffle_choices="on"))
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.title, "Renamed")
+        self.assertEqual((self.quiz.draw_count, self.quiz.shuffle_questions, self.quiz.shuffle_choices),
+                         (3, True, False))
+
     def test_add_mcq_question_happy(self):
         assert self.client.login(username="teacher", password="teachpw")
         url = reverse("create_quiz:add_question", args=[self.quiz.pk])
@@ -179,3 +209,346 @@ class CreateQuizFlowTests(TestCase):
         url = reverse("create_quiz:reorder_questions", args=[self.quiz.pk])
         r = self.client.post(url, json.dumps({"order": [q1.pk]}), content_type="application/json")
         self.assertIn(r.status_code, (403, 404))
+
+
+class OrderingTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(username="teacher", password="teachpw")
+        self.quiz = Quiz.objects.create(title="Order", creator=self.teacher)
+        self.questions = [
+            Question.objects.create(quiz=self.quiz, text=str(i), qtype="short", order=next_order(self.quiz))
+            for i in range(5)
+        ]
+        self.client.force_login(self.teacher)
+
+    def texts(self):
+        return "".join(self.quiz.questions.order_by("order", "id").values_list("text", flat=True))
+
+    def move(self, question, after):
+        url = reverse("create_quiz:move_question", args=[question.pk])
+        return self.client.post(url, json.dumps({"after": after and after.pk}), content_type="application/json")
+
+    def test_move_writes_one_row(self):
+        q = self.questions
+        before = dict(self.quiz.questions.values_list("pk", "order"))
+        self.assertEqual(self.move(q[4], q[0]).status_code, 200)
+        self.assertEqual(self.texts(), "04123")
+        self.move(q[0], None)  # already first
+        self.move(q[1], q[3])
+        self.assertEqual(self.texts(), "04231")
+        after = dict(self.quiz.questions.values_list("pk", "order"))
+        self.assertEqual({pk for pk in before if before[pk] != after[pk]}, {q[4].pk, q[1].pk})
+
+    def test_exhausted_gap_rebalances(self):
+        q = self.questions
+        # keep inserting right after the first question until the gap runs out
+        for i in range(15):
+            move_after(q[2 + i % 2], q[0].pk)
+        self.assertEqual(self.texts(), "02314")
+        self.assertEqual(len(set(self.quiz.questions.values_list("order", flat=True))), 5)
+
+    def test_bulk_reorder_is_one_update(self):
+        q = self.questions
+        with CaptureQueriesContext(connection) as queries:
+            apply_order(self.quiz, [q[3].pk, q[1].pk])
+        self.assertEqual(self.texts(), "31024")
+        self.assertEqual(sum(1 for x in queries if x["sql"].startswith("UPDATE")), 1)
+
+    def test_rebalance_command_respaces_crowded_quizzes(self):
+        Question.objects.filter(pk=self.questions[1].pk).update(order=self.questions[0].order + 1)
+        call_command("rebalance_question_order", stdout=io.StringIO())
+        self.assertEqual(
+            list(self.quiz.questions.order_by("order").values_list("order", flat=True)),
+            [GAP * i for i in range(1, 6)],
+        )
+
+    def test_move_rejects_foreign_questions(self):
+        other = Quiz.objects.create(title="Other", creator=self.teacher)
+        stranger = Question.objects.create(quiz=other, text="x", qtype="short", order=GAP)
+        self.assertEqual(self.move(self.questions[0], stranger).status_code, 400)
+        self.client.force_login(User.objects.create_user(username="other", password="otherpw"))
+        self.assertEqual(self.move(self.questions[0], None).status_code, 404)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user(username="teacher", password="teachpw")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.algebra = Quiz.objects.create(title="Algebra basics", creator=self.teacher)
+            Question.objects.create(quiz=self.algebra, text="Solve the linear equation", qtype="short", order=1)
+            self.thai = Quiz.objects.create(title="แบบทดสอบ", creator=self.teacher)
+            Question.objects.create(quiz=self.thai, text="สมการเชิงเส้นคืออะไร", qtype="short", order=1)
+        self.client.force_login(self.teacher)
+
+    def search(self, query):
+        return set(search_quizzes(Quiz.objects.all(), query).values_list("pk", flat=True))
+
+    def test_tokenizer_splits_thai_into_bigrams(self):
+        self.assertEqual(tokenize("สมการ Linear"), ["สม", "มก", "กา", "าร", "linear"])
+
+    def test_matches_question_text_words_and_prefixes(self):
+        self.assertEqual(self.search("linear equation"), {self.algebra.pk})
+        self.assertEqual(self.search("equ"), {self.algebra.pk})
+        self.assertEqual(self.search("geometry"), set())
+
+    def test_matches_thai_substrings(self):
+        self.assertEqual(self.search("เชิงเส้น"), {self.thai.pk})
+        self.assertEqual(self.search("สมการ"), {self.thai.pk})
+
+    def test_index_follows_question_edits_and_deletes(self):
+        question = self.algebra.questions.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            question.text = "Factor the polynomial"
+            question.save()
+        self.assertEqual(self.search("polynomial"), {self.algebra.pk})
+        self.assertEqual(self.search("linear"), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            question.delete()
+        self.assertEqual(self.search("polynomial"), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.algebra.delete()
+        self.assertFalse(QuizSearchEntry.objects.filter(quiz_id=self.algebra.pk).exists())
+
+    def test_fallback_backend_agrees(self):
+        with self.settings(TAKEQ_SEARCH_BACKEND="create_quiz.search.ContainsBackend"):
+            self.assertEqual(self.search("linear equ"), {self.algebra.pk})
+            self.assertEqual(self.search("เชิงเส้น"), {self.thai.pk})
+
+    def test_rebuild_index_restores_entries(self):
+        QuizSearchEntry.objects.all().delete()
+        self.assertEqual(rebuild_index(batch_size=1), 2)
+        self.assertEqual(self.search("linear"), {self.algebra.pk})
+
+    def test_quiz_list_search(self):
+        r = self.client.get(reverse("create_quiz:quiz_list"), {"q": "สมการ"})
+        self.assertEqual(list(r.context["quizzes"]), [self.thai])
+
+    def test_room_assign_picker_search(self):
+        room = Room.objects.create(name="Class", owner=self.teacher)
+        RoomMembership.objects.create(room=room, user=self.teacher, role=RoomMembership.ROLE_OWNER)
+        r = self.client.get(reverse("room:detail", args=[room.code]), {"q": "algebra"})
+        self.assertEqual(list(r.context["owner_quizzes"]), [self.algebra])
+
+
+class ItemAnalysisTests(TestCase):
+    # rows: attempts; values: index of the chosen choice per question (None = blank)
+    RESPONSES = [(0, 0, 1), (0, 1, 0), (1, 1, 2), (0, 0, None), (2, 0, 0)]
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher", password="teachpw")
+        self.quiz = Quiz.objects.create(title="Stats", creator=self.teacher, is_published=True)
+        self.choices = []
+        for i in range(3):
+            q = Question.objects.create(quiz=self.quiz, text=f"Q{i}", qtype="mcq", order=i + 1)
+            self.choices.append([
+                Choice.objects.create(question=q, text=str(k), is_correct=(k == 0)) for k in range(3)
+            ])
+        Question.objects.create(quiz=self.quiz, text="Essay", qtype="short", order=4)
+        self.quiz.refresh_from_db()
+
+    def _grade(self, rows):
+        for picks in rows:
+            attempt = Attempt.objects.create(quiz=self.quiz, taker=self.teacher)
+            data = {
+                f"question_{choices[0].question_id}": str(choices[k].pk)
+                for choices, k in zip(self.choices, picks) if k is not None
+            }
+            finalize_attempt(attempt, data)
+
+    def _expected(self):
+        X = [[1 if k == 0 else 0 for k in picks] for picks in self.RESPONSES]
+        n, T = len(X), [sum(row) for row in X]
+        p = [sum(col) / n for col in zip(*X)]
+        var_t = sum(t * t for t in T) / n - (sum(T) / n) ** 2
+        alpha = 3 / 2 * (1 - sum(pj * (1 - pj) for pj in p) / var_t)
+        return p, alpha
+
+    def test_statistics_match_reference(self):
+        self._grade(self.RESPONSES)
+        analysis = get_item_analysis(self.quiz)
+        p, alpha = self._expected()
+        self.assertEqual(analysis.attempt_count, 5)
+        self.assertEqual([round(i.p_value, 6) for i in analysis.items], [round(x, 6) for x in p])
+        self.assertAlmostEqual(analysis.alpha, alpha)
+        q3 = analysis.items[2]
+        self.assertEqual([round(c.rate, 2) for c in q3.choices], [0.4, 0.2, 0.2])
+        self.assertAlmostEqual(q3.unanswered_rate, 0.2)
+        self.assertEqual(len(analysis.items), 3)  # the short-answer question is not an item
+
+    def test_incremental_updates_match_full_recompute(self):
+        self._grade(self.RESPONSES[:2])
+        get_item_analysis(self.quiz)  # caches the running sums
+        self._grade(self.RESPONSES[2:])
+        with self.assertNumQueries(1):  # only the freshness COUNT
+            incremental = get_item_analysis(self.quiz)
+        self.assertEqual(incremental, get_item_analysis(self.quiz, refresh=True))
+
+    def test_pooled_quiz_counts_only_attempts_shown_each_item(self):
+        from myapp.answer_key import get_answer_key
+        from myapp.layout import draw_question_ids
+
+        Question.objects.filter(quiz=self.quiz, qtype="short").delete()
+        Quiz.objects.filter(pk=self.quiz.pk).update(draw_count=1)
+        self.quiz.refresh_from_db()
+        everything_right = {f"question_{choices[0].question_id}": str(choices[0].pk) for choices in self.choices}
+        key = get_answer_key(self.quiz)
+        for seed in range(12):
+            attempt = Attempt.objects.create(
+                quiz=self.quiz, taker=self.teacher, seed=seed,
+                question_ids=draw_question_ids(key, self.quiz, seed),
+            )
+            finalize_attempt(attempt, everything_right)
+            self.assertEqual(attempt.score, 100.0)
+
+        analysis = get_item_analysis(self.quiz, refresh=True)
+        self.assertEqual(analysis.attempt_count, 12)
+        self.assertEqual(sum(item.shown for item in analysis.items), 12)
+        for item in analysis.items:
+            if item.shown:
+                self.assertEqual((item.p_value, item.unanswered_rate), (1.0, 0.0))
+                self.assertEqual(item.choices[0].rate, 1.0)
+        self.assertIsNone(analysis.alpha)
+
+        # the cached sums are folded in the same way as a rebuild
+        finalize_attempt(Attempt.objects.create(
+            quiz=self.quiz, taker=self.teacher, seed=99, question_ids=draw_question_ids(key, self.quiz, 99),
+        ), {})
+        incremental = get_item_analysis(self.quiz)
+        self.assertEqual(incremental, get_item_analysis(self.quiz, refresh=True))
+        self.assertLess(min(item.p_value for item in incremental.items if item.shown), 1.0)
+
+    def test_constant_item_has_no_discrimination(self):
+        self._grade([(0, 0, 0), (0, 1, 1)])
+        first = get_item_analysis(self.quiz).items[0]
+        self.assertEqual(first.p_value, 1.0)
+        self.assertIsNone(first.discrimination)
+
+    def test_shown_on_quiz_detail(self):
+        self._grade(self.RESPONSES)
+        self.client.force_login(self.teacher)
+        r = self.client.get(reverse("create_quiz:quiz_detail", args=[self.quiz.pk]))
+        self.assertContains(r, "Cronbach")
+        self.assertEqual(r.context["analysis"].attempt_count, 5)
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher", password="teachpw")
+        self.quiz = Quiz.objects.create(title="Bank", creator=self.teacher)
+        Question.objects.create(quiz=self.quiz, text="Existing", qtype="short", order=3)
+
+    def _parse(self, fmt, text):
+        return list(PARSERS[fmt](io.StringIO(text)))
+
+    def _summary(self, items):
+        return [(i.text, i.qtype, i.choices, i.error) for i in items]
+
+    def test_json_and_jsonl(self):
+        data = [
+            {"text": "2+2?", "choices": [{"text": "4", "correct": True}, {"text": "5"}]},
+            {"text": "Capital of France?", "choices": ["Rome", "Paris"], "answer": "B"},
+            {"text": "Explain", "type": "short"},
+        ]
+        expected = [
+            ("2+2?", "mcq", [("4", True), ("5", False)], None),
+            ("Capital of France?", "mcq", [("Rome", False), ("Paris", True)], None),
+            ("Explain", "short", [], None),
+        ]
+        self.assertEqual(self._summary(self._parse("json", json.dumps({"questions": data}))), expected)
+        jsonl = "\n".join(json.dumps(d) for d in data) + "\n{broken\n"
+        items = self._parse("jsonl", jsonl)
+        self.assertEqual(self._summary(items[:3]), expected)
+        self.assertEqual(items[3].line, 4)
+        self.assertIn("invalid JSON", items[3].error)
+
+    def test_csv(self):
+        text = "text,type,answer,choice1,choice2,choice3\n2+2?,mcq,1,4,5,\nWhy?,short,,,,\n\n\"a, b\",,c,a,b,c\n"
+        self.assertEqual(self._summary(self._parse("csv", text)), [
+            ("2+2?", "mcq", [("4", True), ("5", False)], None),
+            ("Why?", "short", [], None),
+            ("a, b", "mcq", [("a", False), ("b", False), ("c", True)], None),
+        ])
+
+    def test_gift(self):
+        text = (
+            "// comment\n"
+            "::Q1:: What is 2+2? {=4 ~3 ~5#too big}\n"
+            "\n"
+            "Grass is green.{T}\n"
+            "\n"
+            "Describe \\{braces\\}.{}\n"
+            "\n"
+            "Name a colour. {=red =blue}\n"
+            "\n"
+            "Pi? {#3.14:0.01}\n"
+        )
+        items = self._parse("gift", text)
+        self.assertEqual(self._summary(items[:4]), [
+            ("What is 2+2?", "mcq", [("4", True), ("3", False), ("5", False)], None),
+            ("Grass is green.", "mcq", [("True", True), ("False", False)], None),
+            ("Describe {braces}.", "short", [], None),
+            ("Name a colour.", "short", [], None),
+        ])
+        self.assertEqual(items[0].line, 2)
+        self.assertIn("not supported", items[4].error)
+
+    def test_aiken(self):
+        text = "Is 7 prime?\nA. Yes\nB) No\nANSWER: A\n\nBroken question\nA. x\nB. y\nANSWER: D\n"
+        items = self._parse("aiken", text)
+        self.assertEqual(self._summary(items[:1]), [("Is 7 prime?", "mcq", [("Yes", True), ("No", False)], None)])
+        self.assertEqual(items[1].line, 6)
+        self.assertIn("not one of the options", items[1].error)
+
+    def test_import_validates_and_bulk_inserts(self):
+        text = "\n".join(json.dumps(d) for d in [
+            {"text": "Good", "choices": [{"text": "a", "correct": True}, {"text": "b"}]},
+            {"text": "One choice", "choices": [{"text": "a", "correct": True}]},
+            {"text": "Two correct", "choices": [{"text": "a", "correct": True}, {"text": "b", "correct": True}]},
+            {"text": "Open"},
+            {"text": "Odd", "type": "matching"},
+        ])
+        self.quiz.refresh_from_db()
+        version = self.quiz.content_version
+        with self.captureOnCommitCallbacks(execute=True):
+            result = import_file(self.quiz, io.StringIO(text), "jsonl", batch_size=1)
+        self.assertEqual(result.created, 2)
+        self.assertEqual(result.errors, [
+            (2, "at least 2 choices"),
+            (3, "exactly one choice must be marked correct"),
+            (5, "unknown question type 'matching'"),
+        ])
+        self.assertGreater(result.questions_per_second, 0)
+        imported = list(self.quiz.questions.exclude(text="Existing").order_by("order"))
+        self.assertEqual([(q.text, q.order) for q in imported], [("Good", 3 + GAP), ("Open", 3 + 2 * GAP)])
+        self.assertEqual(
+            list(imported[0].choices.values_list("text", "is_correct")), [("a", True), ("b", False)]
+        )
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.quiz.content_version, version + 1)
+        self.assertIn(" good ", QuizSearchEntry.objects.get(quiz=self.quiz).tokens)
+
+    def test_strict_import_rolls_back(self):
+        text = "Q?\nA. x\nB. y\nANSWER: A\n\nBad?\nA. x\nANSWER: A\n"
+        result = import_file(self.quiz, io.StringIO(text), "aiken", strict=True)
+        self.assertTrue(result.rolled_back)
+        self.assertEqual(result.created, 0)
+        self.assertEqual(self.quiz.questions.count(), 1)
+
+    def test_upload_view(self):
+        self.client.login(username="teacher", password="teachpw")
+        url = reverse("create_quiz:import_questions", args=[self.quiz.pk])
+        upload = SimpleUploadedFile("bank.csv", "text,answer,choice1,choice2\nคำถาม,2,ก,ข\n".encode("utf-8-sig"))
+        r = self.client.post(url, {"file": upload})
+        self.assertContains(r, "Imported 1 question")
+        q = self.quiz.questions.get(text="คำถาม")
+        self.assertEqual(q.choices.get(is_correct=True).text, "ข")
+
+        r = self.client.post(url, {"file": SimpleUploadedFile("bank.txt", b"Q")})
+        self.assertContains(r, "choose one")
+
+        other = User.objects.create_user(username="other", password="otherpw")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
@@ -13,4 +13,8 @@ urlpatterns = [
 	path("<int:pk>/publish-toggle/", views.toggle_publish, name="toggle_publish"),
     path("<int:pk>/delete/", views.QuizDeleteView.as_view(), name="quiz_delete"),
     path("<int:quiz_id>/reorder/", views.reorder_questions, name="reorder_questions"),
+    path("questions/<int:pk>/move/", views.move_question, name="move_question"),
+    path("<int:pk>/export/<str:fmt>/", views.quiz_export, name="quiz_export"),
+    path("<int:quiz_id>/import/", views.import_questions, name="import_questions"),
+    path("<int:pk>/clone/", views.clone_quiz, name="quiz_clone"),
 ]
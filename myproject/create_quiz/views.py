@@ -1,15 +1,27 @@
+import io
+import json
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DetailView, DeleteView
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from myapp.models import Quiz, Question, Choice
-from .forms import QuizForm, QuestionForm, make_choice_formset
+from myapp.export import export_response
+from myapp.models import Quiz, Question, Choice, Attempt
+from myapp.signals import quiz_content_changed
+from .forms import QuizForm, QuestionForm, QuestionImportForm, make_choice_formset
 from django.http import JsonResponse, HttpResponseForbidden
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
-from room.models import RoomQuizAssignment, RoomMembership
+from room.models import Room
+from room.permissions import can_manage_quiz, managed_room_ids
+from take_quiz.regrade import regrade_or_defer
+from .importers import import_file
+from .item_analysis import get_item_analysis
+from .ordering import apply_order, move_after, next_order
+from .search import search_quizzes
 
 @method_decorator(login_required, name="dispatch")
 class QuizListView(ListView):
@@ -18,7 +30,13 @@ class QuizListView(ListView):
 	context_object_name = "quizzes"
 
 	def get_queryset(self):
-		return Quiz.objects.filter(creator=self.request.user).order_by("-created_at")
+		qs = Quiz.objects.filter(creator=self.request.user).order_by("-created_at")
+		return search_quizzes(qs, self.request.GET.get("q", ""))
+
+	def get_context_data(self, **kwargs):
+		context = super().get_context_data(**kwargs)
+		context["q"] = self.request.GET.get("q", "")
+		return context
 
 @method_decorator(login_required, name="dispatch")
 class QuizCreateView(CreateView):
@@ -56,7 +74,12 @@ class QuizDetailView(DetailView):
 
 	def get_queryset(self):
 		return Quiz.objects.filter(creator=self.request.user)
-     
+
+	def get_context_data(self, **kwargs):
+		context = super().get_context_data(**kwargs)
+		context["analysis"] = get_item_analysis(self.object, refresh="refresh_stats" in self.request.GET)
+		return context
+
 class QuizDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
     model = Quiz
     template_name = "create_quiz/quiz_confirm_delete.html"
@@ -84,7 +107,7 @@ def add_question(request, quiz_id):
         if not post.get("qtype"):
             post["qtype"] = "short"
         if not post.get("order"):
-            post["order"] = str(quiz.questions.count() + 1)
+            post["order"] = str(next_order(quiz))
 
         qform = QuestionForm(post)
         qform_is_valid = qform.is_valid()
@@ -95,8 +118,10 @@ def add_question(request, quiz_id):
             question_instance = qform.save(commit=False)
             question_instance.quiz = quiz
             if not question_instance.order:
-                question_instance.order = quiz.questions.count() + 1
+                question_instance.order = next_order(quiz)
             question_instance.save()
+            if qform.save_accepted_answers(question_instance):
+                quiz_content_changed.send(sender=Question, quiz_id=quiz.pk)
 
         if posted_qtype == "mcq":
             if question_instance:
@@ -137,8 +162,7 @@ def add_question(request, quiz_id):
                 "is_new": True,
             })
 
-    initial_order = quiz.questions.count() + 1
-    qform = QuestionForm(initial={"order": initial_order, "qtype": "short"})
+    qform = QuestionForm(initial={"qtype": "short"})
     formset = ChoiceFormSetClass(prefix=prefix)
     return render(request, "create_quiz/question_form.html", {
         "form": qform,
@@ -168,6 +192,14 @@ def edit_question(request, pk):
             form.save()
             if formset:
                 formset.save()
+            rules_changed = form.save_accepted_answers(question)
+            quiz_content_changed.send(sender=Question, quiz_id=question.quiz_id)
+            if rules_changed and regrade_or_defer(question) is None:
+                messages.info(
+                    request,
+                    "The accepted answers were saved. This question has too many stored answers "
+                    "to regrade now; they will be regraded in the background and scores updated then.",
+                )
             return redirect("create_quiz:quiz_detail", pk=question.quiz.pk)
         else:
             if qtype == "mcq" and not formset:
@@ -200,27 +232,12 @@ def toggle_publish(request, pk):
         return HttpResponseForbidden()
 
     quiz = get_object_or_404(Quiz, pk=pk)
-
-    if quiz.creator == request.user:
-        allowed = True
-    else:
-        assignments = RoomQuizAssignment.objects.filter(quiz=quiz).select_related('room')
-        allowed = False
-        for assign in assignments:
-            room = assign.room
-            try:
-                membership = RoomMembership.objects.get(user=request.user, room=room)
-                if membership.role in (RoomMembership.ROLE_OWNER, RoomMembership.ROLE_ADMIN):
-                    allowed = True
-                    break
-            except RoomMembership.DoesNotExist:
-                continue
-
-    if not allowed:
+    if not can_manage_quiz(request.user, quiz):
         return HttpResponseForbidden()
 
     quiz.is_published = not quiz.is_published
     quiz.save()
+    quiz_content_changed.send(sender=Quiz, quiz_id=quiz.pk)
 
     next_url = request.POST.get('next') or request.GET.get('next') or request.META.get('HTTP_REFERER')
     if next_url:
@@ -235,7 +252,6 @@ def reorder_questions(request, quiz_id):
     Expect JSON body: {"order": [question_id_3, question_id_1, question_id_2, ...]}
     Only quiz.creator can reorder.
     """
-    import json
     quiz = get_object_or_404(Quiz, pk=quiz_id, creator=request.user)
     try:
         payload = json.loads(request.body.decode("utf-8"))
@@ -245,13 +261,82 @@ def reorder_questions(request, quiz_id):
     except Exception:
         return JsonResponse({"ok": False, "error": "invalid json"}, status=400)
 
-    q_ids = list(quiz.questions.values_list("id", flat=True))
-    if set(new_order) - set(q_ids):
-        return JsonResponse({"ok": False, "error": "invalid question ids"}, status=400)
-
     from django.db import transaction
     with transaction.atomic():
-        for idx, qid in enumerate(new_order, start=1):
-            Question.objects.filter(pk=qid, quiz=quiz).update(order=idx)
+        try:
+            apply_order(quiz, new_order)
+        except (ValueError, TypeError):
+            return JsonResponse({"ok": False, "error": "invalid question ids"}, status=400)
+        quiz_content_changed.send(sender=Quiz, quiz_id=quiz.pk)
 
     return JsonResponse({"ok": True})
+
+
+@login_required
+@require_POST
+def move_question(request, pk):
+    """
+    Expect JSON body: {"after": question_id or null}; null moves the
+    question to the top. Only quiz.creator can move.
+    """
+    question = get_object_or_404(Question.objects.select_related("quiz"), pk=pk, quiz__creator=request.user)
+    try:
+        after_id = json.loads(request.body.decode("utf-8")).get("after")
+        if after_id is not None and not isinstance(after_id, int):
+            raise ValueError
+    except (ValueError, AttributeError):
+        return JsonResponse({"ok": False, "error": "invalid payload"}, status=400)
+
+    try:
+        moved = move_after(question, after_id)
+    except Question.DoesNotExist:
+        return JsonResponse({"ok": False, "error": "invalid question id"}, status=400)
+    if moved:
+        quiz_content_changed.send(sender=Question, quiz_id=question.quiz_id)
+    return JsonResponse({"ok": True, "order": question.order})
+
+
+@login_required
+def quiz_export(request, pk, fmt):
+    quiz = get_object_or_404(Quiz, pk=pk, creator=request.user)
+    return export_response(Attempt.objects.filter(quiz=quiz), fmt, f"quiz-{quiz.pk}-results")
+
+
+@login_required
+def import_questions(request, quiz_id):
+    quiz = get_object_or_404(Quiz, pk=quiz_id, creator=request.user)
+    result = None
+    if request.method == "POST":
+        form = QuestionImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            # decode as the upload is read; large files stay on disk
+            stream = io.TextIOWrapper(form.cleaned_data["file"].file, encoding="utf-8-sig", newline="")
+            try:
+                result = import_file(
+                    quiz, stream, form.cleaned_data["format"], strict=form.cleaned_data["strict"]
+                )
+            except UnicodeDecodeError:
+                form.add_error("file", "The file is not UTF-8 text.")
+            finally:
+                stream.detach()
+    else:
+        form = QuestionImportForm()
+    return render(request, "create_quiz/quiz_import.html", {
+        "quiz": quiz,
+        "form": form,
+        "result": result,
+    })
+
+
+@login_required
+def clone_quiz(request, pk):
+    """Copy one of the user's quizzes, optionally assigning the copy to a room they manage."""
+    quiz = get_object_or_404(Quiz, pk=pk, creator=request.user)
+    rooms = Room.objects.filter(pk__in=managed_room_ids(request)).order_by("name")
+    if request.method == "POST":
+        room = None
+        if request.POST.get("room"):
+            room = get_object_or_404(rooms, code=request.POST["room"])
+        clone = quiz.clone(creator=request.user, room=room, assigned_by=request.user)
+        return redirect("create_quiz:quiz_detail", pk=clone.pk)
+    return render(request, "create_quiz/quiz_clone.html", {"quiz": quiz, "rooms": rooms})
@@ -0,0 +1,31 @@
+"""
+ASGI deployment profile: gunicorn managing uvicorn workers.
+
+    gunicorn -c gunicorn_asgi.conf.py
+
+Each worker runs one event loop serving the monitor streams (and the
+async exam views when ``TAKEQ_ASYNC_VIEWS=1``); sync views run in its
+thread pool. Without this file the project is served as before
+(``gunicorn myproject.wsgi``, sync workers). Settings can be overridden
+from the environment, e.g. ``WEB_CONCURRENCY=4 gunicorn -c gunicorn_asgi.conf.py``.
+
+The default in-memory live broker (``TAKEQ_LIVE_BROKER``) only reaches
+monitor streams in its own process, so the profile runs one worker
+unless a shared broker is configured.
+"""
+import multiprocessing
+import os
+
+wsgi_app = "myproject.asgi:application"
+worker_class = "uvicorn_worker.UvicornWorker"
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+_in_memory_broker = os.environ.get("TAKEQ_LIVE_BROKER", "myapp.live.InMemoryBroker") == "myapp.live.InMemoryBroker"
+workers = int(os.environ.get("WEB_CONCURRENCY", 1 if _in_memory_broker else multiprocessing.cpu_count() + 1))
+
+# monitor streams stay open; the keepalive (TAKEQ_MONITOR_KEEPALIVE_SECONDS)
+# must be shorter than any proxy idle timeout, and a worker must not be
+# killed for holding them
+timeout = 120
+graceful_timeout = 30
+keepalive = 75
+
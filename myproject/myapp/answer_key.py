@@ -0,0 +1,91 @@
+"""
+Compact, cached answer-key snapshot for a Quiz.
+
+A snapshot holds everything grading and result rendering need about a
+quiz's questions, choices and accepted short answers as flat,
+position-aligned tuples. It is built with two queries (three when the
+quiz has short questions) and stored in the cache under a key that
+includes ``Quiz.content_version``, so bumping the version (see
+``myapp.signals``) makes every stale snapshot unreachable without having
+to delete it.
+"""
+from typing import NamedTuple
+
+from django.core.cache import cache
+
+from .models import AcceptedAnswer, Question, Choice
+
+CACHE_TIMEOUT = 60 * 60 * 24
+# part of the cache key: bump when the fields of AnswerKey change
+FORMAT = 2
+
+
+class AnswerKey(NamedTuple):
+    quiz_id: int
+    version: int
+    question_ids: tuple
+    qtypes: tuple
+    question_texts: tuple
+    correct_choice_ids: tuple
+    # per question, choice ids in display order
+    choice_ids: tuple
+    choice_texts: tuple
+    # per question, (kind, value, tolerance) rules; see myapp.answer_rules
+    accepted: tuple
+
+    def index_of(self, question_id):
+        return self.question_ids.index(question_id)
+
+
+def cache_key(quiz_id, version):
+    return f"answer_key:{FORMAT}:{quiz_id}:{version}"
+
+
+def build_answer_key(quiz_id, version):
+    questions = list(
+        Question.objects.filter(quiz_id=quiz_id)
+        .order_by("order", "id")
+        .values_list("id", "qtype", "text")
+    )
+    choices = {}
+    for qid, cid, text, is_correct in (
+        Choice.objects.filter(question__quiz_id=quiz_id)
+        .order_by("id")
+        .values_list("question_id", "id", "text", "is_correct")
+    ):
+        choices.setdefault(qid, []).append((cid, text, is_correct))
+    accepted = {}
+    if any(qtype == "short" for _, qtype, _ in questions):
+        for qid, kind, value, tolerance in (
+            AcceptedAnswer.objects.filter(question__quiz_id=quiz_id)
+            .order_by("id")
+            .values_list("question_id", "kind", "value", "tolerance")
+        ):
+            accepted.setdefault(qid, []).append((kind, value, tolerance))
+
+    question_ids, qtypes, texts, correct_ids, choice_ids, choice_texts, rules = [], [], [], [], [], [], []
+    for qid, qtype, text in questions:
+        rows = choices.get(qid, ())
+        question_ids.append(qid)
+        qtypes.append(qtype)
+        texts.append(text)
+        correct_ids.append(next((cid for cid, _, ok in rows if ok), None))
+        choice_ids.append(tuple(cid for cid, _, _ in rows))
+        choice_texts.append(tuple(t for _, t, _ in rows))
+        rules.append(tuple(accepted.get(qid, ())) if qtype == "short" else ())
+
+    return AnswerKey(
+        quiz_id, version,
+        tuple(question_ids), tuple(qtypes), tuple(texts),
+        tuple(correct_ids), tuple(choice_ids), tuple(choice_texts), tuple(rules),
+    )
+
+
+def get_answer_key(quiz):
+    """Return the snapshot for ``quiz``, building and caching it on a miss."""
+    key = cache_key(quiz.pk, quiz.content_version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_answer_key(quiz.pk, quiz.content_version)
+        cache.set(key, snapshot, CACHE_TIMEOUT)
+    return snapshot
@@ -0,0 +1,230 @@
+"""
+Accepted-answer rules for short-answer questions.
+
+A rule is a ``(kind, value, tolerance)`` triple, as stored by
+``AcceptedAnswer``:
+
+* ``exact``      - the answer is ``value`` (surrounding whitespace aside);
+* ``normalized`` - the answer equals ``value`` once both went through
+  ``normalize``;
+* ``numeric``    - the answer reads as a number within ``tolerance`` of
+  ``value``;
+* ``regex``      - ``value`` matches the whole answer.
+
+Teacher-written patterns run on student input inside the submit
+request, so ``regex`` rules are limited to a subset that cannot
+backtrack catastrophically (``check_pattern``): no quantifier or
+alternation inside a repeated group, no backreferences, and at most
+``MAX_QUANTIFIERS`` variable quantifiers. They are only tried on answers
+of up to ``REGEX_MAX_TEXT`` characters.
+
+An answer is correct when any rule of its question accepts it.
+``compile_rules`` turns a question's rules into one ``Matcher``, and
+``for_key`` compiles every question of an answer-key snapshot once per
+quiz version and process. Nothing here imports Django, so
+``grade_texts`` can run in worker processes (``take_quiz.regrade``).
+"""
+import math
+import re
+import unicodedata
+from collections import OrderedDict
+
+try:
+    from re import _constants as _sre, _parser as _sre_parse
+except ImportError:  # Python < 3.11
+    import sre_constants as _sre, sre_parse as _sre_parse
+
+EXACT = "exact"
+NORMALIZED = "normalized"
+NUMERIC = "numeric"
+REGEX = "regex"
+KINDS = (EXACT, NORMALIZED, NUMERIC, REGEX)
+
+# k overlapping quantifiers can take ~n**k steps on an answer of n chars;
+# 3 on REGEX_MAX_TEXT chars takes milliseconds
+MAX_QUANTIFIERS = 3
+REGEX_MAX_TEXT = 200
+
+# Thai (U+0E50..), Arabic-Indic (U+0660..) and Eastern Arabic-Indic (U+06F0..) digits
+_DIGITS = {
+    base + i: str(i) for base in (0x0E50, 0x0660, 0x06F0) for i in range(10)
+}
+# Arabic harakat, superscript alef and tatweel carry no meaning for matching
+_ARABIC_MARKS = {cp: None for cp in [*range(0x064B, 0x0660), 0x0670, 0x0640]}
+_TRANSLATE = {**_DIGITS, **_ARABIC_MARKS}
+
+# Thai marks stacked on one consonant, in the order they should be typed:
+# below vowels, above vowels, tone marks, then the other signs. Without
+# this, a word typed nikhahit + tone mark + sara aa would not match the
+# same word typed tone mark + sara am.
+_THAI_MARK_RANK = {
+    **{chr(cp): 0 for cp in (0x0E38, 0x0E39, 0x0E3A)},
+    **{chr(cp): 1 for cp in (0x0E31, 0x0E34, 0x0E35, 0x0E36, 0x0E37, 0x0E47)},
+    **{chr(cp): 2 for cp in (0x0E48, 0x0E49, 0x0E4A, 0x0E4B)},
+    **{chr(cp): 3 for cp in (0x0E4C, 0x0E4D, 0x0E4E)},
+}
+_THAI_MARKS = re.compile("[%s]{2,}" % "".join(_THAI_MARK_RANK))
+
+# Arabic decimal and thousands separators
+_NUMBER_TRANSLATE = {**_DIGITS, 0x066B: ".", 0x066C: None, ord(","): None, ord("_"): None}
+
+
+def _order_thai_marks(match):
+    # a mark typed twice on the same consonant counts once
+    return "".join(sorted(set(match.group()), key=lambda ch: (_THAI_MARK_RANK[ch], ch)))
+
+
+def normalize(text):
+    """
+    Canonical form for ``normalized`` rules: NFKC (so sara am is
+    nikhahit + sara aa, full-width forms are plain), case folded,
+    Thai and Arabic-Indic digits as ASCII, Arabic diacritics and
+    tatweel removed, Thai marks in canonical order, and whitespace
+    collapsed to single spaces.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold().translate(_TRANSLATE)
+    text = _THAI_MARKS.sub(_order_thai_marks, text)
+    return " ".join(text.split())
+
+
+def parse_number(text):
+    """
+    Read ``text`` as a finite number, or return None. Commas and
+    underscores are taken as thousands separators.
+    """
+    text = unicodedata.normalize("NFKC", text).translate(_NUMBER_TRANSLATE)
+    try:
+        value = float("".join(text.split()))
+    except ValueError:
+        return None
+    return value if math.isfinite(value) else None
+
+
+_REPEATS = {_sre.MAX_REPEAT, _sre.MIN_REPEAT, getattr(_sre, "POSSESSIVE_REPEAT", _sre.MAX_REPEAT)}
+
+
+def _count_quantifiers(items, repeated=False):
+    """Variable quantifiers of parsed pattern ``items``; ValueError on an unsafe construct."""
+    count = 0
+    for op, av in items:
+        if op in _REPEATS:
+            low, high, sub = av
+            if low != high:
+                if repeated:
+                    raise ValueError("a quantifier inside a repeated group, such as (a+)+, is not allowed")
+                count += 1
+            count += _count_quantifiers(sub, repeated or high > 1)
+        elif op == _sre.BRANCH:
+            if repeated:
+                raise ValueError("alternatives inside a repeated group, such as (a|ab)+, are not allowed")
+            count += sum(_count_quantifiers(sub, repeated) for sub in av[1])
+        elif op == _sre.SUBPATTERN:
+            count += _count_quantifiers(av[-1], repeated)
+        elif op in (_sre.ASSERT, _sre.ASSERT_NOT):
+            count += _count_quantifiers(av[1], repeated)
+        elif op == getattr(_sre, "ATOMIC_GROUP", None):
+            count += _count_quantifiers(av, repeated)
+        elif op == _sre.GROUPREF_EXISTS:
+            count += sum(_count_quantifiers(sub, repeated) for sub in av[1:] if sub)
+        elif op == _sre.GROUPREF:
+            raise ValueError("backreferences are not allowed")
+    return count
+
+
+def check_pattern(value):
+    """Raise ValueError unless ``value`` compiles and is in the safe subset."""
+    try:
+        re.compile(value)
+    except re.error as exc:
+        raise ValueError(f"invalid regular expression: {exc}") from None
+    if _count_quantifiers(_sre_parse.parse(value)) > MAX_QUANTIFIERS:
+        raise ValueError(f"use at most {MAX_QUANTIFIERS} quantifiers such as *, + or {{1,3}}")
+
+
+def check_rule(kind, value, tolerance=0):
+    """Raise ValueError if the rule cannot be compiled."""
+    if kind not in KINDS:
+        raise ValueError(f"unknown rule kind {kind!r}")
+    if not value.strip():
+        raise ValueError("the accepted answer is empty")
+    if kind == NUMERIC:
+        if parse_number(value) is None:
+            raise ValueError(f"{value!r} is not a number")
+        if tolerance is None or not math.isfinite(tolerance) or tolerance < 0:
+            raise ValueError("the tolerance must be a number of 0 or more")
+    elif kind == REGEX:
+        check_pattern(value)
+
+
+class Matcher:
+    """All accepted answers of one question; call it with an answer."""
+
+    __slots__ = ("exact", "normalized", "numbers", "patterns")
+
+    def __init__(self, rules):
+        exact, normalized, numbers, patterns = set(), set(), [], []
+        for kind, value, tolerance in rules:
+            try:
+                check_rule(kind, value, tolerance)
+            except ValueError:
+                if kind != REGEX:
+                    raise
+                # a pattern saved before check_pattern existed: never run it
+                continue
+            if kind == EXACT:
+                exact.add(value.strip())
+            elif kind == NORMALIZED:
+                normalized.add(normalize(value))
+            elif kind == NUMERIC:
+                numbers.append((parse_number(value), tolerance or 0))
+            else:
+                patterns.append(re.compile(value))
+        self.exact = frozenset(exact)
+        self.normalized = frozenset(normalized)
+        self.numbers = tuple(numbers)
+        self.patterns = tuple(patterns)
+
+    def __call__(self, text):
+        text = text.strip()
+        if text in self.exact:
+            return True
+        if self.normalized and normalize(text) in self.normalized:
+            return True
+        if self.numbers:
+            number = parse_number(text)
+            if number is not None and any(abs(number - v) <= tol for v, tol in self.numbers):
+                return True
+        return len(text) <= REGEX_MAX_TEXT and any(p.fullmatch(text) for p in self.patterns)
+
+
+def compile_rules(rules):
+    """A ``Matcher`` for ``rules``, or None when there are none."""
+    return Matcher(rules) if rules else None
+
+
+_compiled = OrderedDict()
+COMPILED_KEYS = 256
+
+
+def for_key(key):
+    """
+    Matchers of an ``AnswerKey``, position-aligned with its questions
+    (None where a question has no rules). Compiled once per quiz
+    version; the most recent ``COMPILED_KEYS`` versions are kept.
+    """
+    ckey = (key.quiz_id, key.version)
+    matchers = _compiled.get(ckey)
+    if matchers is None:
+        matchers = tuple(compile_rules(rules) for rules in key.accepted)
+        _compiled[ckey] = matchers
+        while len(_compiled) > COMPILED_KEYS:
+            _compiled.popitem(last=False)
+    return matchers
+
+
+def grade_texts(rules, texts):
+    """Verdicts for ``texts`` under ``rules`` (None without rules); picklable for process pools."""
+    matcher = compile_rules(rules)
+    if matcher is None:
+        return [None] * len(texts)
+    return [matcher(text) for text in texts]
@@ -0,0 +1,135 @@
+"""
+Helpers shared by the ``bench_*`` management commands.
+
+Benchmarks run against a throwaway test database so they never touch
+real data; point ``DATABASES`` at Postgres to benchmark that backend.
+``wsgi_call`` and ``asgi_call`` drive the project's WSGI and ASGI
+applications in-process, without a server or sockets.
+"""
+import asyncio
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import django
+from django.db import connections
+from django.test.utils import setup_databases, teardown_databases
+
+
+@contextmanager
+def scratch_database(verbosity=0):
+    # SQLite's default in-memory test database locks whole tables across
+    # connections, so use a temporary file for multi-threaded benchmarks,
+    # and take the write lock up front so concurrent writers queue on the
+    # busy timeout instead of failing on lock upgrade.
+    tmpdir = None
+    for conn in connections.all():
+        if conn.vendor != "sqlite":
+            continue
+        test_settings = conn.settings_dict.setdefault("TEST", {})
+        if not test_settings.get("NAME"):
+            tmpdir = tmpdir or tempfile.mkdtemp(prefix="takeq-bench-")
+            test_settings["NAME"] = os.path.join(tmpdir, f"{conn.alias}.sqlite3")
+        if django.VERSION >= (5, 1):
+            conn.settings_dict["OPTIONS"].setdefault("transaction_mode", "IMMEDIATE")
+        conn.settings_dict["OPTIONS"].setdefault("timeout", 30)
+        conn.close()
+
+    old_config = setup_databases(verbosity, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity)
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+@contextmanager
+def timer():
+    """Yield a dict whose ``seconds`` key is filled in on exit."""
+    result = {}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["seconds"] = time.perf_counter() - start
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(label, samples):
+    """One-line latency summary for ``samples`` given in seconds."""
+    ms = [s * 1000.0 for s in samples]
+    return (
+        f"{label}: n={len(ms)} "
+        f"p50={percentile(ms, 50):.1f}ms p95={percentile(ms, 95):.1f}ms "
+        f"p99={percentile(ms, 99):.1f}ms max={max(ms, default=0):.1f}ms"
+    )
+
+
+def _environ(method, path, body, headers):
+    environ = {
+        "REQUEST_METHOD": method, "PATH_INFO": path, "SCRIPT_NAME": "", "QUERY_STRING": "",
+        "SERVER_NAME": "localhost", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1",
+        "REMOTE_ADDR": "127.0.0.1", "HTTP_HOST": "localhost",
+        "wsgi.version": (1, 0), "wsgi.url_scheme": "http", "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr, "wsgi.multithread": True, "wsgi.multiprocess": False,
+        "wsgi.run_once": False, "CONTENT_LENGTH": str(len(body)),
+    }
+    for name, value in (headers or {}).items():
+        key = name.upper().replace("-", "_")
+        environ[key if key == "CONTENT_TYPE" else f"HTTP_{key}"] = value
+    return environ
+
+
+def wsgi_call(application, method, path, body=b"", headers=None):
+    """Call a WSGI ``application`` in-process; returns ``(status, body)``."""
+    status = []
+    result = application(_environ(method, path, body, headers), lambda s, h, exc_info=None: status.append(s))
+    try:
+        content = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return int(status[0].split()[0]), content
+
+
+async def asgi_call(application, method, path, body=b"", headers=None):
+    """Call an ASGI ``application`` in-process; returns ``(status, body)``."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+        "headers": [(b"host", b"localhost")] + [
+            (name.lower().encode(), value.encode()) for name, value in (headers or {}).items()
+        ],
+    }
+    sent, done, status, chunks = [], asyncio.Event(), [], []
+
+    async def receive():
+        if not sent:
+            sent.append(True)
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                done.set()
+
+    await application(scope, receive, send)
+    return status[0], b"".join(chunks)
@@ -0,0 +1,24 @@
+"""
+Whether the default cache is shared by every process serving the site.
+
+Counters, role maps and leaderboards that other workers or the
+management commands (grading worker, expiry sweeper) change are only
+cached across requests in a shared cache (Redis, Memcached, the database
+cache...). ``LocMemCache`` lives inside one process, where such entries
+would go stale, so with it those features fall back to the database.
+``TAKEQ_SHARED_CACHE`` overrides the guess, e.g. for a single-process
+deployment.
+"""
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS
+
+PROCESS_LOCAL_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+}
+
+
+def cache_is_shared():
+    shared = getattr(settings, "TAKEQ_SHARED_CACHE", None)
+    if shared is not None:
+        return shared
+    return settings.CACHES[DEFAULT_CACHE_ALIAS]["BACKEND"] not in PROCESS_LOCAL_BACKENDS
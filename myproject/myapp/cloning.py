@@ -0,0 +1,97 @@
+"""
+Deep copies of quizzes with their questions, choices and accepted answers.
+
+``clone_quizzes`` reads the sources with one query per table and writes
+the copies with one ``bulk_create`` per table. Ids returned by each
+INSERT are mapped back to the source rows in memory, so the query count
+does not depend on how many quizzes, questions or choices are copied.
+Copies keep their sources' search entries, since the indexed text is
+the same.
+"""
+from django.apps import apps
+from django.db import transaction
+
+from .models import AcceptedAnswer, Quiz, Question, Choice
+
+COPIED_QUIZ_FIELDS = (
+    "title", "description", "is_published", "time_limit_minutes",
+    "draw_count", "shuffle_questions", "shuffle_choices",
+)
+
+
+def clone_quizzes(quizzes, creator=None, room=None, assigned_by=None):
+    """
+    Copy ``quizzes`` (instances or a queryset) and return the copies in
+    the same order. ``creator`` becomes the owner of every copy (default:
+    the source's creator). With ``room``, the copies are also assigned to
+    it, recorded as assigned by ``assigned_by``.
+    """
+    sources = list(quizzes)
+    if not sources:
+        return []
+    source_ids = [q.pk for q in sources]
+    questions = list(
+        Question.objects.filter(quiz_id__in=source_ids)
+        .order_by("quiz_id", "order", "id")
+        .values_list("id", "quiz_id", "text", "qtype", "order")
+    )
+    choices = list(
+        Choice.objects.filter(question__quiz_id__in=source_ids)
+        .order_by("question_id", "id")
+        .values_list("question_id", "text", "is_correct")
+    )
+    accepted = list(
+        AcceptedAnswer.objects.filter(question__quiz_id__in=source_ids)
+        .order_by("question_id", "id")
+        .values_list("question_id", "kind", "value", "tolerance")
+    )
+
+    with transaction.atomic():
+        clones = Quiz.objects.bulk_create([
+            Quiz(
+                creator_id=creator.pk if creator else q.creator_id,
+                **{name: getattr(q, name) for name in COPIED_QUIZ_FIELDS},
+            )
+            for q in sources
+        ])
+        # a quiz listed twice is copied twice
+        quiz_map = {}
+        for source, clone in zip(sources, clones):
+            quiz_map.setdefault(source.pk, []).append(clone.pk)
+
+        new_questions = [
+            (old_id, Question(quiz_id=clone_id, text=text, qtype=qtype, order=order))
+            for old_id, quiz_id, text, qtype, order in questions
+            for clone_id in quiz_map[quiz_id]
+        ]
+        Question.objects.bulk_create([q for _, q in new_questions])
+        question_map = {}
+        for old_id, question in new_questions:
+            question_map.setdefault(old_id, []).append(question.pk)
+
+        Choice.objects.bulk_create([
+            Choice(question_id=new_id, text=text, is_correct=is_correct)
+            for question_id, text, is_correct in choices
+            for new_id in question_map[question_id]
+        ])
+        AcceptedAnswer.objects.bulk_create([
+            AcceptedAnswer(question_id=new_id, kind=kind, value=value, tolerance=tolerance)
+            for question_id, kind, value, tolerance in accepted
+            for new_id in question_map[question_id]
+        ])
+
+        QuizSearchEntry = apps.get_model("create_quiz", "QuizSearchEntry")
+        QuizSearchEntry.objects.bulk_create([
+            QuizSearchEntry(quiz_id=clone_id, tokens=tokens)
+            for quiz_id, tokens in QuizSearchEntry.objects.filter(
+                quiz_id__in=source_ids
+            ).values_list("quiz_id", "tokens")
+            for clone_id in quiz_map[quiz_id]
+        ])
+
+        if room is not None:
+            RoomQuizAssignment = apps.get_model("room", "RoomQuizAssignment")
+            RoomQuizAssignment.objects.bulk_create([
+                RoomQuizAssignment(room=room, quiz=clone, assigned_by=assigned_by) for clone in clones
+            ])
+    return clones
@@ -1,9 +1,14 @@
 from django.apps import apps
+from django.utils.functional import SimpleLazyObject
 
 def invite_counts(request):
     """
     Return pending invitation count for the logged-in user.
 
+    The count is lazy, so pages that never render it pay nothing, and it
+    is read from a per-user counter row (see
+    RoomInvitation.pending_count_for), cached when the cache is shared.
+
     Use apps.get_model(...) inside the function to avoid importing app modules
     at import time (prevents AppRegistryNotReady during Django startup).
     """
@@ -14,5 +19,4 @@ def invite_counts(request):
     if RoomInvitation is None:
         return {'room_invitation_count': 0}
 
-    pending = RoomInvitation.objects.filter(invited_user=request.user, status='pending').count()
-    return {'room_invitation_count': pending}
+    return {'room_invitation_count': SimpleLazyObject(lambda: RoomInvitation.pending_count_for(request.user))}
@@ -0,0 +1,82 @@
+"""
+Dashboard data for ``views.home``.
+
+All of the user's rooms come from one membership query. Per-room counts
+are correlated subqueries rather than joins, so they do not multiply
+each other's rows. Rooms are grouped by role in Python. The result can
+be cached per user for ``TAKEQ_DASHBOARD_CACHE_SECONDS`` (0 disables).
+"""
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Attempt
+
+
+def subquery_count(queryset, group_field):
+    return Coalesce(
+        Subquery(
+            queryset.order_by().values(group_field).annotate(n=Count("pk")).values("n")[:1],
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+def build_dashboard(user):
+    RoomMembership = apps.get_model('room', 'RoomMembership')
+    RoomQuizAssignment = apps.get_model('room', 'RoomQuizAssignment')
+
+    memberships = (
+        RoomMembership.objects.filter(user=user)
+        .select_related("room")
+        .annotate(
+            member_count=subquery_count(RoomMembership.objects.filter(room=OuterRef("room")), "room"),
+            quiz_count=subquery_count(RoomQuizAssignment.objects.filter(room=OuterRef("room")), "room"),
+            unfinished_count=subquery_count(
+                Attempt.objects.filter(
+                    taker=user,
+                    finished_at__isnull=True,
+                    quiz__roomquizassignment__room=OuterRef("room"),
+                ),
+                "taker",
+            ),
+        )
+        .order_by("room_id")
+    )
+
+    groups = {
+        RoomMembership.ROLE_OWNER: [],
+        RoomMembership.ROLE_ADMIN: [],
+        RoomMembership.ROLE_STUDENT: [],
+    }
+    for m in memberships:
+        room = m.room
+        room.member_count = m.member_count
+        room.quiz_count = m.quiz_count
+        room.unfinished_count = m.unfinished_count
+        role = RoomMembership.ROLE_OWNER if room.owner_id == user.pk else m.role
+        groups.setdefault(role, []).append(room)
+
+    return {
+        'owner_rooms': groups[RoomMembership.ROLE_OWNER],
+        'admin_rooms': groups[RoomMembership.ROLE_ADMIN],
+        'student_rooms': groups[RoomMembership.ROLE_STUDENT],
+    }
+
+
+def cache_key(user_id):
+    return f"dashboard:{user_id}"
+
+
+def get_dashboard(user):
+    timeout = getattr(settings, "TAKEQ_DASHBOARD_CACHE_SECONDS", 0)
+    if not timeout:
+        return build_dashboard(user)
+    context = cache.get(cache_key(user.pk))
+    if context is None:
+        context = build_dashboard(user)
+        cache.set(cache_key(user.pk), context, timeout)
+    return context
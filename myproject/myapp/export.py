@@ -0,0 +1,266 @@
+"""
+Streaming export of graded attempts, one row per answer.
+
+Rows come from a single ``values_list`` query that joins attempts to
+their answers, questions and choices. The query is read with
+``.iterator(chunk_size=...)`` and each row is encoded as soon as it
+arrives, so a response of any size is produced with flat memory:
+
+* ``csv``   - ``csv.writer`` over a pass-through buffer;
+* ``jsonl`` - one JSON object per line;
+* ``xlsx``  - a minimal SpreadsheetML workbook written through
+  ``zipfile`` into an unseekable sink, so the worksheet is deflated and
+  sent while it is being generated.
+"""
+import csv
+import json
+import math
+import re
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from django.apps import apps
+from django.db.models import Exists, OuterRef
+from django.db.models.functions import Coalesce
+from django.http import Http404, StreamingHttpResponse
+from django.utils.text import slugify
+
+from .models import Attempt, Question
+
+CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024
+
+COLUMNS = [
+    ("attempt_id", "pk"),
+    ("student", "taker__username"),
+    ("quiz_id", "quiz_id"),
+    ("quiz", "quiz__title"),
+    ("started_at", "started_at"),
+    ("finished_at", "finished_at"),
+    ("score", "score"),
+    ("question_id", "answers__question_id"),
+    ("question_order", "answers__question__order"),
+    ("question", "answers__question__text"),
+    ("question_type", "answers__question__qtype"),
+    ("selected_choice", "answers__selected_choice__text"),
+    # the stored verdict of a short answer; MCQ rows store none and follow the choice
+    ("is_correct", Coalesce("answers__is_correct", "answers__selected_choice__is_correct")),
+    ("text_answer", "answers__text"),
+]
+HEADER = [label for label, _ in COLUMNS]
+
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "jsonl": ("application/x-ndjson; charset=utf-8", "jsonl"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+
+
+_QUESTION_ID = HEADER.index("question_id")
+_QUESTION_ORDER = HEADER.index("question_order")
+
+
+def question_positions(attempts):
+    """1-based position of every question of the quizzes of ``attempts``, by id."""
+    positions, quiz_id, position = {}, None, 0
+    for qid, qquiz in (
+        Question.objects.filter(quiz__in=attempts.values("quiz"))
+        .order_by("quiz_id", "order", "id")
+        .values_list("id", "quiz_id")
+    ):
+        position = position + 1 if qquiz == quiz_id else 1
+        quiz_id = qquiz
+        positions[qid] = position
+    return positions
+
+
+def export_rows(attempts):
+    """
+    Stream rows for the finished ``attempts`` queryset, ordered by attempt
+    and question. Attempts without answers yield one row of blanks.
+    ``question_order`` is the question's position in its quiz, not its
+    gapped rank (``create_quiz.ordering``).
+    """
+    attempts = attempts.filter(finished_at__isnull=False)
+    positions = question_positions(attempts)
+    for row in (
+        attempts.order_by("pk", "answers__question__order", "answers__question_id")
+        .values_list(*(field for _, field in COLUMNS))
+        .iterator(chunk_size=CHUNK_SIZE)
+    ):
+        row = list(row)
+        row[_QUESTION_ORDER] = positions.get(row[_QUESTION_ID])
+        yield row
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+# --- CSV --------------------------------------------------------------------
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _is_number(text):
+    try:
+        return math.isfinite(float(text))
+    except ValueError:
+        return False
+
+
+def _csv_cell(value):
+    value = _plain(value)
+    # keep spreadsheet apps from evaluating student text as a formula;
+    # answers such as "-3" are read as numbers and stay as they are
+    if isinstance(value, str) and value[:1] in _FORMULA_PREFIXES and not _is_number(value):
+        return "'" + value
+    return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield "\ufeff" + writer.writerow(HEADER)  # BOM so Excel reads UTF-8 (Thai) correctly
+    for row in rows:
+        yield writer.writerow([_csv_cell(v) for v in row])
+
+
+# --- JSONL ------------------------------------------------------------------
+
+def iter_jsonl(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(HEADER, map(_plain, row))), ensure_ascii=False) + "\n"
+
+
+# --- XLSX -------------------------------------------------------------------
+
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+_STATIC_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Answers" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_END = "</sheetData></worksheet>"
+
+
+def _xlsx_cell(value):
+    value = _plain(value)
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f"<c><v>{value!r}</v></c>"
+    text = escape(_XML_ILLEGAL.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values):
+    return "<row>" + "".join(_xlsx_cell(v) for v in values) + "</row>"
+
+
+class _Sink:
+    """Write-only, unseekable file object; ``zipfile`` streams into it."""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks, self.size = [], 0
+        return data
+
+
+def iter_xlsx(rows):
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, content in _STATIC_PARTS.items():
+            zf.writestr(name, content)
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write((_SHEET_START + _xlsx_row(HEADER)).encode())
+            for row in rows:
+                sheet.write(_xlsx_row(row).encode())
+                if sink.size >= FLUSH_BYTES:
+                    yield sink.drain()
+            sheet.write(_SHEET_END.encode())
+    yield sink.drain()
+
+
+WRITERS = {"csv": iter_csv, "jsonl": iter_jsonl, "xlsx": iter_xlsx}
+
+
+def export_response(attempts, fmt, filename):
+    """``StreamingHttpResponse`` exporting ``attempts`` as ``fmt``."""
+    if fmt not in FORMATS:
+        raise Http404("Unknown export format")
+    content_type, extension = FORMATS[fmt]
+    response = StreamingHttpResponse(WRITERS[fmt](export_rows(attempts)), content_type=content_type)
+    name = slugify(filename) or "export"
+    response["Content-Disposition"] = f'attachment; filename="{name}.{extension}"'
+    return response
+
+
+def room_attempts(room):
+    """Attempts by the room's students on the quizzes assigned to it."""
+    RoomMembership = apps.get_model('room', 'RoomMembership')
+    RoomQuizAssignment = apps.get_model('room', 'RoomQuizAssignment')
+    return Attempt.objects.filter(
+        Exists(RoomQuizAssignment.objects.filter(room=room, quiz=OuterRef("quiz"))),
+        Exists(RoomMembership.objects.filter(
+            room=room, user=OuterRef("taker"), role=RoomMembership.ROLE_STUDENT
+        )),
+    )
@@ -0,0 +1,96 @@
+"""
+Per-attempt question draw and shuffle.
+
+A quiz can draw ``Quiz.draw_count`` of its questions for every attempt
+and shuffle the questions and/or the choices of each. An attempt stores
+its ``seed`` and the ids of the questions it drew when it started
+(``Attempt.question_ids``), so adding or removing questions later does
+not re-draw it; the rest of the layout is derived again from the seed
+and the cached answer-key snapshot (``myapp.answer_key``) wherever it is
+needed, without a query. ``create_quiz.forms.QuizForm`` locks the draw
+and shuffle settings once a quiz has attempts.
+
+Every question and choice gets a pseudo-random rank from ``(seed, id)``.
+The draw is the ``draw_count`` lowest-ranked questions and a shuffle
+sorts by rank, so an edit to the quiz only moves the questions and
+choices it touches. The mixing function is spelled out here because
+the ``random`` module does not promise the same ``shuffle`` or
+``sample`` across Python versions.
+"""
+from typing import NamedTuple
+
+from .answer_key import get_answer_key
+
+_MASK = (1 << 64) - 1
+
+
+def _rank(seed, item_id):
+    # splitmix64 finalizer over the pair
+    z = (seed * 0x9E3779B97F4A7C15 + item_id) & _MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK
+    return z ^ (z >> 31)
+
+
+class Layout(NamedTuple):
+    # indexes into the answer key, in display order
+    positions: tuple
+    question_ids: tuple
+    # per displayed question, choice ids in display order
+    choice_ids: tuple
+    # displayed questions that count toward the score: MCQs, and short
+    # questions with accepted answers
+    scored_count: int
+
+
+def _drawn(key, quiz, seed, question_ids=None):
+    # answer-key positions of the drawn questions, in key order
+    if question_ids is not None:
+        kept = set(question_ids)
+        return [i for i, qid in enumerate(key.question_ids) if qid in kept]
+    positions = range(len(key.question_ids))
+    if quiz.draw_count and quiz.draw_count < len(positions):
+        ranked = sorted(positions, key=lambda i: _rank(seed, key.question_ids[i]))
+        return sorted(ranked[:quiz.draw_count])
+    return list(positions)
+
+
+def draw_question_ids(key, quiz, seed, question_ids=None):
+    """
+    Ids of the questions an attempt of ``quiz`` seeded with ``seed`` draws,
+    in key order: to store on it when it starts, or read back from its
+    stored ``question_ids``.
+    """
+    return [key.question_ids[i] for i in _drawn(key, quiz, seed, question_ids)]
+
+
+def layout_for(key, quiz, seed, question_ids=None):
+    """
+    The layout of ``key`` for an attempt of ``quiz`` seeded with ``seed``.
+    ``question_ids`` is the attempt's stored draw; questions deleted since
+    drop out and questions added since stay out.
+    """
+    positions = _drawn(key, quiz, seed, question_ids)
+    if quiz.shuffle_questions:
+        positions.sort(key=lambda i: _rank(seed, key.question_ids[i]))
+    positions = tuple(positions)
+
+    if quiz.shuffle_choices:
+        choice_ids = tuple(
+            tuple(sorted(key.choice_ids[i], key=lambda cid: _rank(seed, cid))) for i in positions
+        )
+    else:
+        choice_ids = tuple(key.choice_ids[i] for i in positions)
+    return Layout(
+        positions,
+        tuple(key.question_ids[i] for i in positions),
+        choice_ids,
+        sum(1 for i in positions if key.qtypes[i] == "mcq" or key.accepted[i]),
+    )
+
+
+def attempt_layout(attempt, key=None):
+    """Layout of ``attempt`` (with ``quiz`` loaded); no query when the key is cached."""
+    if key is None:
+        key = get_answer_key(attempt.quiz)
+    return layout_for(key, attempt.quiz, attempt.seed, attempt.question_ids)
@@ -0,0 +1,157 @@
+"""
+In-process publish/subscribe for live exam events.
+
+Views and grading publish small JSON-able dicts on ``quiz:<id>`` channels
+(see ``quiz_channel``) without touching the database; the room monitor
+stream subscribes to the channels of its room's quizzes and forwards each
+event as it arrives. The broker class comes from ``TAKEQ_LIVE_BROKER``
+(a dotted path). The default ``InMemoryBroker`` only reaches subscribers
+in the same process, so it suits a single ASGI worker (or tests); a
+multi-process deployment plugs in a backend with the same two methods
+(``publish`` and ``subscribe``) over a shared bus.
+"""
+import asyncio
+import itertools
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+DEFAULT_BROKER = "myapp.live.InMemoryBroker"
+_OVERFLOW = object()  # queued in place of the events a slow subscriber lost
+
+
+def quiz_channel(quiz_id):
+    return f"quiz:{quiz_id}"
+
+
+class Subscription:
+    """
+    Events of some channels, read with ``await sub.get()`` or
+    ``async for``. A subscriber that falls ``maxsize`` events behind is
+    cut off: ``overflowed`` is set and ``get`` raises ``Overflow``, so the
+    client reloads a fresh snapshot instead of receiving a gap.
+    """
+
+    class Overflow(Exception):
+        pass
+
+    def __init__(self, broker, channels, maxsize):
+        self.broker = broker
+        self.channels = tuple(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def _deliver(self, event):
+        # runs on the subscriber's loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.broker.unsubscribe(self)
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_OVERFLOW)
+
+    async def get(self, timeout=None):
+        """Next event, or None after ``timeout`` seconds without one."""
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event is _OVERFLOW:
+            raise self.Overflow()
+        return event
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.get()
+        except self.Overflow:
+            raise StopAsyncIteration
+
+
+class InMemoryBroker:
+    """
+    Fan-out to subscribers of this process. ``publish`` may be called
+    from any thread (sync views run in a thread pool under ASGI); each
+    delivery is handed to the subscriber's own event loop.
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._subscribers = {}  # channel -> set of Subscription
+        self._ids = itertools.count(1)
+
+    def subscribe(self, channels, maxsize=None):
+        """Subscribe to ``channels``; must be called inside a running loop."""
+        sub = Subscription(self, channels, maxsize or self.maxsize)
+        with self._lock:
+            for channel in sub.channels:
+                self._subscribers.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for channel in sub.channels:
+                subs = self._subscribers.get(channel)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subscribers[channel]
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return len(set().union(*self._subscribers.values()))
+
+    def publish(self, channel, event):
+        """Queue ``event`` for every subscriber of ``channel``; returns how many."""
+        event = {**event, "id": next(self._ids)}
+        with self._lock:
+            subs = list(self._subscribers.get(channel, ()))
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._deliver, event)
+            except RuntimeError:  # loop closed under a stale subscriber
+                self.unsubscribe(sub)
+        return len(subs)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, "TAKEQ_LIVE_BROKER", DEFAULT_BROKER))()
+    return _broker
+
+
+def reset_broker():
+    """Forget the broker instance (tests, or after changing the setting)."""
+    global _broker
+    _broker = None
+
+
+def publish(channel, event):
+    return get_broker().publish(channel, event)
+
+
+def publish_on_commit(channel, event):
+    """Publish once the current transaction commits, so rolled back writes are never announced."""
+    transaction.on_commit(lambda: publish(channel, event))
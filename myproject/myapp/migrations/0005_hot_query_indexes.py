@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:03
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def delete_duplicate_answers(apps, schema_editor):
+    """Keep only the newest answer per (attempt, question) before adding the constraint."""
+    Answer = apps.get_model('myapp', 'Answer')
+    keep = (
+        Answer.objects.filter(attempt__isnull=False, question__isnull=False)
+        .values('attempt', 'question')
+        .annotate(keep_id=Max('id'))
+        .values('keep_id')
+    )
+    Answer.objects.filter(attempt__isnull=False, question__isnull=False).exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_attempt_deadline'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attempt',
+            index=models.Index(fields=['taker', 'quiz'], name='attempt_taker_quiz_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attempt',
+            index=models.Index(fields=['quiz', 'finished_at'], name='attempt_quiz_finished_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['quiz', 'order', 'id'], name='question_quiz_order_idx'),
+        ),
+        migrations.RunPython(delete_duplicate_answers, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='answer',
+            constraint=models.UniqueConstraint(fields=('attempt', 'question'), name='answer_attempt_question_uniq'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+from django.db.models import Case, Value, When
+
+GAP = 1024  # create_quiz.ordering.GAP when this migration was written
+
+
+def space_orders(apps, schema_editor):
+    Question = apps.get_model("myapp", "Question")
+    quiz_ids = Question.objects.order_by().values_list("quiz_id", flat=True).distinct()
+    for quiz_id in quiz_ids.iterator():
+        ids = list(Question.objects.filter(quiz_id=quiz_id).order_by("order", "id").values_list("pk", flat=True))
+        Question.objects.filter(pk__in=ids).update(
+            order=Case(*[When(pk=pk, then=Value((i + 1) * GAP)) for i, pk in enumerate(ids)])
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_quiz_catalogue_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(space_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:32
+
+import django.core.validators
+import myapp.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_space_question_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attempt',
+            name='seed',
+            field=models.PositiveIntegerField(default=myapp.models.new_seed, editable=False),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='draw_count',
+            field=models.PositiveIntegerField(blank=True, help_text='Questions drawn at random for each attempt. Leave empty to use all.', null=True, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='shuffle_choices',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='shuffle_questions',
+            field=models.BooleanField(default=False),
+        ),
+    ]
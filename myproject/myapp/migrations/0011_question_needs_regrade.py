@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_attempt_question_ids'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='needs_regrade',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0011_question_needs_regrade'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attempt',
+            name='submitted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,12 @@
+import secrets
+
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from . import answer_rules
+
 User = get_user_model()
 
 
@@ -25,10 +31,31 @@ class Quiz(models.Model):
     is_published = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     time_limit_minutes = models.PositiveIntegerField(null=True, blank=True)
+    # bumped whenever questions/choices change; keys cached snapshots
+    content_version = models.PositiveIntegerField(default=1, editable=False)
+    # per-attempt layout, see myapp.layout
+    draw_count = models.PositiveIntegerField(
+        null=True, blank=True, validators=[MinValueValidator(1)],
+        help_text="Questions drawn at random for each attempt. Leave empty to use all.",
+    )
+    shuffle_questions = models.BooleanField(default=False)
+    shuffle_choices = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # keyset pages of the catalogue: published, newest first
+            models.Index(fields=["is_published", "-created_at", "-id"], name="quiz_published_created_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
+    def clone(self, creator=None, room=None, assigned_by=None):
+        """Deep copy with questions, choices and accepted answers; see ``myapp.cloning.clone_quizzes``."""
+        from .cloning import clone_quizzes
+
+        return clone_quizzes([self], creator=creator, room=room, assigned_by=assigned_by)[0]
+
 
 class Question(models.Model):
     quiz = models.ForeignKey(
@@ -47,6 +74,15 @@ class Question(models.Model):
         ),
     )
     order = models.PositiveIntegerField(default=0)
+    # accepted answers changed with too many stored answers to regrade in
+    # the request; regrade_short_answers --pending picks it up
+    needs_regrade = models.BooleanField(default=False, editable=False)
+
+    class Meta:
+        indexes = [
+            # quiz.questions.order_by("order", "id")
+            models.Index(fields=["quiz", "order", "id"], name="question_quiz_order_idx"),
+        ]
 
 
 class Choice(models.Model):
@@ -62,6 +98,36 @@ class Choice(models.Model):
     is_correct = models.BooleanField(default=False)
 
 
+class AcceptedAnswer(models.Model):
+    """An answer accepted for a short question; see ``myapp.answer_rules``."""
+    KIND_EXACT = answer_rules.EXACT
+    KIND_NORMALIZED = answer_rules.NORMALIZED
+    KIND_NUMERIC = answer_rules.NUMERIC
+    KIND_REGEX = answer_rules.REGEX
+    KIND_CHOICES = (
+        (KIND_EXACT, "Exact"),
+        (KIND_NORMALIZED, "Normalized"),
+        (KIND_NUMERIC, "Numeric"),
+        (KIND_REGEX, "Regular expression"),
+    )
+
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name="accepted_answers")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=KIND_NORMALIZED)
+    value = models.CharField(max_length=500)
+    # numeric rules only: the largest accepted distance from value
+    tolerance = models.FloatField(default=0)
+
+    def clean(self):
+        try:
+            answer_rules.check_rule(self.kind, self.value, self.tolerance)
+        except ValueError as exc:
+            raise ValidationError(str(exc))
+
+
+def new_seed():
+    return secrets.randbits(31)
+
+
 class Attempt(models.Model):
    
     quiz = models.ForeignKey(
@@ -78,7 +144,17 @@ class Attempt(models.Model):
     )
     started_at = models.DateTimeField(auto_now_add=True)
     finished_at = models.DateTimeField(null=True, blank=True)
+    # started_at + quiz.time_limit_minutes; null when the quiz is untimed
+    deadline = models.DateTimeField(null=True, blank=True)
     score = models.FloatField(null=True, blank=True)
+    # set when a queued submit is accepted: the attempt takes no more
+    # answers while it waits for the grading worker (take_quiz.queue)
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    # derives the attempt's question draw and order (myapp.layout)
+    seed = models.PositiveIntegerField(default=new_seed, editable=False)
+    # ids of the questions drawn when the attempt started, so later edits
+    # to the quiz do not re-draw it; null for attempts started before
+    question_ids = models.JSONField(null=True, blank=True, editable=False)
 
     # room linkage (nullable)
     room = models.ForeignKey(
@@ -94,6 +170,14 @@ class Attempt(models.Model):
         on_delete=models.SET_NULL,
     )
 
+    class Meta:
+        indexes = [
+            # open attempts (finished_at IS NULL) ordered by deadline
+            models.Index(fields=["finished_at", "deadline"], name="attempt_open_deadline_idx"),
+            models.Index(fields=["taker", "quiz"], name="attempt_taker_quiz_idx"),
+            models.Index(fields=["quiz", "finished_at"], name="attempt_quiz_finished_idx"),
+        ]
+
 
 class Answer(models.Model):
     # 🔹 attempt nullable
@@ -118,3 +202,11 @@ class Answer(models.Model):
         blank=True,
     )
     text = models.TextField(blank=True)
+    # verdict of the accepted-answer rules on a short answer; None for MCQ
+    # answers (judged from the answer key) and questions without rules
+    is_correct = models.BooleanField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["attempt", "question"], name="answer_attempt_question_uniq"),
+        ]
@@ -0,0 +1,37 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .models import AcceptedAnswer, Quiz, Question, Choice
+
+# Sent by views that change a quiz's content or publish state in ways
+# post_save/post_delete do not see (bulk updates). Provide ``quiz_id``.
+quiz_content_changed = Signal()
+
+
+def bump_quiz_version(quiz_id):
+    Quiz.objects.filter(pk=quiz_id).update(content_version=F("content_version") + 1)
+
+
+@receiver(quiz_content_changed)
+def _on_quiz_content_changed(sender, quiz_id, **kwargs):
+    bump_quiz_version(quiz_id)
+
+
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=Question)
+def _on_question_saved(sender, instance, raw=False, **kwargs):
+    if not raw and instance.quiz_id:
+        bump_quiz_version(instance.quiz_id)
+
+
+# a question's deletion removes its parts first, while it can still be joined
+@receiver(post_delete, sender=AcceptedAnswer)
+@receiver(post_delete, sender=Choice)
+@receiver(post_save, sender=AcceptedAnswer)
+@receiver(post_save, sender=Choice)
+def _on_question_part_saved(sender, instance, raw=False, **kwargs):
+    if not raw and instance.question_id:
+        Quiz.objects.filter(questions__id=instance.question_id).update(
+            content_version=F("content_version") + 1
+        )
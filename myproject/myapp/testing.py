@@ -0,0 +1,241 @@
+"""
+Test helpers: dataset seeding and per-view query budgets.
+
+``seed(size)`` builds a realistic dataset with bulk inserts: a room with
+``size`` students, ``size`` assigned quizzes, a main quiz with ``size``
+questions, finished attempts and pending invitations.
+
+``QueryBudgetMixin`` renders every named URL of ``myproject.urls`` at
+several dataset sizes. A test fails when a view's query count grows with
+the data (an N+1) or goes over the budget declared in ``VIEW_BUDGETS``.
+Every named URL must have an entry there, so new views cannot skip the
+guard.
+"""
+import json
+from dataclasses import dataclass
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+
+from .models import Quiz, Question, Choice, Attempt, Answer
+
+User = get_user_model()
+
+ANSWERS_PER_ATTEMPT = 10
+
+
+@dataclass
+class SeedData:
+    size: int
+    teacher: object
+    student: object
+    room: object
+    quiz: object
+    question: object
+    open_attempt: object
+    finished_attempt: object
+    invitation: object
+
+
+def seed(size):
+    """Create a dataset whose row counts scale linearly with ``size``."""
+    from room import gradebook
+    from room.models import Room, RoomMembership, RoomInvitation, RoomQuizAssignment
+
+    teacher = User.objects.create_user(username=f"teacher{size}", password="teachpw")
+    student = User.objects.create_user(username=f"student{size}", password="studpw")
+    others = User.objects.bulk_create([User(username=f"s{size}-{i}") for i in range(size)])
+
+    room = Room.objects.create(name=f"Room {size}", owner=teacher)
+    RoomMembership.objects.bulk_create(
+        [RoomMembership(room=room, user=teacher, role=RoomMembership.ROLE_OWNER),
+         RoomMembership(room=room, user=student, role=RoomMembership.ROLE_STUDENT)]
+        + [RoomMembership(room=room, user=u, role=RoomMembership.ROLE_STUDENT) for u in others]
+    )
+
+    quiz = Quiz.objects.create(title=f"Main {size}", creator=teacher, is_published=True)
+    questions = Question.objects.bulk_create([
+        Question(quiz=quiz, text=f"Question {i}", qtype="mcq" if i % 5 else "short", order=i + 1)
+        for i in range(size)
+    ])
+    choices = Choice.objects.bulk_create([
+        Choice(question=q, text=f"Choice {k}", is_correct=(k == 0))
+        for q in questions if q.qtype == "mcq" for k in range(4)
+    ])
+    correct = {c.question_id: c.id for c in choices if c.is_correct}
+
+    quizzes = Quiz.objects.bulk_create([
+        Quiz(title=f"Extra {size}-{i}", creator=teacher, is_published=True) for i in range(size)
+    ])
+    RoomQuizAssignment.objects.bulk_create(
+        [RoomQuizAssignment(room=room, quiz=q, assigned_by=teacher) for q in [quiz] + quizzes]
+    )
+
+    attempts = Attempt.objects.bulk_create(
+        [Attempt(quiz=quiz, taker=u, finished_at=quiz.created_at, score=50.0) for u in others]
+    )
+    answered = [q for q in questions if q.qtype == "mcq"][:ANSWERS_PER_ATTEMPT]
+    Answer.objects.bulk_create([
+        Answer(attempt=a, question=q, selected_choice_id=correct[q.id]) for a in attempts for q in answered
+    ])
+    finished = Attempt.objects.create(quiz=quiz, taker=student, finished_at=quiz.created_at, score=100.0)
+    Answer.objects.bulk_create([
+        Answer(attempt=finished, question=q, selected_choice_id=correct[q.id]) for q in answered
+    ])
+    open_attempt = Attempt.objects.create(quiz=quiz, taker=student)
+    gradebook.rebuild()
+
+    # the student is invited to ``size`` other rooms
+    rooms = Room.objects.bulk_create([
+        Room(name=f"Other {size}-{i}", code=f"R{size:04d}{i:04d}"[:12], owner=teacher) for i in range(size)
+    ])
+    invitations = RoomInvitation.objects.bulk_create([
+        RoomInvitation(room=r, invited_user=student, invited_by=teacher) for r in rooms
+    ])
+
+    return SeedData(
+        size=size, teacher=teacher, student=student, room=room, quiz=quiz,
+        question=questions[1], open_attempt=open_attempt, finished_attempt=finished,
+        invitation=invitations[0],
+    )
+
+
+def _named_urls(patterns, namespace=None):
+    for p in patterns:
+        if isinstance(p, URLResolver):
+            if p.namespace == "admin":
+                continue
+            yield from _named_urls(p.url_patterns, p.namespace or namespace)
+        elif p.name:
+            yield f"{namespace}:{p.name}" if namespace else p.name
+
+
+def named_urls():
+    return sorted(set(_named_urls(get_resolver().url_patterns)))
+
+
+@dataclass(frozen=True)
+class ViewBudget:
+    """How to request a view and how many queries it may take."""
+    budget: int
+    user: str = "student"           # "teacher", "student" or None (anonymous)
+    method: str = "get"
+    args: object = lambda d: []     # callable(SeedData) -> reverse() args
+    data: object = lambda d: {}     # callable(SeedData) -> POST data
+    json: bool = False
+    stream: bool = False            # endless event stream: the body is not read
+
+
+VIEW_BUDGETS = {
+    "home": ViewBudget(3),
+    "about": ViewBudget(2),
+    "register": ViewBudget(0, user=None),
+    "login": ViewBudget(0, user=None),
+    "logout": ViewBudget(0),
+    "room:create": ViewBudget(2, user="teacher"),
+    "room:detail": ViewBudget(7, user="teacher", args=lambda d: [d.room.code]),
+    "room:join_by_code": ViewBudget(5, method="post", data=lambda d: {"code": d.invitation.room.code}),
+    "room:invite": ViewBudget(6, user="teacher", method="post", args=lambda d: [d.room.code],
+                              data=lambda d: {"username": d.student.username, "role": "student"}),
+    "room:invitations": ViewBudget(3),
+    # + the invitee's pending counter (RoomInvitation.adjust_pending_count)
+    "room:invitation_response": ViewBudget(5, method="post", args=lambda d: [d.invitation.pk, "decline"]),
+    "room:assign_quiz": ViewBudget(6, user="teacher", method="post", args=lambda d: [d.room.code],
+                                   data=lambda d: {"quiz_id": d.quiz.pk}),
+    # + the pending invitees' counters
+    "room:delete": ViewBudget(12, user="teacher", method="post", args=lambda d: [d.invitation.room.code]),
+    "room:gradebook": ViewBudget(8, user="teacher", args=lambda d: [d.room.code]),
+    "room:export": ViewBudget(6, user="teacher", args=lambda d: [d.room.code, "xlsx"]),
+    # cold cache: one window query for the board, two lookups for "my rank"
+    "room:leaderboard": ViewBudget(9, args=lambda d: [d.room.code]),
+    "room:monitor": ViewBudget(7, user="teacher", args=lambda d: [d.room.code]),
+    "room:monitor_stream": ViewBudget(6, user="teacher", args=lambda d: [d.room.code], stream=True),
+    "room:roster": ViewBudget(8, user="teacher", method="post", args=lambda d: [d.room.code],
+                              data=lambda d: {"roster": f"{d.student.username}\nnobody@example.com",
+                                              "role": "student", "mode": "invite"}),
+    "create_quiz:quiz_list": ViewBudget(3, user="teacher"),
+    "create_quiz:quiz_create": ViewBudget(2, user="teacher"),
+    # + does the quiz have attempts (locks the layout settings)
+    "create_quiz:quiz_edit": ViewBudget(4, user="teacher", args=lambda d: [d.quiz.pk]),
+    "create_quiz:quiz_detail": ViewBudget(5, user="teacher", args=lambda d: [d.quiz.pk]),
+    "create_quiz:add_question": ViewBudget(3, user="teacher", args=lambda d: [d.quiz.pk]),
+    "create_quiz:edit_question": ViewBudget(5, user="teacher", args=lambda d: [d.question.pk]),
+    "create_quiz:toggle_publish": ViewBudget(5, user="teacher", method="post", args=lambda d: [d.quiz.pk]),
+    "create_quiz:quiz_delete": ViewBudget(5, user="teacher", args=lambda d: [d.quiz.pk]),
+    "create_quiz:quiz_export": ViewBudget(5, user="teacher", args=lambda d: [d.quiz.pk, "csv"]),
+    "create_quiz:import_questions": ViewBudget(3, user="teacher", args=lambda d: [d.quiz.pk]),
+    "create_quiz:quiz_clone": ViewBudget(5, user="teacher", args=lambda d: [d.quiz.pk]),
+    "create_quiz:move_question": ViewBudget(11, user="teacher", method="post", json=True,
+                                            args=lambda d: [d.question.pk], data=lambda d: {"after": None}),
+    "create_quiz:reorder_questions": ViewBudget(8, user="teacher", method="post", json=True,
+                                                args=lambda d: [d.quiz.pk],
+                                                data=lambda d: {"order": [d.question.pk]}),
+    "take_quiz:quiz_list": ViewBudget(3),
+    "take_quiz:start_quiz": ViewBudget(4, args=lambda d: [d.quiz.pk]),
+    "take_quiz:take_quiz": ViewBudget(4, args=lambda d: [d.quiz.pk, d.open_attempt.pk]),
+    # + the claim of the open attempt (grading.claim_open)
+    "take_quiz:submit_quiz": ViewBudget(12, method="post", args=lambda d: [d.open_attempt.pk],
+                                        data=lambda d: {f"question_{d.question.pk}": "x"}),
+    "take_quiz:autosave": ViewBudget(4, method="post", json=True, args=lambda d: [d.open_attempt.pk],
+                                     data=lambda d: {"answers": {str(d.question.pk): "x"}}),
+    "take_quiz:attempt_result": ViewBudget(4, args=lambda d: [d.finished_attempt.pk]),
+}
+
+
+class QueryBudgetMixin:
+    """
+    Mix into a ``TestCase``. ``SIZES`` are the dataset sizes compared;
+    query counts are measured on a warm cache (second request), which
+    budgets assume to be shared (``TAKEQ_SHARED_CACHE``) as in production.
+    """
+    SIZES = (10, 100, 1000)
+    budgets = VIEW_BUDGETS
+
+    def measure(self, name, spec, data):
+        client = Client()
+        if spec.user:
+            client.force_login(getattr(data, spec.user))
+        url = reverse(name, args=spec.args(data))
+        payload = spec.data(data)
+        if spec.json:
+            kwargs = {"data": json.dumps(payload), "content_type": "application/json"}
+        else:
+            kwargs = {"data": payload}
+
+        counts = []
+        for _ in range(2):
+            reset_queries()  # the query log is capped; seeding fills it
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as ctx:
+                    response = getattr(client, spec.method)(url, **kwargs)
+                    if response.streaming and not spec.stream:
+                        b"".join(response.streaming_content)
+                transaction.set_rollback(True)
+            self.assertLess(response.status_code, 400, f"{name} returned {response.status_code}")
+            counts.append(len(ctx.captured_queries))
+        return counts[-1]
+
+    def measure_all(self, size):
+        with transaction.atomic():
+            cache.clear()
+            data = seed(size)
+            counts = {name: self.measure(name, spec, data) for name, spec in self.budgets.items()}
+            transaction.set_rollback(True)
+        return counts
+
+    def test_every_url_has_a_budget(self):
+        missing = set(named_urls()) - set(self.budgets)
+        self.assertFalse(missing, f"declare a query budget in VIEW_BUDGETS for: {sorted(missing)}")
+
+    def test_query_counts_within_budget_and_flat(self):
+        by_size = {size: self.measure_all(size) for size in self.SIZES}
+        smallest = by_size[self.SIZES[0]]
+        for name, spec in self.budgets.items():
+            with self.subTest(view=name):
+                counts = [by_size[size][name] for size in self.SIZES]
+                self.assertLessEqual(max(counts), spec.budget, f"{name}: {counts} queries, budget {spec.budget}")
+                self.assertEqual(counts, [smallest[name]] * len(counts), f"{name} grows with data: {counts}")
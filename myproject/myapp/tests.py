@@ -1,3 +1,837 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import threading
+import json
+import zipfile
+from datetime import timedelta
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.http import QueryDict
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from myapp import export, live
+from myapp.cloning import clone_quizzes
+from myapp.models import Quiz, Question, Choice, Attempt, Answer
+from myapp.testing import QueryBudgetMixin
+from room import gradebook, leaderboard, monitor, permissions
+from room.roster import MODE_INVITE, parse_roster, process_roster
+from create_quiz.models import QuizSearchEntry
+from room.models import Room, RoomMembership, RoomInvitation, RoomQuizAssignment, GradebookEntry, PendingInvitationCount
+
+User = get_user_model()
+
+
+class HotQueryIndexTests(TestCase):
+    """Each hot lookup must be answered from its composite index (SQLite and Postgres)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="u", password="pw")
+        cls.quiz = Quiz.objects.create(title="Q", creator=cls.user)
+        cls.question = Question.objects.create(quiz=cls.quiz, text="t", qtype="mcq", order=1)
+        cls.attempt = Attempt.objects.create(quiz=cls.quiz, taker=cls.user)
+        cls.room = Room.objects.create(name="R", owner=cls.user)
+
+    def assertUsesIndex(self, queryset, *index_names):
+        if connection.vendor == "postgresql":
+            # tiny test tables would otherwise always be sequentially scanned
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                plan = queryset.explain()
+        elif connection.vendor == "sqlite":
+            plan = queryset.explain()
+        else:
+            self.skipTest(f"no EXPLAIN expectations for {connection.vendor}")
+        self.assertTrue(any(name in plan for name in index_names), msg=plan)
+
+    def test_attempt_by_taker_and_quiz(self):
+        qs = Attempt.objects.filter(taker=self.user, quiz=self.quiz)
+        self.assertUsesIndex(qs, "attempt_taker_quiz_idx")
+
+    def test_finished_attempts_of_quiz(self):
+        qs = Attempt.objects.filter(quiz=self.quiz, finished_at__isnull=False)
+        self.assertUsesIndex(qs, "attempt_quiz_finished_idx")
+
+    def test_open_attempts_by_deadline(self):
+        qs = Attempt.objects.filter(finished_at__isnull=True, deadline__lt=self.attempt.started_at)
+        self.assertUsesIndex(qs, "attempt_open_deadline_idx")
+
+    def test_answer_by_attempt_and_question(self):
+        qs = Answer.objects.filter(attempt=self.attempt, question=self.question)
+        # SQLite implements the unique constraint as an automatic index
+        self.assertUsesIndex(qs, "answer_attempt_question_uniq", "sqlite_autoindex_myapp_answer_1")
+
+    def test_questions_in_order(self):
+        qs = Question.objects.filter(quiz=self.quiz).order_by("order", "id")
+        self.assertUsesIndex(qs, "question_quiz_order_idx")
+
+    def test_pending_invitations_of_user(self):
+        qs = RoomInvitation.objects.filter(invited_user=self.user, status=RoomInvitation.STATUS_PENDING)
+        self.assertUsesIndex(qs, "roominvitation_user_status_idx")
+
+    def test_memberships_of_user_by_role(self):
+        qs = RoomMembership.objects.filter(user=self.user, role=RoomMembership.ROLE_STUDENT)
+        self.assertUsesIndex(qs, "roommembership_user_role_idx")
+
+    def test_answer_unique_per_attempt_and_question(self):
+        Answer.objects.create(attempt=self.attempt, question=self.question)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Answer.objects.create(attempt=self.attempt, question=self.question)
+
+
+@override_settings(TAKEQ_SHARED_CACHE=True)
+class InviteCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="owner", password="ownerpw")
+        self.student = User.objects.create_user(username="student", password="studpw")
+        self.room = Room.objects.create(name="R", owner=self.owner)
+        RoomMembership.objects.create(room=self.room, user=self.owner, role=RoomMembership.ROLE_OWNER)
+
+    def _badge(self):
+        self.client.login(username="student", password="studpw")
+        return self.client.get(reverse("about")).context["room_invitation_count"]
+
+    def test_counter_follows_invite_and_accept(self):
+        self.assertEqual(self._badge(), 0)
+
+        self.client.login(username="owner", password="ownerpw")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("room:invite", args=[self.room.code]), {"username": "student", "role": "student"})
+        self.assertEqual(self._badge(), 1)
+
+        inv = RoomInvitation.objects.get(invited_user=self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            inv.accept()
+        self.assertEqual(self._badge(), 0)
+        self.assertEqual(RoomInvitation.pending_count_for(self.student), 0)
+
+    def test_warm_counter_costs_no_query(self):
+        RoomInvitation.objects.create(room=self.room, invited_user=self.student, invited_by=self.owner)
+        self.client.login(username="student", password="studpw")
+        self.client.get(reverse("about"))
+        # session + user only
+        with self.assertNumQueries(2):
+            resp = self.client.get(reverse("about"))
+        self.assertContains(resp, '<span class="badge bg-danger ms-1">1</span>', html=True)
+
+    @override_settings(TAKEQ_SHARED_CACHE=False)
+    def test_process_local_cache_reads_the_counter_row(self):
+        invitation = RoomInvitation.objects.create(room=self.room, invited_user=self.student, invited_by=self.owner)
+        self.assertEqual(RoomInvitation.pending_count_for(self.student), 1)  # counted once
+        self.client.login(username="student", password="studpw")
+        # session + user + counter row, no COUNT
+        with self.assertNumQueries(3):
+            resp = self.client.get(reverse("about"))
+        self.assertContains(resp, '<span class="badge bg-danger ms-1">1</span>', html=True)
+        invitation.decline()
+        self.assertEqual(PendingInvitationCount.objects.get(user=self.student).count, 0)
+        self.assertEqual(self._badge(), 0)
+
+
+@override_settings(TAKEQ_SHARED_CACHE=True)
+class DashboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="me", password="mepw")
+        self.other = User.objects.create_user(username="other", password="otherpw")
+        self.quiz = Quiz.objects.create(title="Q", creator=self.other, is_published=True)
+        self.client.login(username="me", password="mepw")
+
+    def _room(self, owner, role_for_me):
+        room = Room.objects.create(name=f"room-{Room.objects.count()}", owner=owner)
+        RoomMembership.objects.create(room=room, user=owner, role=RoomMembership.ROLE_OWNER)
+        if role_for_me and owner != self.user:
+            RoomMembership.objects.create(room=room, user=self.user, role=role_for_me)
+        return room
+
+    def test_rooms_grouped_by_role_with_counts(self):
+        from room.models import RoomQuizAssignment
+
+        owned = self._room(self.user, None)
+        self._room(self.other, RoomMembership.ROLE_ADMIN)
+        studying = self._room(self.other, RoomMembership.ROLE_STUDENT)
+        RoomQuizAssignment.objects.create(room=studying, quiz=self.quiz)
+        Attempt.objects.create(quiz=self.quiz, taker=self.user)
+
+        ctx = self.client.get(reverse("home")).context
+        self.assertEqual([r.pk for r in ctx["owner_rooms"]], [owned.pk])
+        self.assertEqual(len(ctx["admin_rooms"]), 1)
+        room = ctx["student_rooms"][0]
+        self.assertEqual((room.pk, room.member_count, room.quiz_count, room.unfinished_count),
+                         (studying.pk, 2, 1, 1))
+
+    def _home_queries(self):
+        from django.test.utils import CaptureQueriesContext
+
+        self.client.get(reverse("home"))  # warm the invitation counter
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("home"))
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_rooms(self):
+        self._room(self.other, RoomMembership.ROLE_STUDENT)
+        few = self._home_queries()
+        for _ in range(8):
+            self._room(self.other, RoomMembership.ROLE_STUDENT)
+            self._room(self.user, None)
+        self.assertEqual(self._home_queries(), few)
+        # session, user, memberships
+        self.assertEqual(few, 3)
+
+
+class GradebookTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher", password="teachpw")
+        self.student = User.objects.create_user(username="student", password="studpw")
+        self.room = Room.objects.create(name="Class", owner=self.teacher)
+        RoomMembership.objects.create(room=self.room, user=self.teacher, role=RoomMembership.ROLE_OWNER)
+        RoomMembership.objects.create(room=self.room, user=self.student, role=RoomMembership.ROLE_STUDENT)
+        self.quiz = Quiz.objects.create(title="Q", creator=self.teacher, is_published=True)
+        q = Question.objects.create(quiz=self.quiz, text="1+1", qtype="mcq", order=1)
+        self.right = Choice.objects.create(question=q, text="2", is_correct=True)
+        self.wrong = Choice.objects.create(question=q, text="3", is_correct=False)
+        self.question = q
+        RoomQuizAssignment.objects.create(room=self.room, quiz=self.quiz, assigned_by=self.teacher)
+
+    def _submit(self, choice):
+        self.client.force_login(self.student)
+        r = self.client.get(reverse("take_quiz:start_quiz", args=[self.quiz.pk]))
+        attempt_id = int(r.url.rstrip("/").split("/")[-1])
+        self.client.post(
+            reverse("take_quiz:submit_quiz", args=[attempt_id]),
+            {f"question_{self.question.pk}": str(choice.pk)},
+        )
+
+    def _entry(self):
+        return GradebookEntry.objects.values_list("best_score", "latest_score", "attempt_count").get(
+            room=self.room, quiz=self.quiz, student=self.student
+        )
+
+    def test_submit_updates_entry_incrementally(self):
+        self._submit(self.right)
+        self._submit(self.wrong)
+        self.assertEqual(self._entry(), (100.0, 0.0, 2))
+
+    def test_concurrent_submits_grade_once(self):
+        from take_quiz.views import close_attempt
+
+        self.client.force_login(self.student)
+        r = self.client.get(reverse("take_quiz:start_quiz", args=[self.quiz.pk]))
+        attempt_id = int(r.url.rstrip("/").split("/")[-1])
+        # both requests read the attempt while it was open
+        first, second = (Attempt.objects.select_related("quiz").get(pk=attempt_id) for _ in range(2))
+        close_attempt(first, QueryDict(f"question_{self.question.pk}={self.right.pk}"))
+        close_attempt(second, QueryDict(f"question_{self.question.pk}={self.wrong.pk}"))
+        self.assertEqual(self._entry(), (100.0, 100.0, 1))
+        self.assertEqual(Attempt.objects.get(pk=attempt_id).score, 100.0)
+
+    def test_rebuild_matches_incremental_entries(self):
+        self._submit(self.wrong)
+        self._submit(self.right)
+        incremental = self._entry()
+        GradebookEntry.objects.all().delete()
+        self.assertEqual(gradebook.rebuild([self.room.pk]), 1)
+        self.assertEqual(self._entry(), incremental)
+
+    def test_out_of_order_grading_keeps_latest_score(self):
+        now = timezone.now()
+        later = Attempt.objects.create(quiz=self.quiz, taker=self.student, finished_at=now, score=80.0)
+        earlier = Attempt.objects.create(
+            quiz=self.quiz, taker=self.student, finished_at=now - timedelta(minutes=5), score=20.0
+        )
+        gradebook.record_attempts([later])
+        gradebook.record_attempts([earlier])
+        self.assertEqual(self._entry(), (80.0, 80.0, 2))
+
+    def test_batch_is_folded_into_one_update(self):
+        now = timezone.now()
+        attempts = [
+            Attempt.objects.create(
+                quiz=self.quiz, taker=self.student, finished_at=now - timedelta(minutes=i), score=float(i)
+            )
+            for i in range(20)
+        ]
+        with CaptureQueriesContext(connection) as ctx:
+            gradebook.record_attempts(attempts)
+        self.assertEqual(sum(q["sql"].lstrip().startswith("WITH") for q in ctx.captured_queries), 1)
+        self.assertEqual(self._entry(), (19.0, 0.0, 20))
+        incremental = self._entry()
+        gradebook.rebuild([self.room.pk])
+        self.assertEqual(self._entry(), incremental)
+
+    def test_view_is_for_room_managers_only(self):
+        url = reverse("room:gradebook", args=[self.room.code])
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self._submit(self.right)
+        self.client.force_login(self.teacher)
+        r = self.client.get(url)
+        self.assertEqual(r.context["rows"][0]["cells"][0].best_score, 100.0)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher", password="teachpw")
+        self.student = User.objects.create_user(username="student", password="studpw")
+        self.outsider = User.objects.create_user(username="outsider", password="outpw")
+        self.room = Room.objects.create(name="Class", owner=self.teacher)
+        RoomMembership.objects.create(room=self.room, user=self.teacher, role=RoomMembership.ROLE_OWNER)
+        RoomMembership.objects.create(room=self.room, user=self.student, role=RoomMembership.ROLE_STUDENT)
+        self.quiz = Quiz.objects.create(title="แบบทดสอบ", creator=self.teacher, is_published=True)
+        RoomQuizAssignment.objects.create(room=self.room, quiz=self.quiz, assigned_by=self.teacher)
+        q1 = Question.objects.create(quiz=self.quiz, text="1+1", qtype="mcq", order=1024)
+        right = Choice.objects.create(question=q1, text="2", is_correct=True)
+        q2 = Question.objects.create(quiz=self.quiz, text="Why?", qtype="short", order=2048)
+        now = timezone.now()
+        for taker in (self.student, self.outsider):
+            attempt = Attempt.objects.create(quiz=self.quiz, taker=taker, finished_at=now, score=100.0)
+            Answer.objects.create(attempt=attempt, question=q1, selected_choice=right)
+            Answer.objects.create(attempt=attempt, question=q2, text="=HYPERLINK(\"x\") ไทย", is_correct=False)
+        Attempt.objects.create(quiz=self.quiz, taker=self.student)  # open: not exported
+        self.client.force_login(self.teacher)
+
+    def _body(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content)
+
+    def test_room_csv_has_one_row_per_answer_of_room_students(self):
+        body = self._body(reverse("room:export", args=[self.room.code, "csv"])).decode("utf-8-sig")
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([(r["student"], r["question"]) for r in rows], [("student", "1+1"), ("student", "Why?")])
+        # MCQs follow the choice, short answers the stored verdict of the accepted answers
+        self.assertEqual([r["is_correct"] for r in rows], ["True", "False"])
+        self.assertEqual(rows[1]["text_answer"], "'=HYPERLINK(\"x\") ไทย")
+
+    def test_csv_cells_escape_formulas_but_not_numbers(self):
+        self.assertEqual(export._csv_cell("-3"), "-3")
+        self.assertEqual(export._csv_cell("+1.5"), "+1.5")
+        self.assertEqual(export._csv_cell("-1+2"), "'-1+2")
+        self.assertEqual(export._csv_cell("\t=1"), "'\t=1")
+        self.assertEqual(export._csv_cell("\r=1"), "'\r=1")
+        self.assertEqual(export._csv_cell("-inf"), "'-inf")
+
+    def test_quiz_jsonl_covers_every_taker(self):
+        body = self._body(reverse("create_quiz:quiz_export", args=[self.quiz.pk, "jsonl"]))
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual({r["student"] for r in rows}, {"student", "outsider"})
+        self.assertEqual(rows[0]["selected_choice"], "2")
+        # positions, not the gapped ranks
+        self.assertEqual([r["question_order"] for r in rows[:2]], [1, 2])
+
+    def test_xlsx_is_a_valid_workbook(self):
+        body = self._body(reverse("room:export", args=[self.room.code, "xlsx"]))
+        with zipfile.ZipFile(io.BytesIO(body)) as zf:
+            self.assertIsNone(zf.testzip())
+            sheet = ElementTree.fromstring(zf.read("xl/worksheets/sheet1.xml"))
+        ns = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+        rows = sheet.findall("s:sheetData/s:row", ns)
+        self.assertEqual(len(rows), 3)  # header + two answers
+        texts = [t.text for t in rows[2].iterfind(".//s:t", ns)]
+        self.assertIn('=HYPERLINK("x") ไทย', texts)
+
+    def test_export_permissions_and_format(self):
+        self.assertEqual(self.client.get(reverse("room:export", args=[self.room.code, "pdf"])).status_code, 404)
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse("room:export", args=[self.room.code, "csv"])).status_code, 403)
+        self.assertEqual(
+            self.client.get(reverse("create_quiz:quiz_export", args=[self.quiz.pk, "csv"])).status_code, 404
+        )
+
+
+class CloneTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher", password="teachpw")
+        self.colleague = User.objects.create_user(username="colleague", password="collpw")
+        self.room = Room.objects.create(name="Next term", owner=self.colleague)
+        RoomMembership.objects.create(room=self.room, user=self.colleague, role=RoomMembership.ROLE_OWNER)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.quizzes = [self._quiz(f"Quiz {i}", questions=i + 2) for i in range(3)]
+
+    def _quiz(self, title, questions):
+        quiz = Quiz.objects.create(title=title, creator=self.teacher, is_published=True, time_limit_minutes=15)
+        for i in range(questions):
+            q = Question.objects.create(quiz=quiz, text=f"{title} Q{i}", qtype="mcq" if i else "short", order=i + 1)
+            if i:
+                Choice.objects.create(question=q, text="right", is_correct=True)
+                Choice.objects.create(question=q, text="wrong", is_correct=False)
+        return quiz
+
+    def _content(self, quiz):
+        return [
+            (q.text, q.qtype, q.order, [(c.text, c.is_correct) for c in q.choices.order_by("id")])
+            for q in quiz.questions.order_by("order")
+        ]
+
+    def test_clone_copies_content_and_assigns_room(self):
+        source = self.quizzes[2]
+        clone = source.clone(creator=self.colleague, room=self.room, assigned_by=self.colleague)
+        self.assertNotEqual(clone.pk, source.pk)
+        self.assertEqual((clone.title, clone.creator, clone.time_limit_minutes), ("Quiz 2", self.colleague, 15))
+        self.assertEqual(self._content(clone), self._content(source))
+        self.assertTrue(RoomQuizAssignment.objects.filter(room=self.room, quiz=clone).exists())
+        self.assertEqual(
+            QuizSearchEntry.objects.get(quiz=clone).tokens, QuizSearchEntry.objects.get(quiz=source).tokens
+        )
+        # the source is untouched
+        self.assertEqual(source.questions.count(), 4)
+
+    def test_query_count_does_not_depend_on_size(self):
+        with CaptureQueriesContext(connection) as one:
+            clone_quizzes(self.quizzes[:1], room=self.room)
+        with CaptureQueriesContext(connection) as many:
+            clones = clone_quizzes(self.quizzes + self.quizzes[:1], room=self.room)
+        self.assertEqual(len(one), len(many))
+        self.assertEqual([c.title for c in clones], ["Quiz 0", "Quiz 1", "Quiz 2", "Quiz 0"])
+        for source, clone in zip(self.quizzes + self.quizzes[:1], clones):
+            self.assertEqual(self._content(clone), self._content(source))
+
+    def test_clone_view(self):
+        url = reverse("create_quiz:quiz_clone", args=[self.quizzes[0].pk])
+        self.client.force_login(self.teacher)
+        # the teacher does not manage the colleague's room
+        self.assertEqual(self.client.post(url, {"room": self.room.code}).status_code, 404)
+        response = self.client.post(url)
+        clone = Quiz.objects.latest("pk")
+        self.assertRedirects(response, reverse("create_quiz:quiz_detail", args=[clone.pk]))
+        self.assertEqual(self._content(clone), self._content(self.quizzes[0]))
+        self.client.force_login(self.colleague)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class RosterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="owner", password="ownerpw")
+        self.admin = User.objects.create_user(username="helper", password="helperpw")
+        self.room = Room.objects.create(name="Course", owner=self.owner)
+        RoomMembership.objects.create(room=self.room, user=self.owner, role=RoomMembership.ROLE_OWNER)
+        RoomMembership.objects.create(room=self.room, user=self.admin, role=RoomMembership.ROLE_ADMIN)
+        self.students = User.objects.bulk_create([
+            User(username=f"st{i}", email=f"st{i}@school.ac.th") for i in range(6)
+        ])
+        RoomMembership.objects.create(room=self.room, user=self.students[0])
+        RoomInvitation.objects.create(room=self.room, invited_user=self.students[1], invited_by=self.owner)
+        RoomInvitation.objects.create(
+            room=self.room, invited_user=self.students[2], invited_by=self.owner,
+            status=RoomInvitation.STATUS_DECLINED,
+        )
+        self.url = reverse("room:roster", args=[self.room.code])
+
+    ROSTER = (
+        "username,role\n"
+        "st0\n"
+        "st1\n"
+        "st2\n"
+        "ST3@School.ac.th\n"
+        "st4,admin\n"
+        "st3\n"
+        "ghost\n"
+        "st5,teacher\n"
+    )
+
+    def _report(self, response):
+        return [(row.line, row.status) for row in response.context["report"]]
+
+    def test_invite_report_and_rows(self):
+        self.client.force_login(self.owner)
+        self.assertEqual(RoomInvitation.pending_count_for(self.students[3]), 0)  # warm the counter
+        response = self.client.post(self.url, {"roster": self.ROSTER, "role": "student", "mode": "invite"})
+        self.assertEqual(self._report(response), [
+            (2, "member"), (3, "pending"), (4, "reinvited"), (5, "invited"),
+            (6, "invited"), (7, "duplicate"), (8, "not_found"), (9, "bad_role"),
+        ])
+        pending = dict(
+            self.room.invitations.filter(status=RoomInvitation.STATUS_PENDING)
+            .values_list("invited_user__username", "role")
+        )
+        self.assertEqual(pending, {"st1": "student", "st2": "student", "st3": "student", "st4": "admin"})
+        self.assertEqual(RoomInvitation.pending_count_for(self.students[3]), 1)
+
+    def test_query_count_does_not_depend_on_roster_size(self):
+        def run(names):
+            with CaptureQueriesContext(connection) as ctx:
+                process_roster(self.room, self.owner, RoomMembership.ROLE_OWNER,
+                               parse_roster("\n".join(names)), mode=MODE_INVITE)
+            return len(ctx)
+
+        # 100 rows fit in one INSERT even under SQLite's 999-parameter limit
+        many = User.objects.bulk_create([User(username=f"bulk{i}") for i in range(100)])
+        self.assertEqual(run(["st3"]), run([u.username for u in many]))
+
+    def test_admin_enrolls_students_only(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(self.url, {"roster": "st1\nst4,admin\nst5", "role": "student", "mode": "enroll"})
+        self.assertEqual(self._report(response), [(1, "enrolled"), (2, "forbidden"), (3, "enrolled")])
+        members = set(self.room.memberships.values_list("user__username", flat=True))
+        self.assertEqual(members, {"owner", "helper", "st0", "st1", "st5"})
+        invitation = RoomInvitation.objects.get(room=self.room, invited_user=self.students[1])
+        self.assertEqual(invitation.status, RoomInvitation.STATUS_ACCEPTED)
+
+        self.client.force_login(self.students[0])
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class PermissionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="owner", password="ownerpw")
+        self.admin = User.objects.create_user(username="helper", password="helperpw")
+        self.student = User.objects.create_user(username="student", password="studpw")
+        self.rooms = [Room.objects.create(name=f"R{i}", owner=self.owner) for i in range(3)]
+        for room in self.rooms:
+            RoomMembership.objects.create(room=room, user=self.owner, role=RoomMembership.ROLE_OWNER)
+            RoomMembership.objects.create(room=room, user=self.student)
+        RoomMembership.objects.create(room=self.rooms[2], user=self.admin, role=RoomMembership.ROLE_ADMIN)
+        self.quiz = Quiz.objects.create(title="Shared", creator=self.owner)
+        RoomQuizAssignment.objects.create(room=self.rooms[2], quiz=self.quiz)
+
+    def _request(self, user):
+        request = RequestFactory().get("/")
+        request.user = user
+        return request
+
+    def test_roles_are_loaded_once_per_request(self):
+        request = self._request(self.owner)
+        with self.assertNumQueries(1):
+            for room in self.rooms:
+                self.assertEqual(permissions.role_in_room(request, room), RoomMembership.ROLE_OWNER)
+            self.assertEqual(sorted(permissions.managed_room_ids(request)), sorted(r.pk for r in self.rooms))
+        members = list(self.rooms[0].memberships.all())
+        with self.assertNumQueries(0):
+            self.assertIsNone(permissions.role_in_room(self._request(self.admin), self.rooms[0], members=members))
+
+    @override_settings(TAKEQ_ROOM_ROLES_CACHE_SECONDS=300, TAKEQ_SHARED_CACHE=False)
+    def test_process_local_cache_does_not_keep_roles(self):
+        self.assertTrue(permissions.can_manage_room(self._request(self.admin), self.rooms[2]))
+        # demoted by another process, which cannot drop this process's entries
+        RoomMembership.objects.filter(user=self.admin).update(role=RoomMembership.ROLE_STUDENT)
+        self.assertFalse(permissions.can_manage_room(self._request(self.admin), self.rooms[2]))
+
+    @override_settings(TAKEQ_ROOM_ROLES_CACHE_SECONDS=300, TAKEQ_SHARED_CACHE=True)
+    def test_cached_roles_follow_membership_changes(self):
+        permissions.room_roles(self._request(self.admin))
+        with self.assertNumQueries(0):
+            self.assertFalse(permissions.can_manage_room(self._request(self.admin), self.rooms[0]))
+        membership = RoomMembership.objects.create(
+            room=self.rooms[0], user=self.admin, role=RoomMembership.ROLE_ADMIN
+        )
+        self.assertTrue(permissions.can_manage_room(self._request(self.admin), self.rooms[0]))
+        membership.delete()
+        self.assertFalse(permissions.can_manage_room(self._request(self.admin), self.rooms[0]))
+
+        process_roster(self.rooms[1], self.owner, RoomMembership.ROLE_OWNER,
+                       [(1, "helper", "admin")], mode="enroll")
+        self.assertTrue(permissions.can_manage_room(self._request(self.admin), self.rooms[1]))
+
+    def test_can_manage_quiz(self):
+        with self.assertNumQueries(0):
+            self.assertTrue(permissions.can_manage_quiz(self.owner, self.quiz))
+        with self.assertNumQueries(1):
+            self.assertTrue(permissions.can_manage_quiz(self.admin, self.quiz))
+        self.assertFalse(permissions.can_manage_quiz(self.student, self.quiz))
+
+        self.client.force_login(self.admin)
+        self.client.post(reverse("create_quiz:toggle_publish", args=[self.quiz.pk]))
+        self.quiz.refresh_from_db()
+        self.assertTrue(self.quiz.is_published)
+        self.client.force_login(self.student)
+        response = self.client.post(reverse("create_quiz:toggle_publish", args=[self.quiz.pk]))
+        self.assertEqual(response.status_code, 403)
+
+
+class RecordingBroker:
+    """Stand-in broker for tests: keeps what was published."""
+    def __init__(self):
+        self.events = []
+
+    def publish(self, channel, event):
+        self.events.append((channel, event))
+        return 0
+
+
+@override_settings(TAKEQ_LIVE_BROKER="myapp.tests.RecordingBroker")
+class MonitorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        live.reset_broker()
+        self.addCleanup(live.reset_broker)
+        self.owner = User.objects.create_user(username="owner", password="ownerpw")
+        self.student = User.objects.create_user(username="student", password="studpw")
+        self.outsider = User.objects.create_user(username="outsider", password="outpw")
+        self.room = Room.objects.create(name="Exam", owner=self.owner)
+        RoomMembership.objects.create(room=self.room, user=self.owner, role=RoomMembership.ROLE_OWNER)
+        RoomMembership.objects.create(room=self.room, user=self.student)
+        self.quiz = Quiz.objects.create(title="Live", creator=self.owner, is_published=True)
+        self.q = Question.objects.create(quiz=self.quiz, text="2+2?", qtype="mcq", order=1)
+        self.right = Choice.objects.create(question=self.q, text="4", is_correct=True)
+        RoomQuizAssignment.objects.create(room=self.room, quiz=self.quiz)
+
+    def test_exam_lifecycle_is_published(self):
+        self.client.force_login(self.student)
+        # events go out once the writes they announce commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("take_quiz:start_quiz", args=[self.quiz.pk]))
+        attempt = Attempt.objects.get(taker=self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse("take_quiz:autosave", args=[attempt.pk]),
+                data=json.dumps({"answers": {str(self.q.pk): str(self.right.pk), "999999": "x"}}),
+                content_type="application/json",
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("take_quiz:submit_quiz", args=[attempt.pk]), {f"question_{self.q.pk}": self.right.pk})
+
+        events = live.get_broker().events
+        self.assertEqual({channel for channel, _ in events}, {live.quiz_channel(self.quiz.pk)})
+        self.assertEqual([e["type"] for _, e in events], ["started", "progress", "submitted"])
+        self.assertEqual(events[1][1]["answered"], [self.q.pk])
+        self.assertEqual(events[2][1]["score"], 100.0)
+        self.assertTrue(all(e["taker"] == self.student.pk and e["attempt"] == attempt.pk for _, e in events))
+
+    def test_monitor_page_snapshot(self):
+        attempt = Attempt.objects.create(quiz=self.quiz, taker=self.student)
+        Attempt.objects.create(quiz=self.quiz, taker=self.outsider)
+        Answer.objects.create(attempt=attempt, question=self.q, text="4")
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse("room:monitor", args=[self.room.code]))
+        self.assertEqual(response.status_code, 200)
+        snapshot = response.context["snapshot"]
+        self.assertEqual(snapshot["quizzes"], {self.quiz.pk: {"title": "Live", "questions": 1}})
+        self.assertEqual(
+            [(a["username"], a["answered"]) for a in snapshot["attempts"]], [("student", [self.q.pk])]
+        )
+
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse("room:monitor", args=[self.room.code])).status_code, 403)
+        self.assertEqual(self.client.get(reverse("room:monitor_stream", args=[self.room.code])).status_code, 403)
+
+    @override_settings(TAKEQ_LIVE_BROKER="myapp.live.InMemoryBroker")
+    def test_stream_sends_room_deltas_only(self):
+        async def scenario():
+            broker = live.get_broker()
+            stream = monitor.event_stream([self.quiz.pk], {self.student.pk: "student"}, keepalive=0.05, poll=0)
+            self.assertTrue((await anext(stream)).startswith("retry:"))
+            channel = live.quiz_channel(self.quiz.pk)
+            # published from another thread, as a sync view would
+            publisher = threading.Thread(target=lambda: (
+                broker.publish(channel, {"type": "started", "attempt": 1, "quiz": self.quiz.pk, "taker": self.outsider.pk}),
+                broker.publish(channel, {"type": "started", "attempt": 2, "quiz": self.quiz.pk, "taker": self.student.pk}),
+                broker.publish(live.quiz_channel(0), {"type": "started", "attempt": 3, "quiz": 0, "taker": self.student.pk}),
+            ))
+            publisher.start()
+            publisher.join()
+            chunk = await anext(stream)
+            self.assertIn("event: started", chunk)
+            self.assertIn('"attempt": 2', chunk)
+            self.assertIn('"username": "student"', chunk)
+            self.assertEqual(await anext(stream), ": keepalive\n\n")
+            await stream.aclose()
+            self.assertEqual(broker.subscriber_count(), 0)
+
+        asyncio.run(scenario())
+
+    def test_poll_picks_up_attempts_of_other_processes(self):
+        running = Attempt.objects.create(quiz=self.quiz, taker=self.student)
+        reconciler = monitor.Reconciler(10)
+        reconciler.watched, reconciler.new = {self.quiz.pk: 1}, {self.quiz.pk}
+        reconciler.since = timezone.now()
+        self.assertEqual(reconciler.check(), [])
+        self.assertEqual(reconciler.open, {running.pk: self.quiz.pk})
+        # the expiry sweeper closes it at its (past) deadline; another worker starts one
+        Attempt.objects.filter(pk=running.pk).update(finished_at=reconciler.since - timedelta(hours=1), score=50.0)
+        started = Attempt.objects.create(quiz=self.quiz, taker=self.student)
+
+        self.assertEqual(
+            [(e["type"], e["attempt"], e["score"]) for e in reconciler.check()],
+            [("submitted", running.pk, 50.0), ("started", started.pk, None)],
+        )
+        self.assertEqual(reconciler.check(), [])
+
+    @override_settings(TAKEQ_LIVE_BROKER="myapp.live.InMemoryBroker")
+    def test_streams_share_one_poll(self):
+        from unittest import mock
+
+        polled = []
+        missed = {"type": "submitted", "attempt": 7, "quiz": self.quiz.pk, "taker": self.student.pk, "score": 50.0}
+
+        def check(reconciler):
+            polled.append(dict(reconciler.watched))
+            return [missed] if len(polled) == 1 else []
+
+        async def scenario():
+            students = {self.student.pk: "student"}
+            streams = [monitor.event_stream([self.quiz.pk], students, keepalive=10, poll=0.05) for _ in range(2)]
+            for stream in streams:
+                await anext(stream)
+            reconciler = monitor.get_reconciler()
+            self.assertEqual(reconciler.watched, {self.quiz.pk: 2})
+            for stream in streams:
+                chunk = await anext(stream)
+                self.assertIn("event: submitted", chunk)
+                self.assertNotIn("reconciled", chunk)
+            self.assertEqual(polled, [{self.quiz.pk: 2}])
+            for stream in streams:
+                await stream.aclose()
+            self.assertEqual(reconciler.watched, {})
+
+        with mock.patch.object(monitor.Reconciler, "check", check):
+            asyncio.run(scenario())
+
+    def test_stream_drops_reconciled_events_it_sent(self):
+        open_ids, done_ids = set(), set()
+        event = {"type": "submitted", "attempt": 7, "quiz": self.quiz.pk, "taker": self.student.pk}
+        self.assertTrue(monitor._track(event, open_ids, done_ids))
+        self.assertFalse(monitor._track({**event, "reconciled": True}, open_ids, done_ids))
+        self.assertFalse(monitor._track({**event, "type": "started", "reconciled": True}, open_ids, done_ids))
+        self.assertTrue(monitor._track({**event, "attempt": 8, "reconciled": True}, open_ids, done_ids))
+
+    def test_slow_listener_is_reset(self):
+        async def scenario():
+            broker = live.InMemoryBroker(maxsize=3)
+            sub = broker.subscribe(["c"])
+            for i in range(5):
+                broker.publish("c", {"n": i})
+            await asyncio.sleep(0)
+            self.assertEqual(broker.subscriber_count(), 0)
+            with self.assertRaises(sub.Overflow):
+                await sub.get()
+
+        asyncio.run(scenario())
+
+
+@override_settings(TAKEQ_SHARED_CACHE=True)
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="owner", password="ownerpw")
+        self.room = Room.objects.create(name="League", owner=self.owner)
+        RoomMembership.objects.create(room=self.room, user=self.owner, role=RoomMembership.ROLE_OWNER)
+        self.students = [User.objects.create_user(username=f"s{i}", password="pw") for i in range(4)]
+        for user in self.students:
+            RoomMembership.objects.create(room=self.room, user=user)
+        self.quizzes = [Quiz.objects.create(title=f"Q{i}", creator=self.owner, is_published=True) for i in range(2)]
+        for quiz in self.quizzes:
+            RoomQuizAssignment.objects.create(room=self.room, quiz=quiz)
+
+    def _grade(self, student, quiz, score):
+        attempt = Attempt.objects.create(quiz=quiz, taker=student, finished_at=timezone.now(), score=score)
+        with self.captureOnCommitCallbacks(execute=True):
+            gradebook.record_attempts([attempt])
+
+    def _board(self, quiz_id=leaderboard.ROOM_BOARD):
+        return [(s.rank, s.student_id, s.score) for s in leaderboard.top(self.room, quiz_id, k=10)]
+
+    def test_updates_keep_a_warm_board_sorted(self):
+        s0, s1, s2, s3 = self.students
+        q0, q1 = self.quizzes
+        self._grade(s0, q0, 50)
+        leaderboard.warm([self.room.pk])
+        self._grade(s1, q0, 80)
+        self._grade(s0, q0, 40)  # not a new best
+        self._grade(s0, q1, 30)
+        self._grade(s2, q1, 80)
+        self._grade(s3, q0, 90)
+        self._grade(s3, q0, 100)
+
+        with self.assertNumQueries(0):
+            room_board = self._board()
+            quiz_board = self._board(q0.pk)
+            mine = leaderboard.rank_of(self.room, s0.pk)
+        self.assertEqual(room_board, [(1, s3.pk, 100), (2, s0.pk, 80), (2, s1.pk, 80), (2, s2.pk, 80)])
+        self.assertEqual(quiz_board, [(1, s3.pk, 100), (2, s1.pk, 80), (3, s0.pk, 50)])
+        self.assertEqual(mine, leaderboard.Standing(2, s0.pk, 80))
+
+        # same answers from the database
+        cache.clear()
+        self.assertEqual(self._board(), room_board)
+        self.assertEqual(self._board(q0.pk), quiz_board)
+        self.assertEqual(leaderboard.rank_of(self.room, s0.pk), mine)
+        self.assertIsNone(leaderboard.rank_of(self.room, self.owner.pk))
+
+    @override_settings(TAKEQ_LEADERBOARD_SIZE=2)
+    def test_cached_boards_keep_only_the_top_standings(self):
+        s0, s1, s2, s3 = self.students
+        q0 = self.quizzes[0]
+        for student, score in ((s0, 50), (s1, 60), (s2, 70)):
+            self._grade(student, q0, score)
+        leaderboard.warm([self.room.pk])
+        self._grade(s3, q0, 40)  # below the cut
+        self._grade(s0, q0, 80)  # passes the last entry
+
+        version = leaderboard._versions([self.room.pk])[self.room.pk]
+        board = cache.get(leaderboard._board_key(self.room.pk, q0.pk, version))
+        self.assertEqual(board["entries"], [(-80, s0.pk), (-70, s2.pk)])
+        self.assertTrue(board["truncated"])
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [tuple(s) for s in leaderboard.top(self.room, q0.pk, k=2)], [(1, s0.pk, 80), (2, s2.pk, 70)]
+            )
+            self.assertEqual(leaderboard.rank_of(self.room, s2.pk, q0.pk), leaderboard.Standing(2, s2.pk, 70))
+        # past the cut: the database answers
+        self.assertEqual(leaderboard.rank_of(self.room, s1.pk, q0.pk), leaderboard.Standing(3, s1.pk, 60))
+        self.assertEqual(
+            self._board(q0.pk), [(1, s0.pk, 80), (2, s2.pk, 70), (3, s1.pk, 60), (4, s3.pk, 40)]
+        )
+        self.assertIsNone(leaderboard.rank_of(self.room, self.owner.pk, q0.pk))
+
+    def test_cold_board_is_rebuilt_by_the_next_attempt(self):
+        s0, s1 = self.students[:2]
+        self._grade(s0, self.quizzes[0], 60)
+        self._grade(s1, self.quizzes[0], 70)
+        with self.assertNumQueries(0):
+            self.assertEqual(self._board(self.quizzes[0].pk), [(1, s1.pk, 70), (2, s0.pk, 60)])
+            self.assertEqual(self._board(), [(1, s1.pk, 70), (2, s0.pk, 60)])
+
+    def test_membership_and_assignment_changes_drop_boards(self):
+        s0, s1 = self.students[:2]
+        self._grade(s0, self.quizzes[0], 60)
+        self._grade(s1, self.quizzes[1], 70)
+        RoomMembership.objects.filter(room=self.room, user=s1).get().delete()
+        self.assertEqual(self._board(), [(1, s0.pk, 60)])
+        call_command("rebuild_leaderboards", self.room.code, stdout=io.StringIO())
+        with self.assertNumQueries(0):
+            self.assertEqual(self._board(), [(1, s0.pk, 60)])
+        RoomQuizAssignment.objects.get(room=self.room, quiz=self.quizzes[0]).delete()
+        self.assertEqual(self._board(), [])
+
+    @override_settings(TAKEQ_SHARED_CACHE=False)
+    def test_process_local_cache_reads_the_database(self):
+        s0, s1 = self.students[:2]
+        self._grade(s0, self.quizzes[0], 60)
+        self.assertEqual(leaderboard.warm([self.room.pk]), 0)
+        # graded by another process: this process's cache is not told
+        GradebookEntry.objects.create(room=self.room, quiz=self.quizzes[0], student=s1, best_score=70)
+        self.assertEqual(self._board(self.quizzes[0].pk), [(1, s1.pk, 70), (2, s0.pk, 60)])
+        self.assertEqual(leaderboard.rank_of(self.room, s0.pk).rank, 2)
+
+    def test_page_shows_standings_and_own_rank(self):
+        s0, s1 = self.students[:2]
+        self._grade(s0, self.quizzes[0], 60)
+        self._grade(s1, self.quizzes[0], 70)
+        self.client.force_login(s0)
+        response = self.client.get(reverse("room:leaderboard", args=[self.room.code]), {"quiz": self.quizzes[0].pk})
+        self.assertEqual(response.context["mine"].rank, 2)
+        self.assertEqual([r["username"] for r in response.context["rows"]], ["s1", "s0"])
+
+        outsider = User.objects.create_user(username="outsider", password="pw")
+        self.client.force_login(outsider)
+        self.assertEqual(self.client.get(reverse("room:leaderboard", args=[self.room.code])).status_code, 403)
+
+
+@override_settings(TAKEQ_SHARED_CACHE=True)
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Every view stays within its query budget, whatever the data size."""
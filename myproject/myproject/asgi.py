@@ -3,6 +3,17 @@ ASGI config for myproject project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the project with it (``gunicorn -c gunicorn_asgi.conf.py``, or
+``uvicorn myproject.asgi:application``) to get the room monitor's
+server-sent-events stream (``room:monitor_stream``): each open stream is
+a coroutine waiting on the live-event broker rather than a blocked worker
+thread, so one worker holds hundreds of listeners. Set
+``TAKEQ_ASYNC_VIEWS=1`` to also route the take/submit/result views to
+their async versions; it is off by default because on SQLite
+``bench_asgi`` measured them at half the throughput of the WSGI
+profile. Run ``manage.py bench_monitor`` and ``manage.py bench_asgi`` to
+measure.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 """
@@ -86,6 +86,21 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'takeq',
+    }
+}
+
+# Whether CACHES['default'] is shared by every server process (see
+# myapp.caching). None guesses from the backend: LocMemCache is not.
+TAKEQ_SHARED_CACHE = None
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -132,3 +147,53 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/login/'
 LOGIN_URL = '/login/'
+
+# Accept quiz submissions into a staging table and grade them with
+# `manage.py grade_submissions` instead of inside the request.
+TAKEQ_QUEUED_SUBMIT = os.environ.get('TAKEQ_QUEUED_SUBMIT', '') == '1'
+
+# Route the take/submit/result views to their async versions
+# (take_quiz.async_views). Off by default, also under ASGI.
+TAKEQ_ASYNC_VIEWS = os.environ.get('TAKEQ_ASYNC_VIEWS', '') == '1'
+
+# How long after an attempt's deadline a submit is still accepted.
+TAKEQ_SUBMIT_GRACE_SECONDS = 30
+
+# The take page collects answer changes and autosaves them at most this
+# often; each autosave is written straight to the database.
+TAKEQ_AUTOSAVE_FLUSH_SECONDS = 15
+
+# Per-user cache lifetime of the dashboard room list; 0 disables it.
+TAKEQ_DASHBOARD_CACHE_SECONDS = 0
+
+# Per-user cache lifetime of the {room_id: role} map used for permission
+# checks (room.permissions); 0 keeps it per request only. Ignored unless
+# the cache is shared (TAKEQ_SHARED_CACHE).
+TAKEQ_ROOM_ROLES_CACHE_SECONDS = 0
+
+# Pub/sub backend for live exam events (room monitor). The in-memory
+# broker only reaches listeners in the same process, so serve the monitor
+# stream from a single ASGI worker (gunicorn_asgi.conf.py does unless this
+# is set) or plug in a shared backend.
+TAKEQ_LIVE_BROKER = os.environ.get('TAKEQ_LIVE_BROKER', 'myapp.live.InMemoryBroker')
+
+# Seconds of silence after which the monitor stream sends a keepalive.
+TAKEQ_MONITOR_KEEPALIVE_SECONDS = 15
+
+# How often each process checks the database, once for all its monitor
+# streams, for attempts started or finished by other processes
+# (room.monitor.Reconciler); 0 disables.
+TAKEQ_MONITOR_POLL_SECONDS = 10
+
+# Cache lifetime of the room leaderboards (room.leaderboard). Cold boards
+# are answered from the database and rebuilt by the next graded attempt
+# or `manage.py rebuild_leaderboards`. Boards are only cached when the
+# cache is shared (TAKEQ_SHARED_CACHE).
+TAKEQ_LEADERBOARD_CACHE_SECONDS = 60 * 60 * 24
+
+# Standings kept per cached leaderboard; ranks below it are read from the
+# database.
+TAKEQ_LEADERBOARD_SIZE = 100
+
+# Quizzes per page of the take_quiz catalogue (keyset-paginated).
+TAKEQ_CATALOGUE_PAGE_SIZE = 20
@@ -17,3 +17,32 @@ class JoinRoomByCodeForm(forms.Form):
 class InviteForm(forms.Form):
 	username = forms.CharField(max_length=150, help_text='Username or email of user to invite')
 	role = forms.ChoiceField(choices=[('student','Student'),('admin','Admin')])
+
+class RosterForm(forms.Form):
+	MODE_CHOICES = [
+		('invite', 'Send invitations'),
+		('enroll', 'Add directly to the room'),
+	]
+
+	roster = forms.CharField(
+		required=False,
+		widget=forms.Textarea(attrs={'rows': 8, 'class': 'form-control'}),
+		help_text='One username or email per line, optionally followed by ",student" or ",admin".',
+	)
+	file = forms.FileField(required=False, help_text='Or upload a CSV with the same columns.')
+	role = forms.ChoiceField(choices=[('student','Student'),('admin','Admin')], help_text='Role for lines without one.')
+	mode = forms.ChoiceField(choices=MODE_CHOICES)
+
+	def clean(self):
+		cleaned = super().clean()
+		upload = cleaned.get('file')
+		text = cleaned.get('roster') or ''
+		if upload:
+			try:
+				text += '\n' + upload.read().decode('utf-8-sig')
+			except UnicodeDecodeError:
+				raise forms.ValidationError('The file is not UTF-8 text.')
+		if not text.strip():
+			raise forms.ValidationError('Paste a roster or upload a file.')
+		cleaned['text'] = text
+		return cleaned
@@ -0,0 +1,148 @@
+"""
+The room gradebook: one ``GradebookEntry`` per room x quiz x student.
+
+``record_attempts`` folds newly graded attempts into the entries of every
+room where the quiz is assigned and the taker is a student. It makes one
+SELECT for the rooms, one INSERT for missing entries and one
+UPDATE ... FROM (VALUES ...) per 500 entries, whose new values are
+computed by the database from the old ones. ``rebuild`` recomputes
+entries from ``Attempt`` with a single INSERT ... SELECT. Both keep the
+cached leaderboards (``room.leaderboard``) in step.
+"""
+from django.db import connection, transaction
+
+from . import leaderboard
+from .models import GradebookEntry, Room, RoomMembership, RoomQuizAssignment
+
+
+def _student_rooms(attempts):
+    """``{(quiz_id, taker_id): [room_id, ...]}`` for the attempts' takers."""
+    pairs = {(a.quiz_id, a.taker_id) for a in attempts if a.taker_id}
+    if not pairs:
+        return {}
+    rooms = {}
+    rows = RoomQuizAssignment.objects.filter(
+        quiz_id__in={q for q, _ in pairs},
+        room__memberships__user_id__in={u for _, u in pairs},
+        room__memberships__role=RoomMembership.ROLE_STUDENT,
+    ).values_list("quiz_id", "room__memberships__user_id", "room_id")
+    for quiz_id, user_id, room_id in rows:
+        if (quiz_id, user_id) in pairs:
+            rooms.setdefault((quiz_id, user_id), []).append(room_id)
+    return rooms
+
+
+def _fold(attempts, rooms):
+    """
+    ``{(room_id, quiz_id, student_id): [count, last_finished_at,
+    latest_score, best_score]}`` summarizing ``attempts`` per entry.
+    """
+    folded = {}
+    for attempt in attempts:
+        for room_id in rooms.get((attempt.quiz_id, attempt.taker_id), ()):
+            key = (room_id, attempt.quiz_id, attempt.taker_id)
+            entry = folded.get(key)
+            if entry is None:
+                folded[key] = [1, attempt.finished_at, attempt.score, attempt.score]
+                continue
+            entry[0] += 1
+            if attempt.finished_at >= entry[1]:
+                entry[1], entry[2] = attempt.finished_at, attempt.score
+            if attempt.score is not None and (entry[3] is None or attempt.score > entry[3]):
+                entry[3] = attempt.score
+    return folded
+
+
+UPDATE_BATCH_SIZE = 500
+
+# new values are computed by the database from the old ones; an attempt
+# graded out of order (queued, swept) must not overwrite the latest score
+# of a later one
+UPDATE_SQL = """
+WITH v (v_room, v_quiz, v_student, v_count, v_last, v_latest, v_best) AS (VALUES {rows})
+UPDATE room_gradebookentry SET
+    attempt_count = attempt_count + v_count,
+    latest_score = CASE WHEN last_finished_at IS NULL OR last_finished_at <= v_last
+                        THEN v_latest ELSE latest_score END,
+    last_finished_at = CASE WHEN last_finished_at IS NULL OR last_finished_at < v_last
+                            THEN v_last ELSE last_finished_at END,
+    best_score = CASE WHEN v_best IS NULL THEN best_score
+                      WHEN best_score IS NULL OR best_score < v_best THEN v_best
+                      ELSE best_score END
+  FROM v
+ WHERE room_id = v_room AND quiz_id = v_quiz AND student_id = v_student
+"""
+UPDATE_ROW = "(%s, %s, %s, %s, %s, CAST(%s AS DOUBLE PRECISION), CAST(%s AS DOUBLE PRECISION))"
+
+
+def _update_entries(folded):
+    """Apply ``_fold`` output with one UPDATE ... FROM per ``UPDATE_BATCH_SIZE`` entries."""
+    adapt = connection.ops.adapt_datetimefield_value
+    items = list(folded.items())
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), UPDATE_BATCH_SIZE):
+            batch = items[start:start + UPDATE_BATCH_SIZE]
+            params = []
+            for (room_id, quiz_id, student_id), (count, last, latest, best) in batch:
+                params += [room_id, quiz_id, student_id, count, adapt(last), latest, best]
+            cursor.execute(UPDATE_SQL.format(rows=", ".join([UPDATE_ROW] * len(batch))), params)
+
+
+def record_attempts(attempts):
+    """Fold finished, graded ``attempts`` into the gradebook."""
+    attempts = [a for a in attempts if a.finished_at is not None]
+    rooms = _student_rooms(attempts)
+    if not rooms:
+        return
+    GradebookEntry.objects.bulk_create(
+        [
+            GradebookEntry(room_id=room_id, quiz_id=quiz_id, student_id=user_id)
+            for (quiz_id, user_id), room_ids in rooms.items()
+            for room_id in room_ids
+        ],
+        ignore_conflicts=True,
+    )
+    _update_entries(_fold(attempts, rooms))
+    leaderboard.record(rooms, attempts)
+
+
+REBUILD_SQL = """
+INSERT INTO room_gradebookentry
+    (room_id, quiz_id, student_id, best_score, latest_score, attempt_count, last_finished_at)
+SELECT a.room_id, a.quiz_id, m.user_id,
+       MAX(t.score),
+       (SELECT t2.score FROM myapp_attempt t2
+         WHERE t2.quiz_id = a.quiz_id AND t2.taker_id = m.user_id AND t2.finished_at IS NOT NULL
+         ORDER BY t2.finished_at DESC, t2.id DESC LIMIT 1),
+       COUNT(t.id),
+       MAX(t.finished_at)
+  FROM room_roomquizassignment a
+  JOIN room_roommembership m ON m.room_id = a.room_id AND m.role = %s
+  JOIN myapp_attempt t ON t.quiz_id = a.quiz_id AND t.taker_id = m.user_id AND t.finished_at IS NOT NULL
+ {where}
+ GROUP BY a.room_id, a.quiz_id, m.user_id
+"""
+
+
+def rebuild(room_ids=None):
+    """
+    Recompute the gradebook of ``room_ids`` (all rooms when None) from
+    the attempts table. Returns the number of entries written.
+    """
+    entries = GradebookEntry.objects.all()
+    params = [RoomMembership.ROLE_STUDENT]
+    where = ""
+    if room_ids is not None:
+        room_ids = list(room_ids)
+        if not room_ids:
+            return 0
+        entries = entries.filter(room_id__in=room_ids)
+        where = "WHERE a.room_id IN ({})".format(", ".join(["%s"] * len(room_ids)))
+        params += room_ids
+    with transaction.atomic():
+        entries.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(REBUILD_SQL.format(where=where), params)
+            written = cursor.rowcount
+    Room.forget_leaderboards(room_ids if room_ids is not None else Room.objects.values_list("pk", flat=True))
+    return written
@@ -0,0 +1,293 @@
+"""
+Room leaderboards kept as short sorted lists in the cache.
+
+Every room has a board per assigned quiz (students ranked by best score)
+and a room board (ranked by the sum of their best scores), built from
+``GradebookEntry``. A cached board only holds the first
+``TAKEQ_LEADERBOARD_SIZE`` standings: ``{"scores": {student_id: score},
+"entries": [(-score, student_id), ...], "truncated": bool}`` with
+``entries`` kept sorted, so an update rewrites a bounded list however
+large the room. Best scores and their sums only grow between rebuilds,
+so a student below the cut can only come back by passing the last
+entry, and the kept prefix stays exact. Ranks are competition ranks
+(1, 2, 2, 4).
+
+``record`` reads the new best scores and totals of the graded students
+(one indexed query per room) and offers them to the boards. Boards are
+rebuilt from the database by the first ``record`` that finds them
+missing, or by ``manage.py rebuild_leaderboards``; until then, and for
+anything past the cached prefix, ``top`` answers with a window-function
+(RANK) query over the gradebook and ``rank_of`` with two indexed
+lookups. Membership and assignment changes, and regrades, drop all
+boards of a room (``Room.forget_leaderboards``).
+
+Boards are updated by whichever process grades an attempt (web workers,
+the grading worker, the expiry sweeper), so they are only kept in a
+shared cache (``myapp.caching``). With a per-process cache every read
+takes the database path and nothing is cached.
+"""
+import heapq
+import time
+from bisect import bisect_left, insort
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Sum, Window
+from django.db.models.functions import Rank
+
+from myapp.caching import cache_is_shared
+from .models import GradebookEntry, Room, RoomMembership, RoomQuizAssignment
+
+ROOM_BOARD = None  # quiz_id of the room-wide board
+LOCK_TIMEOUT = 5
+LOCK_ATTEMPTS = 20
+
+
+class Standing(NamedTuple):
+    rank: int
+    student_id: int
+    score: float
+
+
+def cache_timeout():
+    return getattr(settings, "TAKEQ_LEADERBOARD_CACHE_SECONDS", 60 * 60 * 24)
+
+
+def board_size():
+    return getattr(settings, "TAKEQ_LEADERBOARD_SIZE", 100)
+
+
+def _board_key(room_id, quiz_id, version):
+    return f"leaderboard_top:{room_id}:{'room' if quiz_id is ROOM_BOARD else quiz_id}:{version}"
+
+
+def _lock_key(room_id):
+    return f"leaderboard_lock:{room_id}"
+
+
+def _versions(room_ids):
+    """``{room_id: version}``, starting a version for rooms that have none cached."""
+    keys = {Room.leaderboard_version_key(rid): rid for rid in room_ids}
+    found = cache.get_many(keys)
+    versions = {keys[k]: v for k, v in found.items()}
+    for key, rid in keys.items():
+        if key not in found:
+            cache.add(key, time.time_ns(), None)
+            versions[rid] = cache.get(key)
+    return versions
+
+
+def _make(pairs):
+    scores = {sid: round(score, 6) for sid, score in pairs}
+    entries = heapq.nsmallest(board_size(), ((-score, sid) for sid, score in scores.items()))
+    return {
+        "scores": {sid: -neg for neg, sid in entries},
+        "entries": entries,
+        "truncated": len(entries) < len(scores),
+    }
+
+
+def _offer(board, student_id, score):
+    """Put ``student_id``'s new (not lower) score on ``board`` if it makes the cut."""
+    score = round(score, 6)  # sums kept here must tie with sums from the database
+    scores, entries = board["scores"], board["entries"]
+    old = scores.pop(student_id, None)
+    if old is not None:
+        del entries[bisect_left(entries, (-old, student_id))]
+    entry = (-score, student_id)
+    if len(entries) >= board_size() and not entry < entries[-1]:
+        board["truncated"] = True
+        return
+    insort(entries, entry)
+    scores[student_id] = score
+    if len(entries) > board_size():
+        del scores[entries.pop()[1]]
+        board["truncated"] = True
+
+
+def _ranked(entries):
+    """Standings for sorted ``entries`` (a prefix of a board)."""
+    standings = []
+    for i, (neg, sid) in enumerate(entries):
+        rank = standings[-1].rank if standings and standings[-1].score == -neg else i + 1
+        standings.append(Standing(rank, sid, -neg))
+    return standings
+
+
+# -- database side ---------------------------------------------------------
+
+def _scored(room_ids):
+    """Gradebook entries on the leaderboards: current students, assigned quizzes, with a score."""
+    return GradebookEntry.objects.filter(
+        Exists(RoomMembership.objects.filter(
+            room_id=OuterRef("room_id"), user_id=OuterRef("student_id"), role=RoomMembership.ROLE_STUDENT,
+        )),
+        Exists(RoomQuizAssignment.objects.filter(room_id=OuterRef("room_id"), quiz_id=OuterRef("quiz_id"))),
+        room_id__in=room_ids,
+        best_score__isnull=False,
+    )
+
+
+def _board_rows(room_id, quiz_id):
+    """One board as a ``student_id``, ``score`` values queryset."""
+    rows = _scored([room_id]).values("student_id")
+    if quiz_id is ROOM_BOARD:
+        return rows.annotate(score=Sum("best_score"))
+    return rows.filter(quiz_id=quiz_id).annotate(score=F("best_score"))
+
+
+def _ranked_query(room_id, quiz_id):
+    """``(student_id, score, rank)`` rows of one board, ranked by a window function."""
+    return _board_rows(room_id, quiz_id).annotate(
+        rank=Window(Rank(), order_by=F("score").desc()),
+    ).values_list("student_id", "score", "rank")
+
+
+def build(room_ids):
+    """Every board of ``room_ids``, as ``{(room_id, quiz_id): board}``; two queries."""
+    room_ids = list(room_ids)
+    quiz_rows, room_rows = {}, {}
+    for room_id, quiz_id in RoomQuizAssignment.objects.filter(room_id__in=room_ids).values_list("room_id", "quiz_id"):
+        quiz_rows[room_id, quiz_id] = []
+    for room_id in room_ids:
+        room_rows[room_id] = {}
+    for room_id, quiz_id, student_id, score in _scored(room_ids).values_list(
+        "room_id", "quiz_id", "student_id", "best_score"
+    ):
+        quiz_rows[room_id, quiz_id].append((student_id, score))
+        totals = room_rows[room_id]
+        totals[student_id] = totals.get(student_id, 0) + score
+    boards = {key: _make(rows) for key, rows in quiz_rows.items()}
+    boards.update({(room_id, ROOM_BOARD): _make(totals.items()) for room_id, totals in room_rows.items()})
+    return boards
+
+
+def warm(room_ids):
+    """Rebuild and cache every board of ``room_ids``. Returns the number of boards."""
+    if not cache_is_shared():
+        return 0
+    boards = build(room_ids)
+    versions = _versions({room_id for room_id, _ in boards})
+    cache.set_many(
+        {_board_key(room_id, quiz_id, versions[room_id]): b for (room_id, quiz_id), b in boards.items()},
+        cache_timeout(),
+    )
+    return len(boards)
+
+
+# -- updates ---------------------------------------------------------------
+
+def record(rooms, attempts):
+    """
+    Fold graded ``attempts`` into the cached boards once the transaction
+    commits. ``rooms`` maps ``(quiz_id, taker_id)`` to the room ids where
+    the attempt counts (see ``room.gradebook``).
+    """
+    if not cache_is_shared():
+        return
+    updates = {}
+    for attempt in attempts:
+        if attempt.score is None:
+            continue
+        for room_id in rooms.get((attempt.quiz_id, attempt.taker_id), ()):
+            updates.setdefault(room_id, []).append((attempt.quiz_id, attempt.taker_id, attempt.score))
+    if updates:
+        transaction.on_commit(lambda: _apply(updates))
+
+
+def _apply(updates):
+    versions = _versions(updates)
+    for room_id, scores in updates.items():
+        lock = _lock_key(room_id)
+        for _ in range(LOCK_ATTEMPTS):
+            if cache.add(lock, 1, LOCK_TIMEOUT):
+                break
+            time.sleep(0.005)
+        else:
+            # another process keeps the boards busy (cache.add is atomic in
+            # a shared cache): drop them rather than race
+            Room.forget_leaderboards([room_id])
+            continue
+        try:
+            _apply_room(room_id, versions[room_id], scores)
+        finally:
+            cache.delete(lock)
+
+
+def _current(room_id, student_ids):
+    """``({(quiz_id, student_id): best}, {student_id: total})`` of ``student_ids``; one query."""
+    bests, totals = {}, {}
+    for quiz_id, student_id, score in _scored([room_id]).filter(student_id__in=student_ids).values_list(
+        "quiz_id", "student_id", "best_score"
+    ):
+        bests[quiz_id, student_id] = score
+        totals[student_id] = totals.get(student_id, 0) + score
+    return bests, totals
+
+
+def _apply_room(room_id, version, scores):
+    keys = {_board_key(room_id, quiz_id, version): quiz_id for quiz_id, _, _ in scores}
+    room_key = _board_key(room_id, ROOM_BOARD, version)
+    boards = cache.get_many([*keys, room_key])
+    # the transaction has committed: the gradebook holds the new bests
+    bests, totals = _current(room_id, {student_id for _, student_id, _ in scores})
+    changed = {}
+    for key, quiz_id in keys.items():
+        if key not in boards:
+            changed[key] = _make(_board_rows(room_id, quiz_id).values_list("student_id", "score"))
+    if room_key not in boards:
+        changed[room_key] = _make(_board_rows(room_id, ROOM_BOARD).values_list("student_id", "score"))
+    for quiz_id, student_id, _ in scores:
+        key = _board_key(room_id, quiz_id, version)
+        if key not in boards:
+            continue
+        best = bests.get((quiz_id, student_id))
+        if best is None:
+            continue
+        board = changed[key] = boards[key]
+        if board["scores"].get(student_id) != round(best, 6):
+            _offer(board, student_id, best)
+    if room_key in boards:
+        room_board = boards[room_key]
+        for student_id, total in totals.items():
+            if room_board["scores"].get(student_id) != round(total, 6):
+                _offer(room_board, student_id, total)
+                changed[room_key] = room_board
+    if changed:
+        cache.set_many(changed, cache_timeout())
+
+
+# -- reads -----------------------------------------------------------------
+
+def _cached(room_id, quiz_id):
+    if not cache_is_shared():
+        return None
+    return cache.get(_board_key(room_id, quiz_id, _versions([room_id])[room_id]))
+
+
+def top(room, quiz_id=ROOM_BOARD, k=10):
+    """The first ``k`` standings of a board, best first."""
+    board = _cached(room.pk, quiz_id)
+    if board is not None and (k <= len(board["entries"]) or not board["truncated"]):
+        return _ranked(board["entries"][:k])
+    rows = _ranked_query(room.pk, quiz_id).order_by("rank", "student_id")[:k]
+    return [Standing(rank, sid, score) for sid, score, rank in rows]
+
+
+def rank_of(room, student_id, quiz_id=ROOM_BOARD):
+    """``student_id``'s standing on a board, or None without a score."""
+    board = _cached(room.pk, quiz_id)
+    if board is not None:
+        score = board["scores"].get(student_id)
+        if score is not None:
+            return Standing(bisect_left(board["entries"], (-score,)) + 1, student_id, score)
+        if not board["truncated"]:
+            return None
+    # a filter on student_id would apply before the window, so count instead
+    rows = _board_rows(room.pk, quiz_id)
+    score = next(iter(rows.filter(student_id=student_id).values_list("score", flat=True)), None)
+    if score is None:
+        return None
+    return Standing(rows.filter(score__gt=score).count() + 1, student_id, score)
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import threading
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from myapp.benchmarking import scratch_database, summarize, timer
+from myapp.live import get_broker, quiz_channel
+from myapp.models import Quiz
+from room.models import Room, RoomMembership, RoomQuizAssignment
+
+User = get_user_model()
+
+
+class Listener:
+    """One EventSource client driven straight through the ASGI application."""
+
+    def __init__(self, application, path, cookie):
+        self.application = application
+        self.scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": b"", "root_path": "",
+            "headers": [(b"host", b"localhost"), (b"accept", b"text/event-stream"), (b"cookie", cookie.encode())],
+            "client": ("127.0.0.1", 0), "server": ("localhost", 80),
+        }
+        self.connected = asyncio.Event()
+        self.closing = asyncio.Event()
+        self.status = None
+        self.latencies = []
+        self.buffer = ""
+        self.sent_request = False
+
+    async def receive(self):
+        if not self.sent_request:
+            self.sent_request = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.closing.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+            return
+        if message["type"] != "http.response.body":
+            return
+        now = time.perf_counter()
+        self.buffer += message.get("body", b"").decode()
+        *frames, self.buffer = self.buffer.split("\n\n")
+        for frame in frames:
+            if frame.startswith("retry:"):
+                self.connected.set()
+            for line in frame.splitlines():
+                if line.startswith("data: "):
+                    self.latencies.append(now - json.loads(line[6:])["sent"])
+        if not message.get("more_body", False):
+            self.connected.set()  # refused or ended
+
+    async def run(self):
+        await self.application(self.scope, self.receive, self.send)
+
+
+class Command(BaseCommand):
+    help = (
+        "Hold many room-monitor event streams open on one ASGI worker (one event "
+        "loop) and time how long published exam events take to reach all of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--listeners", type=int, default=500)
+        parser.add_argument("--events", type=int, default=50, help="Events published after everyone is connected.")
+        parser.add_argument("--rate", type=float, default=20.0, help="Events published per second.")
+        parser.add_argument(
+            "--trace-memory", action="store_true",
+            help="Report Python heap per open stream (tracemalloc; slows the connect phase).",
+        )
+
+    def handle(self, *args, **options):
+        from myproject.asgi import application
+
+        with scratch_database():
+            teacher = User.objects.create(username="bench-teacher")
+            student = User.objects.create(username="bench-student")
+            room = Room.objects.create(name="Bench room", owner=teacher)
+            RoomMembership.objects.bulk_create([
+                RoomMembership(room=room, user=teacher, role=RoomMembership.ROLE_OWNER),
+                RoomMembership(room=room, user=student),
+            ])
+            quiz = Quiz.objects.create(title="Bench quiz", creator=teacher, is_published=True)
+            RoomQuizAssignment.objects.create(room=room, quiz=quiz)
+            client = Client()
+            client.force_login(teacher)
+            cookie = "; ".join(f"{k}={m.value}" for k, m in client.cookies.items())
+            path = reverse("room:monitor_stream", args=[room.code])
+
+            asyncio.run(self._run(application, path, cookie, quiz, student, options))
+
+    async def _run(self, application, path, cookie, quiz, student, options):
+        n, n_events = options["listeners"], options["events"]
+        broker = get_broker()
+        if options["trace_memory"]:
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+
+        listeners = [Listener(application, path, cookie) for _ in range(n)]
+        with timer() as connecting:
+            tasks = [asyncio.create_task(listener.run()) for listener in listeners]
+            await asyncio.gather(*(listener.connected.wait() for listener in listeners))
+        refused = sum(1 for listener in listeners if listener.status != 200)
+        self.stdout.write(
+            f"{n} listeners connected in {connecting['seconds'] * 1000:.0f}ms "
+            f"({refused} refused, {broker.subscriber_count(quiz_channel(quiz.pk))} subscribed)"
+        )
+        if options["trace_memory"]:
+            grown = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+            self.stdout.write(f"  ~{grown / max(n, 1) / 1024:.1f} KiB of Python heap per open stream")
+            tracemalloc.stop()
+
+        # publish from another thread, as sync views running in a thread pool do
+        def publish_all():
+            for i in range(n_events):
+                broker.publish(quiz_channel(quiz.pk), {
+                    "type": "progress", "attempt": i, "quiz": quiz.pk, "taker": student.pk,
+                    "answered": [i], "sent": time.perf_counter(),
+                })
+                time.sleep(1.0 / options["rate"])
+
+        with timer() as fanning:
+            publisher = threading.Thread(target=publish_all)
+            publisher.start()
+            await asyncio.to_thread(publisher.join)
+            deadline = time.perf_counter() + 10
+            while sum(len(listener.latencies) for listener in listeners) < n * n_events:
+                if time.perf_counter() > deadline:
+                    break  # report what arrived
+                await asyncio.sleep(0.01)
+        latencies = [s for listener in listeners for s in listener.latencies]
+        self.stdout.write(summarize(f"delivery of {n_events} events to {n} listeners", latencies))
+        self.stdout.write(
+            f"  {len(latencies)} deliveries in {fanning['seconds']:.2f}s "
+            f"({len(latencies) / fanning['seconds']:.0f}/s)"
+        )
+
+        with timer() as closing:
+            for listener in listeners:
+                listener.closing.set()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self.stdout.write(
+            f"disconnected in {closing['seconds'] * 1000:.0f}ms; "
+            f"{broker.subscriber_count()} subscriptions left"
+        )
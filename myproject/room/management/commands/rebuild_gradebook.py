@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from room.gradebook import rebuild
+from room.models import Room
+
+
+class Command(BaseCommand):
+    help = "Recompute room gradebooks from the attempts table (all rooms, or the given room codes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("codes", nargs="*", help="Room codes; omit to rebuild every room.")
+
+    def handle(self, *args, **options):
+        room_ids = None
+        if options["codes"]:
+            codes = [c.upper() for c in options["codes"]]
+            room_ids = list(Room.objects.filter(code__in=codes).values_list("pk", flat=True))
+            if len(room_ids) != len(set(codes)):
+                raise CommandError("Unknown room code(s).")
+        written = rebuild(room_ids)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} gradebook entr{'y' if written == 1 else 'ies'}."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.caching import cache_is_shared
+from room.leaderboard import warm
+from room.models import Room
+
+
+class Command(BaseCommand):
+    help = "Rebuild the cached room leaderboards from the gradebook (all rooms, or the given room codes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("codes", nargs="*", help="Room codes; omit to rebuild every room.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rooms read per query.")
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            raise CommandError("Leaderboards are only cached in a shared cache (see TAKEQ_SHARED_CACHE).")
+        rooms = Room.objects.order_by("pk")
+        if options["codes"]:
+            codes = [c.upper() for c in options["codes"]]
+            rooms = rooms.filter(code__in=codes)
+        room_ids = list(rooms.values_list("pk", flat=True))
+        if options["codes"] and len(room_ids) != len(set(codes)):
+            raise CommandError("Unknown room code(s).")
+        boards = 0
+        for i in range(0, len(room_ids), options["batch_size"]):
+            boards += warm(room_ids[i:i + options["batch_size"]])
+        self.stdout.write(self.style.SUCCESS(f"Cached {boards} leaderboard{'' if boards == 1 else 's'} for {len(room_ids)} room(s)."))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('room', '0002_alter_roomquizassignment_unique_together'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='roominvitation',
+            index=models.Index(fields=['invited_user', 'status'], name='roominvitation_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roommembership',
+            index=models.Index(fields=['user', 'role'], name='roommembership_user_role_idx'),
+        ),
+    ]
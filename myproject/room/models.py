@@ -1,7 +1,15 @@
-from django.db import models
+import time
+
+from django.db import models, transaction
+from django.db.models import F
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.apps import apps
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from myapp.caching import cache_is_shared
 
 User = get_user_model()
 
@@ -21,6 +29,18 @@ class Room(models.Model):
     def __str__(self):
         return f"{self.name} ({self.code})"
 
+    # Version of the room's cached leaderboards (room.leaderboard). A new
+    # value orphans every board of the room; set when membership or
+    # assigned quizzes change. Never reused, even after eviction.
+    @staticmethod
+    def leaderboard_version_key(room_id):
+        return f"leaderboard_version:{room_id}"
+
+    @classmethod
+    def forget_leaderboards(cls, room_ids):
+        version = time.time_ns()
+        cache.set_many({cls.leaderboard_version_key(rid): version for rid in room_ids}, None)
+
 class RoomMembership(models.Model):
 	ROLE_OWNER = 'owner'
 	ROLE_ADMIN = 'admin'
@@ -38,6 +58,19 @@ class RoomMembership(models.Model):
 
 	class Meta:
 		unique_together = ('room', 'user')
+		indexes = [
+			models.Index(fields=['user', 'role'], name='roommembership_user_role_idx'),
+		]
+
+	# Cached {room_id: role} map of a user, see room.permissions. Dropped by
+	# the signal handlers below; bulk writes must call forget_roles().
+	@staticmethod
+	def roles_cache_key(user_id):
+		return f"room_roles:{user_id}"
+
+	@classmethod
+	def forget_roles(cls, user_ids):
+		cache.delete_many([cls.roles_cache_key(uid) for uid in user_ids])
 
 	def __str__(self):
 		return f"Quiz {self.quiz_id} assigned to {self.room}"
@@ -62,6 +95,9 @@ class RoomInvitation(models.Model):
 
 	class Meta:
 		unique_together = ('room', 'invited_user')
+		indexes = [
+			models.Index(fields=['invited_user', 'status'], name='roominvitation_user_status_idx'),
+		]
 
 	def accept(self):
 		if self.status != self.STATUS_PENDING:
@@ -70,6 +106,7 @@ class RoomInvitation(models.Model):
 		self.status = self.STATUS_ACCEPTED
 		self.responded_at = timezone.now()
 		self.save()
+		self.adjust_pending_count([self.invited_user_id], -1)
 
 	def decline(self):
 		if self.status != self.STATUS_PENDING:
@@ -77,6 +114,48 @@ class RoomInvitation(models.Model):
 		self.status = self.STATUS_DECLINED
 		self.responded_at = timezone.now()
 		self.save()
+		self.adjust_pending_count([self.invited_user_id], -1)
+
+	# The navbar badge reads the user's PendingInvitationCount row, a
+	# primary-key lookup instead of a COUNT on every page. With a shared
+	# cache (myapp.caching) the row is also cached; writers drop the cached
+	# value once they commit.
+	PENDING_COUNT_TIMEOUT = 60 * 60 * 24
+
+	@staticmethod
+	def pending_count_key(user_id):
+		return f"room_invites_pending:{user_id}"
+
+	@classmethod
+	def pending_count_for(cls, user):
+		shared = cache_is_shared()
+		key = cls.pending_count_key(user.pk)
+		if shared:
+			count = cache.get(key)
+			if count is not None:
+				return count
+		count = PendingInvitationCount.objects.filter(user=user).values_list('count', flat=True).first()
+		if count is None:
+			count = cls.objects.filter(invited_user=user, status=cls.STATUS_PENDING).count()
+			PendingInvitationCount.objects.bulk_create(
+				[PendingInvitationCount(user=user, count=count)], ignore_conflicts=True
+			)
+		if shared:
+			cache.set(key, count, cls.PENDING_COUNT_TIMEOUT)
+		return count
+
+	@classmethod
+	def adjust_pending_count(cls, user_ids, delta):
+		"""
+		Add ``delta`` to the counters of ``user_ids``; one UPDATE. Users
+		without a counter row are counted on their next read.
+		"""
+		user_ids = list(user_ids)
+		if not user_ids:
+			return
+		PendingInvitationCount.objects.filter(user_id__in=user_ids).update(count=F('count') + delta)
+		keys = [cls.pending_count_key(uid) for uid in user_ids]
+		transaction.on_commit(lambda: cache.delete_many(keys))
 
 	def __str__(self):
 		return f"Quiz {self.quiz_id} assigned to {self.room}"
@@ -94,3 +173,56 @@ class RoomQuizAssignment(models.Model):
         quiz_title = getattr(self.quiz, 'title', f'#{getattr(self.quiz, "pk", "unknown")}')
         return f"Quiz {quiz_title} assigned to {self.room}"
 
+
+
+class PendingInvitationCount(models.Model):
+    """
+    Number of pending ``RoomInvitation`` rows of a user, kept by
+    ``RoomInvitation.adjust_pending_count``. Created from a COUNT by the
+    first ``RoomInvitation.pending_count_for``; writers only adjust
+    existing rows.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.count} pending"
+
+
+class GradebookEntry(models.Model):
+    """
+    One student's results on one quiz assigned to a room, maintained
+    incrementally by ``room.gradebook`` as attempts are graded.
+    """
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='gradebook_entries')
+    quiz = models.ForeignKey('myapp.Quiz', on_delete=models.CASCADE, related_name='+')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    best_score = models.FloatField(null=True, blank=True)
+    latest_score = models.FloatField(null=True, blank=True)
+    attempt_count = models.PositiveIntegerField(default=0)
+    last_finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # also serves room gradebook pages: room -> students -> quizzes
+            models.UniqueConstraint(fields=['room', 'student', 'quiz'], name='gradebook_room_student_quiz_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} on quiz {self.quiz_id} in {self.room_id}"
+
+
+@receiver(post_save, sender=RoomMembership)
+@receiver(post_delete, sender=RoomMembership)
+def _on_membership_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        RoomMembership.forget_roles([instance.user_id])
+        Room.forget_leaderboards([instance.room_id])
+
+
+@receiver(post_save, sender=RoomQuizAssignment)
+@receiver(post_delete, sender=RoomQuizAssignment)
+def _on_assignment_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Room.forget_leaderboards([instance.room_id])
+
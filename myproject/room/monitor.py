@@ -0,0 +1,274 @@
+"""
+Live exam monitor for a room.
+
+The page is rendered once from the database (``snapshot``); after that it
+only receives deltas over a server-sent-events stream (``event_stream``),
+fed by the ``myapp.live`` broker. Publishers announce ``started``,
+``progress`` and ``submitted`` events on the quiz's channel without any
+query; the stream loads the room's quizzes and students once when the
+client connects and drops events of takers who are not students of the
+room. Quizzes assigned after the connection are picked up when the
+browser reconnects.
+
+The broker only reaches listeners of its own process, and attempts are
+also graded by the queued-submit worker and the expiry sweeper. So one
+``Reconciler`` per process (per event loop) runs one query
+(``missed_events``) every ``TAKEQ_MONITOR_POLL_SECONDS`` for the quizzes
+any stream watches: attempts started since the last check, and
+attempts it knows to be open that have since finished. It publishes
+them on the broker flagged ``reconciled``, and each stream drops those
+it already heard of. However many listeners are connected, the
+database sees one poll per process.
+"""
+import asyncio
+import json
+import weakref
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from myapp.export import room_attempts
+from myapp.live import get_broker, publish, quiz_channel
+from myapp.models import Answer, Attempt, Quiz
+from .models import RoomMembership
+
+# finished attempts older than this are left off the monitor
+RECENT = timedelta(hours=12)
+SNAPSHOT_LIMIT = 500
+RETRY_MS = 3000
+# commits can land a little after the started_at they carry
+POLL_OVERLAP = timedelta(seconds=5)
+EVENT_FIELDS = ('pk', 'quiz_id', 'taker_id', 'started_at', 'deadline', 'finished_at', 'score')
+
+
+def keepalive_seconds():
+    return getattr(settings, 'TAKEQ_MONITOR_KEEPALIVE_SECONDS', 15)
+
+
+def poll_seconds():
+    return getattr(settings, 'TAKEQ_MONITOR_POLL_SECONDS', 10)
+
+
+def _answered(open_ids):
+    """``{attempt_id: {question_id, ...}}`` saved so far."""
+    answered = {pk: set() for pk in open_ids}
+    for attempt_id, qid in Answer.objects.filter(attempt_id__in=open_ids).values_list('attempt_id', 'question_id'):
+        answered[attempt_id].add(qid)
+    return answered
+
+
+def snapshot(room):
+    """Initial state of the monitor page: the room's quizzes and recent attempts."""
+    # a quiz drawing from a pool shows each taker draw_count questions
+    quizzes = {
+        pk: {'title': title, 'questions': min(n, draw) if draw else n}
+        for pk, title, n, draw in Quiz.objects.filter(roomquizassignment__room=room)
+        .annotate(n=Count('questions')).values_list('pk', 'title', 'n', 'draw_count')
+    }
+    attempts = list(
+        room_attempts(room)
+        .filter(Q(finished_at__isnull=True) | Q(started_at__gte=timezone.now() - RECENT))
+        .order_by('-started_at')
+        .values('pk', 'quiz_id', 'taker_id', 'taker__username', 'started_at', 'deadline', 'finished_at', 'score')
+        [:SNAPSHOT_LIMIT]
+    )
+    answered = _answered([a['pk'] for a in attempts if a['finished_at'] is None])
+    return {
+        'quizzes': quizzes,
+        'attempts': [
+            {
+                'attempt': a['pk'],
+                'quiz': a['quiz_id'],
+                'taker': a['taker_id'],
+                'username': a['taker__username'],
+                'started_at': a['started_at'],
+                'deadline': a['deadline'],
+                'finished_at': a['finished_at'],
+                'score': a['score'],
+                'answered': sorted(answered.get(a['pk'], ())),
+            }
+            for a in attempts
+        ],
+    }
+
+
+def listen_to(room):
+    """``(quiz_ids, {student_id: username})`` a stream for ``room`` needs; two queries."""
+    quiz_ids = list(room.assignments.values_list('quiz_id', flat=True))
+    students = dict(
+        room.memberships.filter(role=RoomMembership.ROLE_STUDENT).values_list('user_id', 'user__username')
+    )
+    return quiz_ids, students
+
+
+def format_event(kind, data, event_id=None):
+    lines = [f'id: {event_id}'] if event_id is not None else []
+    lines += [f'event: {kind}', 'data: ' + json.dumps(data, cls=DjangoJSONEncoder)]
+    return '\n'.join(lines) + '\n\n'
+
+
+def open_attempts(quiz_ids):
+    """``{attempt_id: quiz_id}`` of the open attempts of ``quiz_ids``; one query."""
+    return dict(
+        Attempt.objects.filter(quiz_id__in=quiz_ids, finished_at__isnull=True).values_list('pk', 'quiz_id')
+    )
+
+
+def _as_event(row):
+    return {
+        'type': 'submitted' if row['finished_at'] else 'started',
+        'attempt': row['pk'], 'quiz': row['quiz_id'], 'taker': row['taker_id'],
+        'started_at': row['started_at'], 'deadline': row['deadline'],
+        'finished_at': row['finished_at'], 'score': row['score'],
+    }
+
+
+def missed_events(quiz_ids, open_ids, done_ids, since):
+    """
+    ``started`` and ``submitted`` events a process may have missed:
+    attempts of ``quiz_ids`` started at or after ``since``, and attempts
+    of ``open_ids`` that have finished. Attempts already known in that
+    state (``open_ids``, ``done_ids``) are skipped. One query.
+    """
+    rows = Attempt.objects.filter(quiz_id__in=quiz_ids).filter(
+        Q(pk__in=open_ids, finished_at__isnull=False) | Q(started_at__gte=since)
+    ).order_by('started_at', 'pk').values(*EVENT_FIELDS)
+    events = []
+    for row in rows:
+        known = done_ids if row['finished_at'] else open_ids
+        if row['pk'] not in known:
+            events.append(_as_event(row))
+    return events
+
+
+class Reconciler:
+    """
+    The per-process poll behind the monitor streams of one event loop
+    (see the module docstring). Streams ``watch`` their quizzes while
+    connected; the poll runs while any quiz is watched.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.watched = {}  # quiz_id -> number of streams
+        self.open = {}  # attempt_id -> quiz_id, open at the last check
+        self.done = {}  # attempt_id -> started_at, finished and still inside the poll window
+        self.new = set()  # quizzes watched since the last check
+        self.since = None
+        self.task = None
+
+    def watch(self, quiz_ids):
+        for pk in quiz_ids:
+            if pk not in self.watched:
+                self.new.add(pk)
+            self.watched[pk] = self.watched.get(pk, 0) + 1
+        if self.task is None or self.task.done():
+            self.since = timezone.now()
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    def unwatch(self, quiz_ids):
+        for pk in quiz_ids:
+            self.watched[pk] -= 1
+            if not self.watched[pk]:
+                del self.watched[pk]
+                self.new.discard(pk)
+        self.open = {a: q for a, q in self.open.items() if q in self.watched}
+
+    def check(self):
+        """Query for missed events and update the known state; sync, one or two queries."""
+        checked_at = timezone.now()
+        if self.new:
+            self.open.update(open_attempts(list(self.new)))
+            self.new = set()
+        since = self.since - POLL_OVERLAP
+        events = missed_events(list(self.watched), set(self.open), self.done, since)
+        self.since = checked_at
+        # the next window starts at checked_at - POLL_OVERLAP
+        self.done = {pk: started for pk, started in self.done.items() if started >= checked_at - POLL_OVERLAP}
+        for event in events:
+            if event['type'] == 'started':
+                self.open[event['attempt']] = event['quiz']
+            else:
+                self.open.pop(event['attempt'], None)
+                self.done[event['attempt']] = event['started_at']
+        return events
+
+    async def _run(self):
+        while self.watched:
+            await asyncio.sleep(self.interval)
+            if not self.watched:
+                break
+            for event in await sync_to_async(self.check)():
+                publish(quiz_channel(event['quiz']), {**event, 'reconciled': True})
+
+
+_reconcilers = weakref.WeakKeyDictionary()  # event loop -> Reconciler
+
+
+def get_reconciler(interval=None):
+    """The ``Reconciler`` of the running event loop."""
+    loop = asyncio.get_running_loop()
+    reconciler = _reconcilers.get(loop)
+    if reconciler is None:
+        reconciler = _reconcilers[loop] = Reconciler(poll_seconds() if interval is None else interval)
+    return reconciler
+
+
+def _track(event, open_ids, done_ids):
+    """Record ``event`` in the stream's state; False for a reconciled event it already sent."""
+    attempt = event['attempt']
+    if event.get('reconciled') and (attempt in done_ids or (event['type'] == 'started' and attempt in open_ids)):
+        return False
+    if event['type'] == 'started':
+        open_ids.add(attempt)
+    elif event['type'] == 'submitted':
+        open_ids.discard(attempt)
+        done_ids.add(attempt)
+    return True
+
+
+async def event_stream(quiz_ids, students, keepalive=None, poll=None):
+    """
+    Server-sent events for one client: every event of ``quiz_ids`` taken
+    by one of ``students``, with the username added. Sends a comment line
+    after ``keepalive`` quiet seconds so proxies keep the connection open,
+    and a ``reset`` event (then stops) if the client falls behind. Unless
+    ``poll`` is 0, the quizzes are watched by the process's
+    ``Reconciler``, which polls every ``poll`` seconds.
+    """
+    keepalive = keepalive_seconds() if keepalive is None else keepalive
+    poll = poll_seconds() if poll is None else poll
+    sub = get_broker().subscribe([quiz_channel(pk) for pk in quiz_ids])
+    reconciler = get_reconciler(poll) if poll else None
+    if reconciler:
+        reconciler.watch(quiz_ids)
+    loop = asyncio.get_running_loop()
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        open_ids, done_ids = set(), set()
+        last_sent = loop.time()
+        while True:
+            try:
+                event = await sub.get(timeout=max(0, last_sent + keepalive - loop.time()))
+            except sub.Overflow:
+                yield format_event('reset', {})
+                return
+            if event is not None:
+                username = students.get(event.get('taker'))
+                if username is None or not _track(event, open_ids, done_ids):
+                    continue
+                data = {k: v for k, v in event.items() if k not in ('type', 'id', 'reconciled')}
+                yield format_event(event['type'], {**data, 'username': username}, event['id'])
+                last_sent = loop.time()
+            elif loop.time() - last_sent >= keepalive:
+                yield ': keepalive\n\n'
+                last_sent = loop.time()
+    finally:
+        sub.close()
+        if reconciler:
+            reconciler.unwatch(quiz_ids)
@@ -0,0 +1,85 @@
+"""
+Who may do what in rooms, in one place.
+
+A user's ``{room_id: role}`` map is loaded with one query and memoized on
+the request, so a view checks any number of rooms at no extra cost. With
+``TAKEQ_ROOM_ROLES_CACHE_SECONDS`` set and a shared cache
+(``myapp.caching``), the map is also cached across requests. Membership
+signals (and ``RoomMembership.forget_roles`` after bulk writes) drop the
+cached map. A per-process cache is never used for it: the other workers
+would keep a removed admin's rights until the entry expired.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from myapp.caching import cache_is_shared
+
+from .models import RoomMembership, RoomQuizAssignment
+
+MANAGER_ROLES = (RoomMembership.ROLE_OWNER, RoomMembership.ROLE_ADMIN)
+_MEMO_ATTR = '_room_roles'
+
+
+def _load_roles(user):
+    return dict(RoomMembership.objects.filter(user=user).values_list('room_id', 'role'))
+
+
+def _known_roles(request):
+    """The roles map if it costs no query (memoized or cached), else None."""
+    roles = getattr(request, _MEMO_ATTR, None)
+    if roles is None and request.user.is_authenticated and _timeout():
+        roles = cache.get(RoomMembership.roles_cache_key(request.user.pk))
+        if roles is not None:
+            setattr(request, _MEMO_ATTR, roles)
+    return roles
+
+
+def _timeout():
+    if not cache_is_shared():
+        return 0
+    return getattr(settings, 'TAKEQ_ROOM_ROLES_CACHE_SECONDS', 0)
+
+
+def room_roles(request):
+    """``{room_id: role}`` for ``request.user``; at most one query per request."""
+    roles = _known_roles(request)
+    if roles is None:
+        roles = _load_roles(request.user) if request.user.is_authenticated else {}
+        if request.user.is_authenticated and _timeout():
+            cache.set(RoomMembership.roles_cache_key(request.user.pk), roles, _timeout())
+        setattr(request, _MEMO_ATTR, roles)
+    return roles
+
+
+def role_in_room(request, room, members=None):
+    """
+    ``request.user``'s role in ``room``, or None. Pass the room's already
+    loaded ``members`` to read the role from them instead of querying.
+    """
+    roles = _known_roles(request)
+    if roles is None and members is not None:
+        return next((m.role for m in members if m.user_id == request.user.pk), None)
+    return room_roles(request).get(room.pk)
+
+
+def can_manage_room(request, room):
+    return role_in_room(request, room) in MANAGER_ROLES
+
+
+def managed_room_ids(request):
+    return [room_id for room_id, role in room_roles(request).items() if role in MANAGER_ROLES]
+
+
+def can_manage_quiz(user, quiz):
+    """
+    The quiz's creator, or an owner/admin of a room it is assigned to.
+    One EXISTS query (on the membership (user, role) index) for non-creators.
+    """
+    if not user.is_authenticated:
+        return False
+    if quiz.creator_id == user.pk:
+        return True
+    return RoomQuizAssignment.objects.filter(
+        quiz=quiz, room__memberships__user=user, room__memberships__role__in=MANAGER_ROLES
+    ).exists()
+
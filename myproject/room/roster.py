@@ -0,0 +1,168 @@
+"""
+Bulk invitations from a roster (CSV upload or pasted list).
+
+Each roster line holds a username or email, optionally followed by a
+role. ``process_roster`` resolves every identifier in one query, then
+reads the room's existing members and invitations in two more. It sorts
+the rows with set operations and writes new rows with
+``bulk_create(ignore_conflicts=True)``. The query count does not depend
+on the roster size. Each line gets one ``RosterRow`` in the report.
+"""
+import csv
+import io
+from typing import NamedTuple
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .models import Room, RoomInvitation, RoomMembership
+
+User = get_user_model()
+
+MODE_INVITE = 'invite'
+MODE_ENROLL = 'enroll'
+ROLES = (RoomMembership.ROLE_STUDENT, RoomMembership.ROLE_ADMIN)
+HEADER_CELLS = {'username', 'email', 'user', 'username or email'}
+
+# status -> (is an error, message shown in the report)
+STATUSES = {
+    'invited': (False, 'Invitation sent'),
+    'reinvited': (False, 'Invitation sent again'),
+    'enrolled': (False, 'Added to the room'),
+    'member': (False, 'Already a member'),
+    'pending': (False, 'Already invited'),
+    'duplicate': (False, 'Listed more than once'),
+    'not_found': (True, 'No user with this username or email'),
+    'ambiguous': (True, 'Several users share this email'),
+    'bad_role': (True, 'Unknown role'),
+    'forbidden': (True, 'Only the owner can add admins'),
+}
+
+
+class RosterRow(NamedTuple):
+    line: int
+    identifier: str
+    role: str
+    status: str
+    user: object = None
+
+    @property
+    def is_error(self):
+        return STATUSES[self.status][0]
+
+    @property
+    def message(self):
+        return STATUSES[self.status][1]
+
+
+def parse_roster(text, default_role=RoomMembership.ROLE_STUDENT):
+    """``[(line, identifier, role)]`` from CSV or one-per-line text."""
+    entries = []
+    for line_no, cells in enumerate(csv.reader(io.StringIO(text)), start=1):
+        cells = [c.strip() for c in cells]
+        if not cells or not cells[0]:
+            continue
+        if not entries and cells[0].lower() in HEADER_CELLS:
+            continue
+        role = cells[1].lower() if len(cells) > 1 and cells[1] else default_role
+        entries.append((line_no, cells[0], role))
+    return entries
+
+
+def _resolve(identifiers):
+    """``{identifier: [user, ...]}``: username matches first, else case-insensitive email."""
+    lowered = {i.lower() for i in identifiers}
+    users = list(
+        User.objects.annotate(email_lower=Lower('email'))
+        .filter(Q(username__in=identifiers) | Q(email_lower__in=lowered))
+        .only('pk', 'username', 'email')
+    )
+    by_username = {u.username: u for u in users}
+    by_email = {}
+    for u in users:
+        if u.email:
+            by_email.setdefault(u.email.lower(), []).append(u)
+    return {
+        i: [by_username[i]] if i in by_username else by_email.get(i.lower(), [])
+        for i in identifiers
+    }
+
+
+def process_roster(room, inviter, inviter_role, entries, mode=MODE_INVITE):
+    """
+    Invite (or, with ``MODE_ENROLL``, directly add) the users of ``entries``
+    to ``room`` on behalf of ``inviter``. Returns one ``RosterRow`` per entry.
+    """
+    matches = _resolve({identifier for _, identifier, _ in entries})
+    rows, targets = [], {}
+    for line, identifier, role in entries:
+        users = matches[identifier]
+        if role not in ROLES:
+            status = 'bad_role'
+        elif role == RoomMembership.ROLE_ADMIN and inviter_role != RoomMembership.ROLE_OWNER:
+            status = 'forbidden'
+        elif not users:
+            status = 'not_found'
+        elif len(users) > 1:
+            status = 'ambiguous'
+        elif users[0].pk in targets:
+            status = 'duplicate'
+        else:
+            status = None
+            targets[users[0].pk] = role
+        rows.append([line, identifier, role, status, users[0] if len(users) == 1 else None])
+
+    user_ids = set(targets)
+    members = set(room.memberships.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+    invitations = dict(
+        room.invitations.filter(invited_user_id__in=user_ids - members).values_list('invited_user_id', 'status')
+    )
+    pending = {uid for uid, s in invitations.items() if s == RoomInvitation.STATUS_PENDING}
+    closed = set(invitations) - pending  # declined, or accepted and since left
+    fresh = user_ids - members - set(invitations)
+
+    with transaction.atomic():
+        if mode == MODE_ENROLL:
+            new = user_ids - members
+            RoomMembership.objects.bulk_create(
+                [RoomMembership(room=room, user_id=uid, role=targets[uid]) for uid in new],
+                ignore_conflicts=True,
+            )
+            # invitations to people now enrolled are settled
+            room.invitations.filter(invited_user_id__in=pending).update(
+                status=RoomInvitation.STATUS_ACCEPTED, responded_at=timezone.now()
+            )
+            RoomMembership.forget_roles(new)  # bulk_create sends no post_save
+            Room.forget_leaderboards([room.pk])
+            RoomInvitation.adjust_pending_count(pending, -1)
+            outcome = {uid: 'enrolled' for uid in new}
+        else:
+            RoomInvitation.objects.bulk_create(
+                [
+                    RoomInvitation(room=room, invited_user_id=uid, invited_by=inviter, role=targets[uid])
+                    for uid in fresh
+                ],
+                ignore_conflicts=True,
+            )
+            if closed:
+                # (room, invited_user) is unique: reopen old invitations instead
+                for role in {targets[uid] for uid in closed}:
+                    room.invitations.filter(
+                        invited_user_id__in=[uid for uid in closed if targets[uid] == role]
+                    ).update(
+                        status=RoomInvitation.STATUS_PENDING, role=role, invited_by=inviter,
+                        created_at=timezone.now(), responded_at=None,
+                    )
+            outcome = {uid: 'invited' for uid in fresh}
+            outcome.update({uid: 'reinvited' for uid in closed})
+            outcome.update({uid: 'pending' for uid in pending})
+            RoomInvitation.adjust_pending_count(fresh | closed, 1)
+        outcome.update({uid: 'member' for uid in members})
+
+    return [
+        RosterRow(line, identifier, role, status or outcome[user.pk], user)
+        for line, identifier, role, status, user in rows
+    ]
@@ -12,4 +12,10 @@ urlpatterns = [
 	path('invitation/<int:pk>/<str:action>/', views.InvitationResponseView.as_view(), name='invitation_response'),
 	path('assign_quiz/<str:code>/', views.AssignQuizToRoomView.as_view(), name='assign_quiz'),
     path('detail/<str:code>/delete/', views.DeleteRoomView.as_view(), name='delete'),
+    path('detail/<str:code>/gradebook/', views.GradebookView.as_view(), name='gradebook'),
+    path('detail/<str:code>/export/<str:fmt>/', views.RoomExportView.as_view(), name='export'),
+    path('detail/<str:code>/roster/', views.RosterInviteView.as_view(), name='roster'),
+    path('detail/<str:code>/leaderboard/', views.LeaderboardView.as_view(), name='leaderboard'),
+    path('detail/<str:code>/monitor/', views.RoomMonitorView.as_view(), name='monitor'),
+    path('detail/<str:code>/monitor/stream/', views.monitor_stream, name='monitor_stream'),
 ]
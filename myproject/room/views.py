@@ -1,22 +1,23 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.core.paginator import Paginator
 from django.views import View
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponseForbidden
-from .models import Room, RoomMembership, RoomInvitation, RoomQuizAssignment
-from .forms import RoomCreateForm, JoinRoomByCodeForm, InviteForm
+from django.http import HttpResponseForbidden, StreamingHttpResponse
+from .models import Room, RoomMembership, RoomInvitation, RoomQuizAssignment, GradebookEntry
+from .forms import RoomCreateForm, JoinRoomByCodeForm, InviteForm, RosterForm
+from .roster import parse_roster, process_roster
+from .permissions import MANAGER_ROLES, can_manage_room, role_in_room
+from . import leaderboard, monitor
 from django.contrib import messages
 from django.contrib.auth import get_user_model
+from myapp.export import export_response, room_attempts
 from myapp.models import Quiz
+from create_quiz.search import search_quizzes
 
 User = get_user_model()
 
-def user_role_in_room(user, room):
-	try:
-		m = RoomMembership.objects.get(user=user, room=room)
-		return m.role
-	except RoomMembership.DoesNotExist:
-		return None
-
 class CreateRoomView(LoginRequiredMixin, View):
 	def get(self, request):
 		form = RoomCreateForm()
@@ -35,17 +36,17 @@ class CreateRoomView(LoginRequiredMixin, View):
 class RoomDetailView(LoginRequiredMixin, View):
     def get(self, request, code):
         room = get_object_or_404(Room, code=code)
-        role = user_role_in_room(request.user, room)
-        members = room.memberships.select_related('user').all()
-        assignments = room.assignments.select_related('quiz').all()  
+        members = list(room.memberships.select_related('user'))
+        role = role_in_room(request, room, members=members)
+        assignments = room.assignments.select_related('quiz__creator').all()
 
         assigned_quizzes = [a.quiz for a in assignments]
 
         owner_quizzes = []
-        if role in (RoomMembership.ROLE_OWNER, RoomMembership.ROLE_ADMIN):
+        if role in MANAGER_ROLES:
             owner_quizzes_qs = Quiz.objects.filter(creator=request.user).order_by('-created_at')
             assigned_ids = [q.pk for q in assigned_quizzes]
-            owner_quizzes = owner_quizzes_qs.exclude(pk__in=assigned_ids)
+            owner_quizzes = search_quizzes(owner_quizzes_qs.exclude(pk__in=assigned_ids), request.GET.get('q', ''))
 
         visible_assigned_for_students = [q for q in assigned_quizzes if q.is_published]
 
@@ -57,6 +58,7 @@ class RoomDetailView(LoginRequiredMixin, View):
             'assigned_quizzes': assigned_quizzes,
             'owner_quizzes': owner_quizzes,
             'visible_assigned_for_students': visible_assigned_for_students,
+            'q': request.GET.get('q', ''),
         })
 
 class JoinByCodeView(LoginRequiredMixin, View):
@@ -66,7 +68,7 @@ class JoinByCodeView(LoginRequiredMixin, View):
 			return redirect('/')
 		code = form.cleaned_data['code'].upper()
 		room = get_object_or_404(Room, code=code)
-		if RoomMembership.objects.filter(room=room, user=request.user).exists():
+		if role_in_room(request, room) is not None:
 			return redirect('room:detail', code=room.code)
 		RoomMembership.objects.create(room=room, user=request.user, role=RoomMembership.ROLE_STUDENT)
 		return redirect('room:detail', code=room.code)
@@ -75,9 +77,9 @@ class InviteUserView(LoginRequiredMixin, View):
     def post(self, request, code):
         form = InviteForm(request.POST)
         room = get_object_or_404(Room, code=code)
-        role = user_role_in_room(request.user, room)
+        role = role_in_room(request, room)
 
-        if role not in (RoomMembership.ROLE_OWNER, RoomMembership.ROLE_ADMIN):
+        if role not in MANAGER_ROLES:
             return HttpResponseForbidden()
 
         if not form.is_valid():
@@ -110,12 +112,45 @@ class InviteUserView(LoginRequiredMixin, View):
         )
 
         if created:
+            RoomInvitation.adjust_pending_count([target.pk], 1)
             messages.success(request, f'Invitation sent to {target}')
         else:
             messages.info(request, f'Invitation already exists for {target}')
 
         return redirect('room:detail', code=room.code)
 
+class RosterInviteView(LoginRequiredMixin, View):
+    template_name = 'room/roster.html'
+
+    def _room(self, request, code):
+        room = get_object_or_404(Room, code=code)
+        role = role_in_room(request, room)
+        if role not in MANAGER_ROLES:
+            return room, None
+        return room, role
+
+    def get(self, request, code):
+        room, role = self._room(request, code)
+        if role is None:
+            return HttpResponseForbidden()
+        return render(request, self.template_name, {'room': room, 'form': RosterForm()})
+
+    def post(self, request, code):
+        room, role = self._room(request, code)
+        if role is None:
+            return HttpResponseForbidden()
+        form = RosterForm(request.POST, request.FILES)
+        report = None
+        if form.is_valid():
+            entries = parse_roster(form.cleaned_data['text'], default_role=form.cleaned_data['role'])
+            report = process_roster(room, request.user, role, entries, mode=form.cleaned_data['mode'])
+        return render(request, self.template_name, {
+            'room': room,
+            'form': form,
+            'report': report,
+            'error_count': sum(1 for row in report or () if row.is_error),
+        })
+
 class InvitationResponseView(LoginRequiredMixin, View):
 	def post(self, request, pk, action):
 		inv = get_object_or_404(RoomInvitation, pk=pk, invited_user=request.user)
@@ -129,14 +164,18 @@ class InvitationResponseView(LoginRequiredMixin, View):
 
 class InvitationsListView(LoginRequiredMixin, View):
 	def get(self, request):
-		invs = RoomInvitation.objects.filter(invited_user=request.user).order_by('-created_at')
+		invs = (
+			RoomInvitation.objects.filter(invited_user=request.user)
+			.select_related('room', 'invited_by')
+			.order_by('-created_at')
+		)
 		return render(request, 'room/invitations_list.html', {'invitations': invs})
 
 class AssignQuizToRoomView(LoginRequiredMixin, View):
 	def post(self, request, code):
 		room = get_object_or_404(Room, code=code)
-		role = user_role_in_room(request.user, room)
-		if role not in (RoomMembership.ROLE_OWNER, RoomMembership.ROLE_ADMIN):
+		role = role_in_room(request, room)
+		if role not in MANAGER_ROLES:
 			return HttpResponseForbidden()
 		quiz_id = int(request.POST.get('quiz_id'))
 		from myapp.models import Quiz
@@ -152,6 +191,116 @@ class DeleteRoomView(LoginRequiredMixin, View):
         room = get_object_or_404(Room, code=code)
         if room.owner != request.user:
             return HttpResponseForbidden()
+        invited = list(room.invitations.filter(status=RoomInvitation.STATUS_PENDING).values_list('invited_user_id', flat=True))
         room.delete()
+        RoomInvitation.adjust_pending_count(invited, -1)
         messages.success(request, 'Room deleted.')
-        return redirect('/')  
+        return redirect('/')
+
+
+class GradebookView(LoginRequiredMixin, View):
+    paginate_by = 50
+
+    def get(self, request, code):
+        room = get_object_or_404(Room, code=code)
+        role = role_in_room(request, room)
+        if role not in MANAGER_ROLES:
+            return HttpResponseForbidden()
+
+        quizzes = list(
+            Quiz.objects.filter(roomquizassignment__room=room)
+            .order_by('roomquizassignment__assigned_at', 'pk')
+            .only('pk', 'title')
+        )
+        students = (
+            room.memberships.filter(role=RoomMembership.ROLE_STUDENT)
+            .select_related('user')
+            .order_by('user__username')
+        )
+        page = Paginator(students, self.paginate_by).get_page(request.GET.get('page'))
+
+        entries = {
+            (e.student_id, e.quiz_id): e
+            for e in GradebookEntry.objects.filter(room=room, student_id__in=[m.user_id for m in page])
+        }
+        rows = [
+            {'student': m.user, 'cells': [entries.get((m.user_id, q.pk)) for q in quizzes]}
+            for m in page
+        ]
+        return render(request, 'room/gradebook.html', {
+            'room': room,
+            'quizzes': quizzes,
+            'rows': rows,
+            'page_obj': page,
+        })
+
+
+class RoomExportView(LoginRequiredMixin, View):
+    def get(self, request, code, fmt):
+        room = get_object_or_404(Room, code=code)
+        role = role_in_room(request, room)
+        if role not in MANAGER_ROLES:
+            return HttpResponseForbidden()
+        return export_response(room_attempts(room), fmt, f"room-{room.code}-results")
+
+
+class LeaderboardView(LoginRequiredMixin, View):
+    top_k = 20
+
+    def get(self, request, code):
+        room = get_object_or_404(Room, code=code)
+        role = role_in_room(request, room)
+        if role is None:
+            return HttpResponseForbidden()
+
+        quizzes = list(
+            Quiz.objects.filter(roomquizassignment__room=room)
+            .order_by('roomquizassignment__assigned_at', 'pk')
+            .only('pk', 'title')
+        )
+        quiz = next((q for q in quizzes if str(q.pk) == request.GET.get('quiz')), None)
+        quiz_id = quiz.pk if quiz else leaderboard.ROOM_BOARD
+
+        standings = leaderboard.top(room, quiz_id, k=self.top_k)
+        mine = None
+        if role == RoomMembership.ROLE_STUDENT:
+            mine = leaderboard.rank_of(room, request.user.pk, quiz_id)
+        names = dict(User.objects.filter(pk__in=[s.student_id for s in standings]).values_list('pk', 'username'))
+        return render(request, 'room/leaderboard.html', {
+            'room': room,
+            'quizzes': quizzes,
+            'quiz': quiz,
+            'rows': [{'standing': s, 'username': names.get(s.student_id)} for s in standings],
+            'mine': mine,
+        })
+
+
+class RoomMonitorView(LoginRequiredMixin, View):
+    def get(self, request, code):
+        room = get_object_or_404(Room, code=code)
+        if not can_manage_room(request, room):
+            return HttpResponseForbidden()
+        return render(request, 'room/monitor.html', {
+            'room': room,
+            'snapshot': monitor.snapshot(room),
+        })
+
+
+def _monitor_targets(request, code):
+    room = get_object_or_404(Room, code=code)
+    if not can_manage_room(request, room):
+        return None
+    return monitor.listen_to(room)
+
+
+@login_required
+async def monitor_stream(request, code):
+    """Server-sent events for the monitor page; served by the ASGI application."""
+    request.user = await request.auser()  # loaded by login_required; do not load it again
+    targets = await sync_to_async(_monitor_targets)(request, code)
+    if targets is None:
+        return HttpResponseForbidden()
+    response = StreamingHttpResponse(monitor.event_stream(*targets), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: do not buffer the stream
+    return response
@@ -1,3 +1,9 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import QueuedSubmission
+
+
+@admin.register(QueuedSubmission)
+class QueuedSubmissionAdmin(admin.ModelAdmin):
+    list_display = ('attempt', 'received_at', 'processed_at')
+    list_filter = ('processed_at',)
@@ -0,0 +1,87 @@
+"""
+Async versions of the exam hot paths: the take page, submit and result.
+
+``take_quiz.urls`` routes these instead of the sync views when
+``TAKEQ_ASYNC_VIEWS`` is on (off by default, see ``myproject/asgi.py``).
+Lookups use the async ORM, so a request waiting on the database holds no
+worker. The submit transaction and the cache-backed helpers (answer key,
+paper, saved answers) are sync code; they run in a worker thread via
+``sync_to_async``, since Django has no async transactions. Query counts
+match the sync views.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import aget_object_or_404, redirect, render
+
+from myapp.answer_key import get_answer_key
+from myapp.layout import attempt_layout
+from myapp.models import Attempt
+from .autosave import flush_interval, saved_answers
+from .paper import get_paper_html
+from .queue import ais_pending
+from .views import close_attempt, result_rows
+
+
+async def _user(request):
+    # login_required has loaded the user; keep templates from loading it again
+    request.user = await request.auser()
+    return request.user
+
+
+def _paper_and_answers(attempt):
+    return get_paper_html(attempt), saved_answers(attempt)
+
+
+@login_required
+async def take_quiz(request, quiz_id, attempt_id):
+    attempt = await aget_object_or_404(
+        Attempt.objects.select_related("quiz"),
+        pk=attempt_id, quiz_id=quiz_id, quiz__is_published=True, taker=await _user(request),
+    )
+    if attempt.finished_at or attempt.submitted_at:
+        return redirect("take_quiz:attempt_result", attempt_id=attempt.id)
+
+    paper, saved = await sync_to_async(_paper_and_answers)(attempt)
+    return render(request, "take_quiz/take_quiz.html", {
+        "quiz": attempt.quiz,
+        "attempt": attempt,
+        "paper": paper,
+        "saved_answers": saved,
+        "autosave_ms": int(flush_interval() * 1000),
+    })
+
+
+@login_required
+async def submit_quiz(request, attempt_id):
+    if request.method != "POST":
+        return redirect("home")
+
+    attempt = await aget_object_or_404(
+        Attempt.objects.select_related("quiz"), pk=attempt_id, taker=await _user(request)
+    )
+    if attempt.finished_at or attempt.submitted_at:
+        return redirect("take_quiz:attempt_result", attempt_id=attempt.id)
+
+    await sync_to_async(close_attempt)(attempt, request.POST)
+    return redirect("take_quiz:attempt_result", attempt_id=attempt.id)
+
+
+@login_required
+async def attempt_result(request, attempt_id):
+    attempt = await aget_object_or_404(
+        Attempt.objects.select_related("quiz"), pk=attempt_id, taker=await _user(request)
+    )
+    if attempt.finished_at is None and await ais_pending(attempt):
+        return render(request, "take_quiz/grading.html", {"attempt": attempt})
+
+    key = await sync_to_async(get_answer_key)(attempt.quiz)
+    stored = {
+        qid: (choice_id, text, is_correct)
+        async for qid, choice_id, text, is_correct in attempt.answers.values_list(
+            "question_id", "selected_choice_id", "text", "is_correct"
+        )
+    }
+    return render(request, "take_quiz/result.html", {
+        "attempt": attempt,
+        "answers": result_rows(key, attempt_layout(attempt, key), stored),
+    })
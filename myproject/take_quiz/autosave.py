@@ -0,0 +1,65 @@
+"""
+Autosave of in-progress answers.
+
+The take page collects answer changes for ``TAKEQ_AUTOSAVE_FLUSH_SECONDS``
+(and when the page is hidden) and posts them as one delta, keyed like
+the submit form (``question_<id>``), so repeated edits of the same
+question collapse into one value before they reach the server. Each
+delta is written through to ``Answer`` rows with one batched upsert:
+the database is the only copy, so a submit handled by another worker
+and the expiry sweeper see every autosaved answer.
+"""
+from django.conf import settings
+
+from myapp.answer_key import get_answer_key
+from myapp.layout import attempt_layout
+from myapp.live import publish_on_commit, quiz_channel
+from .grading import parse_answers, save_answers, MAX_TEXT_LENGTH
+
+
+def flush_interval():
+    return getattr(settings, "TAKEQ_AUTOSAVE_FLUSH_SECONDS", 15)
+
+
+def clean_deltas(layout, deltas):
+    """Keep deltas for questions of the attempt's layout, as ``question_<id>`` -> str."""
+    valid = set(layout.question_ids)
+    cleaned = {}
+    for raw_qid, value in deltas.items():
+        try:
+            qid = int(str(raw_qid).removeprefix("question_"))
+        except ValueError:
+            continue
+        if qid in valid and value is not None:
+            cleaned[f"question_{qid}"] = str(value)[:MAX_TEXT_LENGTH]
+    return cleaned
+
+
+def record(attempt, deltas):
+    """
+    Save ``deltas`` to the attempt's answers and announce the answered
+    questions to live monitors. Returns the number of answers written.
+    """
+    key = get_answer_key(attempt.quiz)
+    layout = attempt_layout(attempt, key)
+    cleaned = clean_deltas(layout, deltas)
+    if not cleaned:
+        return 0
+    rows = parse_answers(key, layout, cleaned)
+    save_answers([(attempt, rows)])
+    publish_on_commit(quiz_channel(attempt.quiz_id), {
+        "type": "progress", "attempt": attempt.pk, "quiz": attempt.quiz_id, "taker": attempt.taker_id,
+        "answered": sorted(int(k.removeprefix("question_")) for k in cleaned),
+    })
+    return len(rows)
+
+
+def saved_answers(attempt):
+    """
+    Answers saved so far for an open attempt, as ``question_<id>`` -> str,
+    for pre-filling the take page. One query.
+    """
+    return {
+        f"question_{qid}": str(choice_id) if choice_id else text
+        for qid, choice_id, text in attempt.answers.values_list("question_id", "selected_choice_id", "text")
+    }
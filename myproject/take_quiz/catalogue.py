@@ -0,0 +1,75 @@
+"""
+The student-facing quiz catalogue (``QuizListView``).
+
+Only published quizzes assigned to one of the user's rooms are listed.
+Pages are cut with a keyset cursor on ``(created_at, id)`` instead of
+OFFSET, so every page is a bounded range scan of
+``quiz_published_created_idx``. The creator's username and the question
+count are fetched in the same query.
+"""
+import base64
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef, Q
+
+from myapp.dashboard import subquery_count
+from myapp.models import Quiz, Question
+
+
+def page_size():
+    return getattr(settings, "TAKEQ_CATALOGUE_PAGE_SIZE", 20)
+
+
+def encode_cursor(quiz):
+    raw = f"{quiz.created_at.isoformat()}|{quiz.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return ``(created_at, id)`` or None for a missing/malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def catalogue_queryset(user):
+    RoomQuizAssignment = apps.get_model('room', 'RoomQuizAssignment')
+    assigned = RoomQuizAssignment.objects.filter(quiz=OuterRef("pk"), room__memberships__user=user)
+    return (
+        Quiz.objects.filter(is_published=True)
+        .filter(Exists(assigned))
+        .annotate(
+            creator_name=F("creator__username"),
+            question_count=subquery_count(Question.objects.filter(quiz=OuterRef("pk")), "quiz"),
+        )
+        .order_by("-created_at", "-id")
+    )
+
+
+@dataclass
+class CataloguePage:
+    quizzes: list
+    next_cursor: str = None
+
+
+def catalogue_page(user, cursor=None, size=None):
+    """One page of the catalogue, newest first, starting after ``cursor``."""
+    size = size or page_size()
+    qs = catalogue_queryset(user)
+    after = decode_cursor(cursor)
+    if after:
+        created_at, pk = after
+        qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    quizzes = list(qs[:size + 1])
+    if len(quizzes) > size:
+        quizzes = quizzes[:size]
+        return CataloguePage(quizzes, encode_cursor(quizzes[-1]))
+    return CataloguePage(quizzes)
@@ -0,0 +1,70 @@
+"""
+Server-side enforcement of ``Quiz.time_limit_minutes``.
+
+Each timed attempt stores its own ``deadline``. Submits that arrive
+within ``TAKEQ_SUBMIT_GRACE_SECONDS`` of it are accepted and clipped to
+the deadline; later ones are closed with whatever was already stored.
+``finalize_expired`` closes abandoned attempts in bulk and is run by the
+``finalize_expired_attempts`` management command.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from myapp.models import Attempt
+from .grading import claim_open, grade_stored
+from .models import QueuedSubmission
+
+
+def grace_period():
+    return timedelta(seconds=getattr(settings, "TAKEQ_SUBMIT_GRACE_SECONDS", 30))
+
+
+def deadline_for(quiz, started_at):
+    if not quiz.time_limit_minutes:
+        return None
+    return started_at + timedelta(minutes=quiz.time_limit_minutes)
+
+
+def is_late(attempt, now):
+    return attempt.deadline is not None and now > attempt.deadline + grace_period()
+
+
+def clip_to_deadline(attempt, when):
+    if attempt.deadline is not None and when > attempt.deadline:
+        return attempt.deadline
+    return when
+
+
+def finalize_expired(batch_size=500, now=None):
+    """
+    Close every open attempt whose deadline (plus grace) has passed.
+
+    Each batch is one SELECT of the attempts, one UPDATE ... RETURNING
+    claiming those still open (``grading.claim_open``), so an attempt
+    submitted in between is not graded again, and a bulk grade of the
+    stored answers (autosaves are already among them) with
+    ``finished_at = deadline``. Attempts with a queued submission are
+    left to the grading worker.
+    Returns the number of attempts closed.
+    """
+    cutoff = (now or timezone.now()) - grace_period()
+    queued = QueuedSubmission.objects.filter(processed_at__isnull=True).values("attempt_id")
+    total = 0
+    while True:
+        with transaction.atomic():
+            expired = list(
+                Attempt.objects.filter(finished_at__isnull=True, deadline__lt=cutoff)
+                .exclude(pk__in=queued)
+                .select_related("quiz")
+                .order_by("deadline")[:batch_size]
+            )
+            if not expired:
+                return total
+            attempts = claim_open(expired)
+            for attempt in attempts:
+                attempt.finished_at = attempt.deadline
+            grade_stored(attempts)
+        total += len(attempts)
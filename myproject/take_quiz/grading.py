@@ -0,0 +1,206 @@
+"""
+Single-pass grading for quiz submissions.
+
+Answers are validated against the quiz's cached answer key
+(``myapp.answer_key``), short answers are judged by the question's
+accepted-answer rules (``myapp.answer_rules``), and all are written in
+bulk; scores are then computed in memory from the stored answers.
+Every entry point (submit, the queued worker, the expiry sweeper,
+autosave) issues a constant number of queries per call, however many
+questions or attempts are involved.
+"""
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from create_quiz.item_analysis import record_graded
+from myapp import answer_rules
+from myapp.answer_key import get_answer_key
+from myapp.layout import attempt_layout
+from myapp.live import publish_on_commit, quiz_channel
+from myapp.models import Attempt, Answer
+from room.gradebook import record_attempts
+
+MAX_TEXT_LENGTH = 2000
+
+
+def _parse_choice_id(raw):
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_answers(key, layout, data):
+    """
+    Turn submitted form data into answer rows.
+
+    Returns a list of ``(question_id, selected_choice_id, text, is_correct)``
+    tuples, in layout order, for the questions of the attempt's ``layout``
+    that appear in ``data`` (keyed ``question_<id>``). Questions the
+    attempt did not draw and choice ids that do not belong to the
+    question are dropped. ``is_correct`` is the verdict of the accepted
+    answers on a short answer, None otherwise.
+    """
+    matchers = answer_rules.for_key(key)
+    rows = []
+    for i in layout.positions:
+        qid, qtype, valid = key.question_ids[i], key.qtypes[i], key.choice_ids[i]
+        field = f"question_{qid}"
+        if field not in data:
+            continue
+        raw = data.get(field)
+        if qtype == "mcq":
+            choice_id = _parse_choice_id(raw)
+            rows.append((qid, choice_id if choice_id in valid else None, "", None))
+        else:
+            text = (raw or "").strip()[:MAX_TEXT_LENGTH]
+            rows.append((qid, None, text, matchers[i](text) if matchers[i] else None))
+    return rows
+
+
+def save_answers(batch):
+    """
+    Upsert answer rows for several attempts at once.
+
+    ``batch`` is an iterable of ``(attempt, rows)`` as returned by
+    ``parse_answers``. Existing answers to the same questions are
+    replaced through the (attempt, question) unique constraint, so this
+    is a single INSERT ... ON CONFLICT statement.
+    """
+    answers = [
+        Answer(attempt=attempt, question_id=qid, selected_choice_id=choice_id, text=text, is_correct=is_correct)
+        for attempt, rows in batch
+        for qid, choice_id, text, is_correct in rows
+    ]
+    if not answers:
+        return
+    Answer.objects.bulk_create(
+        answers,
+        update_conflicts=True,
+        unique_fields=["attempt", "question"],
+        update_fields=["selected_choice", "text", "is_correct"],
+    )
+
+
+def score_for(correct_count, scored_count):
+    if scored_count > 0:
+        return (correct_count / scored_count) * 100.0
+    return None
+
+
+def score_stored(attempts):
+    """
+    Set ``score`` on ``attempts`` (with ``quiz`` loaded) from their stored
+    answers, read with one query. Returns the selected choices as
+    ``{attempt_id: {question_id: choice_id}}``.
+    """
+    selected, accepted = {}, {}
+    for attempt_id, qid, choice_id, is_correct in Answer.objects.filter(
+        Q(selected_choice__isnull=False) | Q(is_correct=True), attempt__in=attempts,
+    ).values_list("attempt_id", "question_id", "selected_choice_id", "is_correct"):
+        if choice_id is not None:
+            selected.setdefault(attempt_id, {})[qid] = choice_id
+        if is_correct:
+            accepted.setdefault(attempt_id, set()).add(qid)
+
+    for attempt in attempts:
+        key = get_answer_key(attempt.quiz)
+        layout = attempt_layout(attempt, key)
+        chosen = selected.get(attempt.pk, {})
+        right = accepted.get(attempt.pk, ())
+        correct_count = 0
+        for i in layout.positions:
+            qid = key.question_ids[i]
+            if key.qtypes[i] == "mcq":
+                correct = key.correct_choice_ids[i]
+                correct_count += correct is not None and chosen.get(qid) == correct
+            elif key.accepted[i]:
+                # a verdict left from rules since removed does not count
+                correct_count += qid in right
+        attempt.score = score_for(correct_count, layout.scored_count)
+    return selected
+
+
+def grade_stored(attempts):
+    """
+    Score ``attempts`` from the Answer rows stored for them and persist
+    ``finished_at`` and ``score``.
+
+    Reads every answer in one query and writes every attempt with one
+    bulk UPDATE, then folds the results into the room gradebook and
+    the cached item statistics. Live monitors hear of the results once
+    the transaction commits.
+    Attempts must have ``quiz`` loaded (select_related).
+    """
+    attempts = list(attempts)
+    if not attempts:
+        return attempts
+
+    selected = score_stored(attempts)
+    Attempt.objects.bulk_update(attempts, ["finished_at", "score"])
+    record_attempts(attempts)
+    record_graded(attempts, selected)
+    _announce(attempts)
+    return attempts
+
+
+def _announce(attempts):
+    for attempt in attempts:
+        publish_on_commit(quiz_channel(attempt.quiz_id), {
+            "type": "submitted", "attempt": attempt.pk, "quiz": attempt.quiz_id, "taker": attempt.taker_id,
+            "finished_at": attempt.finished_at, "score": attempt.score,
+        })
+
+
+CLAIM_SQL = "UPDATE {table} SET finished_at = %s WHERE id IN ({ids}) AND finished_at IS NULL RETURNING id"
+
+
+def claim_open(attempts):
+    """
+    Close those of ``attempts`` that are still open with one
+    UPDATE ... RETURNING and return them. An attempt that a concurrent
+    submit, the grading worker or the expiry sweeper closed first is
+    left out, so no attempt is graded (and counted in the gradebook)
+    twice. The caller sets the real ``finished_at`` when grading; must
+    be called inside a transaction.
+    """
+    attempts = list(attempts)
+    if not attempts:
+        return attempts
+    sql = CLAIM_SQL.format(
+        table=connection.ops.quote_name(Attempt._meta.db_table), ids=", ".join(["%s"] * len(attempts))
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [connection.ops.adapt_datetimefield_value(timezone.now())] + [a.pk for a in attempts])
+        claimed = {pk for pk, in cursor.fetchall()}
+    return [a for a in attempts if a.pk in claimed]
+
+
+def finalize_attempts(entries):
+    """
+    Store the final answers of several attempts and grade them.
+
+    ``entries`` is an iterable of ``(attempt, data, finished_at)`` where
+    ``data`` maps ``question_<id>`` to the submitted value. Answers saved
+    earlier (autosave) are kept unless ``data`` overrides them. Attempts
+    closed meanwhile by someone else are skipped (``claim_open``).
+    Returns the attempts graded. Must be called inside a transaction.
+    """
+    entries = list(entries)
+    claimed = {a.pk for a in claim_open(attempt for attempt, _, _ in entries)}
+    attempts, batch = [], []
+    for attempt, data, finished_at in entries:
+        if attempt.pk not in claimed:
+            continue
+        attempt.finished_at = finished_at or timezone.now()
+        attempts.append(attempt)
+        key = get_answer_key(attempt.quiz)
+        batch.append((attempt, parse_answers(key, attempt_layout(attempt, key), data)))
+    save_answers(batch)
+    return grade_stored(attempts)
+
+
+def finalize_attempt(attempt, data, finished_at=None):
+    finalize_attempts([(attempt, data, finished_at)])
+    return attempt
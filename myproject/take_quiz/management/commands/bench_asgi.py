@@ -0,0 +1,137 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.urls import reverse
+
+from myapp.benchmarking import asgi_call, scratch_database, summarize, timer, wsgi_call
+from myapp.models import Quiz, Question, Choice, Attempt
+
+User = get_user_model()
+
+CSRF_SECRET = "b" * 32
+
+
+class Command(BaseCommand):
+    help = (
+        "Side-by-side load test of concurrent submit_quiz POSTs: the WSGI "
+        "application with sync views on a fixed number of sync workers, against "
+        "the ASGI application with the async views on one event loop. Each side "
+        "runs in its own process, as it would be deployed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=300, help="Submits fired at once.")
+        parser.add_argument("--questions", type=int, default=40)
+        parser.add_argument("--workers", type=int, default=4, help="Sync workers of the WSGI side.")
+        parser.add_argument(
+            "--db-latency-ms", type=float, default=2.0,
+            help="Added to every query, to model a database across the network.",
+        )
+        parser.add_argument("--side", choices=("wsgi", "asgi"), help="Run one side only (used internally).")
+
+    def handle(self, *args, **options):
+        if options["side"]:
+            with scratch_database():
+                self._run(options)
+            return
+        argv = [
+            sys.executable, sys.argv[0], "bench_asgi",
+            "--students", str(options["students"]), "--questions", str(options["questions"]),
+            "--workers", str(options["workers"]), "--db-latency-ms", str(options["db_latency_ms"]),
+        ]
+        for side in ("wsgi", "asgi"):
+            env = {**os.environ, "TAKEQ_ASYNC_VIEWS": "1" if side == "asgi" else "0"}
+            result = subprocess.run(argv + ["--side", side], env=env, capture_output=True, text=True)
+            self.stdout.write(result.stdout.rstrip())
+            if result.returncode:
+                self.stderr.write(result.stderr)
+
+    def _seed(self, n_students, n_questions):
+        teacher = User.objects.create(username="bench-teacher")
+        quiz = Quiz.objects.create(title="Burst", creator=teacher, is_published=True)
+        questions = Question.objects.bulk_create([
+            Question(quiz=quiz, text=f"Q{i}", qtype="mcq", order=i + 1) for i in range(n_questions)
+        ])
+        choices = Choice.objects.bulk_create([
+            Choice(question=q, text=str(k), is_correct=(k == 0)) for q in questions for k in range(4)
+        ])
+        payload = {f"question_{c.question_id}": str(c.id) for c in choices if c.is_correct}
+        payload["csrfmiddlewaretoken"] = CSRF_SECRET
+        students = User.objects.bulk_create([User(username=f"bench-{i}") for i in range(n_students)])
+        attempts = Attempt.objects.bulk_create([Attempt(quiz=quiz, taker=u) for u in students])
+        requests = []
+        for user, attempt in zip(students, attempts):
+            client = Client()
+            client.force_login(user)
+            requests.append((reverse("take_quiz:submit_quiz", args=[attempt.id]), {
+                "Cookie": f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}; "
+                          f"{settings.CSRF_COOKIE_NAME}={CSRF_SECRET}",
+                "Content-Type": "application/x-www-form-urlencoded",
+            }))
+        return urlencode(payload).encode(), requests
+
+    def _run(self, options):
+        side = options["side"]
+        body, requests = self._seed(options["students"], options["questions"])
+        connections.close_all()
+
+        delay = options["db_latency_ms"] / 1000.0
+
+        def slow_execute(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            # fires on every reconnect of the same (per-thread) wrapper
+            if slow_execute not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_execute)
+
+        if delay:
+            connection_created.connect(add_latency)
+
+        if side == "wsgi":
+            from myproject.wsgi import application
+
+            def submit(item, start):
+                status, _ = wsgi_call(application, "POST", item[0], body, item[1])
+                return time.perf_counter() - start, status
+
+            with timer() as wall:
+                # latency includes the wait for a free worker, as behind gunicorn
+                with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+                    start = time.perf_counter()
+                    results = list(pool.map(lambda item: submit(item, start), requests))
+            label = f"WSGI sync, {options['workers']} workers"
+        else:
+            from myproject.asgi import application
+
+            async def submit(item, start):
+                status, _ = await asgi_call(application, "POST", item[0], body, item[1])
+                return time.perf_counter() - start, status
+
+            async def burst():
+                start = time.perf_counter()
+                return await asyncio.gather(*(submit(item, start) for item in requests))
+
+            with timer() as wall:
+                results = asyncio.run(burst())
+            label = "ASGI async, 1 event loop"
+
+        graded = Attempt.objects.filter(finished_at__isnull=False).count()
+        failures = sum(1 for _, status in results if status != 302)
+        self.stdout.write(summarize(f"{label}: submit", [r[0] for r in results]))
+        self.stdout.write(
+            f"  {len(results) / wall['seconds']:.0f} submits/s over {wall['seconds']:.2f}s; "
+            f"{graded} graded, {failures} non-redirect responses"
+        )
@@ -0,0 +1,97 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from myapp.benchmarking import scratch_database, timer
+from myapp.models import Quiz, Question, Choice, Attempt
+from take_quiz import autosave
+from take_quiz.grading import finalize_attempt
+
+User = get_user_model()
+
+WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE")
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure database write amplification of autosave: write statements "
+        "per attempt versus one write per answer change."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--attempts", type=int, default=50)
+        parser.add_argument("--questions", type=int, default=40)
+        parser.add_argument("--edits", type=int, default=5, help="Answer changes per question.")
+        parser.add_argument("--duration", type=float, default=1800.0, help="Simulated exam length in seconds.")
+        parser.add_argument("--flush-seconds", type=float, default=None, help="Override TAKEQ_AUTOSAVE_FLUSH_SECONDS.")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options["flush_seconds"] is not None:
+            with override_settings(TAKEQ_AUTOSAVE_FLUSH_SECONDS=options["flush_seconds"]):
+                return self._run(options)
+        return self._run(options)
+
+    def _run(self, options):
+        rng = random.Random(options["seed"])
+        with scratch_database():
+            teacher = User.objects.create(username="bench-teacher")
+            quiz = Quiz.objects.create(title="Autosave", creator=teacher, is_published=True)
+            questions = Question.objects.bulk_create([
+                Question(quiz=quiz, text=f"Q{i}", qtype="mcq" if i % 4 else "short", order=i + 1)
+                for i in range(options["questions"])
+            ])
+            choices = Choice.objects.bulk_create([
+                Choice(question=q, text=str(k), is_correct=(k == 0))
+                for q in questions if q.qtype == "mcq" for k in range(4)
+            ])
+            by_question = {}
+            for c in choices:
+                by_question.setdefault(c.question_id, []).append(c.id)
+            students = User.objects.bulk_create([
+                User(username=f"bench-{i}") for i in range(options["attempts"])
+            ])
+            attempts = Attempt.objects.bulk_create([Attempt(quiz=quiz, taker=u) for u in students])
+            for attempt in attempts:
+                attempt.quiz = quiz
+
+            deltas = options["questions"] * options["edits"]
+            interval = autosave.flush_interval() or 1e-9
+            writes = rows = 0
+            with timer() as elapsed:
+                for attempt in attempts:
+                    # the take page posts the changes of each interval as one delta
+                    batch, batch_window = {}, None
+                    with CaptureQueriesContext(connection) as ctx:
+                        # questions are answered in turn; each gets a short burst of edits
+                        per_question = options["duration"] / len(questions)
+                        for i, q in enumerate(questions):
+                            start = i * per_question
+                            for now in sorted(rng.uniform(start, start + per_question) for _ in range(options["edits"])):
+                                value = rng.choice(by_question[q.id]) if q.qtype == "mcq" else "x" * rng.randint(1, 200)
+                                window = int(now // interval)
+                                if batch and window != batch_window:
+                                    rows += autosave.record(attempt, batch)
+                                    batch = {}
+                                batch_window = window
+                                batch[str(q.id)] = value
+                        if batch:
+                            rows += autosave.record(attempt, batch)
+                        finalize_attempt(attempt, {})
+                    writes += sum(
+                        1 for q in ctx.captured_queries
+                        if q["sql"].lstrip().upper().startswith(WRITE_PREFIXES)
+                    )
+
+        n = options["attempts"]
+        self.stdout.write(
+            f"attempts={n} questions={options['questions']} answer changes/attempt={deltas} "
+            f"flush interval={autosave.flush_interval()}s over {options['duration']:.0f}s"
+        )
+        self.stdout.write(f"naive (one write per change): {deltas} writes/attempt")
+        self.stdout.write(f"coalesced: {writes / n:.1f} write statements/attempt, {rows / n:.1f} rows written/attempt")
+        self.stdout.write(f"write amplification vs naive: {writes / (deltas * n):.3f}x in {elapsed['seconds']:.2f}s")
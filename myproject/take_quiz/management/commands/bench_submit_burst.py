@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from myapp.benchmarking import scratch_database, summarize, timer
+from myapp.models import Quiz, Question, Choice, Attempt
+from take_quiz.queue import process_batch
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate an end-of-exam burst of submit_quiz POSTs and compare "
+        "request latency of the synchronous and queued submit paths."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=200)
+        parser.add_argument("--questions", type=int, default=40)
+        parser.add_argument("--concurrency", type=int, default=16)
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            for label, queued in (("sync", False), ("queued", True)):
+                with override_settings(TAKEQ_QUEUED_SUBMIT=queued):
+                    self._run(label, queued, options)
+
+    def _seed(self, label, n_students, n_questions):
+        teacher = User.objects.create(username=f"bench-teacher-{label}")
+        quiz = Quiz.objects.create(title=f"Burst {label}", creator=teacher, is_published=True)
+        questions = Question.objects.bulk_create([
+            Question(quiz=quiz, text=f"Q{i}", qtype="mcq", order=i + 1) for i in range(n_questions)
+        ])
+        choices = Choice.objects.bulk_create([
+            Choice(question=q, text=str(k), is_correct=(k == 0)) for q in questions for k in range(4)
+        ])
+        payload = {f"question_{c.question_id}": str(c.id) for c in choices if c.is_correct}
+        students = User.objects.bulk_create([
+            User(username=f"bench-{label}-{i}") for i in range(n_students)
+        ])
+        attempts = Attempt.objects.bulk_create([Attempt(quiz=quiz, taker=u) for u in students])
+        return payload, list(zip(students, attempts))
+
+    def _run(self, label, queued, options):
+        payload, pairs = self._seed(label, options["students"], options["questions"])
+        clients = []
+        for user, attempt in pairs:
+            client = Client()
+            client.force_login(user)
+            clients.append((client, reverse("take_quiz:submit_quiz", args=[attempt.id])))
+
+        def submit(item):
+            client, url = item
+            start = time.perf_counter()
+            resp = client.post(url, payload)
+            elapsed = time.perf_counter() - start
+            connections.close_all()
+            return elapsed, resp.status_code
+
+        with timer() as wall:
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+                results = list(pool.map(submit, clients))
+
+        failures = sum(1 for _, status in results if status != 302)
+        self.stdout.write(summarize(f"{label:>6} submit", [r[0] for r in results]))
+        self.stdout.write(f"{label:>6} burst wall time: {wall['seconds']:.2f}s, non-redirect responses: {failures}")
+
+        if queued:
+            with timer() as drain:
+                graded = 0
+                while True:
+                    done = process_batch(200)
+                    if not done:
+                        break
+                    graded += done
+            self.stdout.write(f"{label:>6} worker drained {graded} submissions in {drain['seconds']:.2f}s")
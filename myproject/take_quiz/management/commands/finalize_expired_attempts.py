@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from take_quiz.deadlines import finalize_expired
+
+
+class Command(BaseCommand):
+    help = "Close and grade open attempts whose time limit has run out. Run periodically (e.g. from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        closed = finalize_expired(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Closed {closed} expired attempt(s)."))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from take_quiz.queue import process_batch
+
+
+class Command(BaseCommand):
+    help = "Grade and persist submissions accepted in queued submit mode."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument(
+            "--loop", action="store_true",
+            help="Keep polling the queue instead of exiting once it is empty.",
+        )
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to sleep when idle (with --loop).")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            done = process_batch(options["batch_size"])
+            total += done
+            if done:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Graded {total} queued submission(s)."))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.models import Question
+from take_quiz.regrade import regrade_question
+
+
+class Command(BaseCommand):
+    help = (
+        "Judge the stored answers of short questions again with their current "
+        "accepted answers, and rescore the finished attempts of their quizzes. "
+        "Run periodically (e.g. from cron) with --pending for the questions whose "
+        "backlog was too large to regrade when they were edited."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("questions", nargs="*", type=int, help="Question ids.")
+        parser.add_argument("--quiz", type=int, action="append", default=[], help="Every short question of this quiz.")
+        parser.add_argument("--pending", action="store_true", help="Every question flagged for regrading.")
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="Processes judging large backlogs (default: one per CPU; 0 to stay in one process).",
+        )
+
+    def handle(self, *args, **options):
+        if not options["questions"] and not options["quiz"] and not options["pending"]:
+            raise CommandError("Give question ids, --quiz or --pending.")
+        questions = list(
+            Question.objects.filter(pk__in=options["questions"]).order_by("pk")
+        )
+        if len(questions) != len(set(options["questions"])):
+            raise CommandError("Unknown question id(s).")
+        questions += Question.objects.filter(quiz_id__in=options["quiz"], qtype="short").order_by("pk")
+        if options["pending"]:
+            questions += Question.objects.filter(needs_regrade=True).order_by("pk")
+        questions = list({q.pk: q for q in questions}.values())
+        for question in questions:
+            start = time.perf_counter()
+            result = regrade_question(question, workers=options["workers"])
+            self.stdout.write(
+                f"Question {question.pk}: {result.answers} answer(s), {result.changed} verdict(s) changed, "
+                f"{result.rescored} score(s) changed in {time.perf_counter() - start:.2f}s"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Regraded {len(questions)} question(s)."))
@@ -1,3 +1,31 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+from myapp.models import Attempt
+
+
+class QueuedSubmission(models.Model):
+    """
+    Raw answers of a submit accepted in queued mode, waiting to be graded
+    by the ``grade_submissions`` worker.
+    """
+    attempt = models.OneToOneField(
+        Attempt,
+        on_delete=models.CASCADE,
+        related_name="queued_submission",
+    )
+    answers = models.JSONField(default=dict)
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                name="queuedsub_pending_idx",
+                condition=models.Q(processed_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"Queued submission for attempt {self.attempt_id}"
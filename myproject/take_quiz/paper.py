@@ -0,0 +1,70 @@
+"""
+Rendered quiz-paper fragment cache.
+
+The markup of each question and of each choice is the same for every
+taker; only their selection, order and numbering differ between
+attempts (``myapp.layout``). So every question is rendered once per
+``Quiz.content_version`` from the answer-key snapshot, as a head (with
+a placeholder for its number), one fragment per choice and a tail, and
+the fragments of a quiz are cached together. A page is then assembled
+by joining strings in the attempt's order. Per-attempt parts of the
+page (form action, CSRF token) stay in ``take_quiz/take_quiz.html``
+around it.
+"""
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from myapp.answer_key import get_answer_key, CACHE_TIMEOUT
+from myapp.layout import attempt_layout
+
+# HTML comments cannot come out of autoescaped question text
+NUMBER = mark_safe("<!--number-->")
+CHOICES = mark_safe("<!--choices-->")
+
+
+def cache_key(quiz_id, version):
+    return f"quiz_paper_fragments:{quiz_id}:{version}"
+
+
+def render_fragments(key):
+    """``{question_id: (head, {choice_id: html}, tail)}`` for the questions of ``key``."""
+    fragments = {}
+    for qid, qtype, text, choice_ids, choice_texts in zip(
+        key.question_ids, key.qtypes, key.question_texts, key.choice_ids, key.choice_texts
+    ):
+        html = render_to_string("take_quiz/_question.html", {
+            "q": {"id": qid, "qtype": qtype, "text": text}, "number": NUMBER, "choices": CHOICES,
+        })
+        head, _, tail = html.partition(CHOICES)
+        choices = {
+            cid: render_to_string("take_quiz/_choice.html", {"question_id": qid, "id": cid, "text": ctext})
+            for cid, ctext in zip(choice_ids, choice_texts)
+        }
+        fragments[qid] = (head, choices, tail)
+    return fragments
+
+
+def get_fragments(quiz):
+    ckey = cache_key(quiz.pk, quiz.content_version)
+    fragments = cache.get(ckey)
+    if fragments is None:
+        fragments = render_fragments(get_answer_key(quiz))
+        cache.set(ckey, fragments, CACHE_TIMEOUT)
+    return fragments
+
+
+def get_paper_html(attempt):
+    """
+    Return the question loop of ``attempt`` (with ``quiz`` loaded), laid
+    out for its seed; two cache reads and no query when warm.
+    """
+    layout = attempt_layout(attempt)
+    fragments = get_fragments(attempt.quiz)
+    parts = []
+    for number, (qid, choice_ids) in enumerate(zip(layout.question_ids, layout.choice_ids), 1):
+        head, choices, tail = fragments[qid]
+        parts.append(head.replace(NUMBER, str(number), 1))
+        parts.extend(choices[cid] for cid in choice_ids)
+        parts.append(tail)
+    return mark_safe("".join(parts))
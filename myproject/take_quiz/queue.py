@@ -0,0 +1,91 @@
+"""
+Queued ("write-behind") submit mode.
+
+When ``TAKEQ_QUEUED_SUBMIT`` is enabled, ``submit_quiz`` only validates
+the payload, stamps ``Attempt.submitted_at`` (after which the take page,
+autosave and submit turn the student away) and stores the raw answers
+as a ``QueuedSubmission`` row. The ``grade_submissions`` management
+command drains the queue in batches using ``grading.finalize_attempts``.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from myapp.layout import attempt_layout
+from myapp.models import Attempt
+from .deadlines import clip_to_deadline
+from .grading import finalize_attempts, MAX_TEXT_LENGTH
+from .models import QueuedSubmission
+
+def queued_submit_enabled():
+    return getattr(settings, "TAKEQ_QUEUED_SUBMIT", False)
+
+
+def clean_payload(layout, data):
+    """
+    Keep only answers to questions of the attempt's layout, truncated to a
+    sane size. A field submitted empty is kept: it clears the answer.
+    """
+    answers = {}
+    for qid in layout.question_ids:
+        field = f"question_{qid}"
+        if field in data:
+            value = data.get(field)
+            answers[field] = "" if value is None else str(value)[:MAX_TEXT_LENGTH]
+    return answers
+
+
+def enqueue_submission(attempt, data):
+    """
+    Lock the attempt and store ``data`` for later grading; autosaved
+    answers are already in ``Answer`` and are kept unless ``data``
+    overrides them. Returns False if the attempt was already submitted.
+    """
+    now = timezone.now()
+    if not Attempt.objects.filter(pk=attempt.pk, finished_at__isnull=True, submitted_at__isnull=True).update(
+        submitted_at=now
+    ):
+        return False
+    attempt.submitted_at = now
+    answers = clean_payload(attempt_layout(attempt), data)
+    created = QueuedSubmission.objects.bulk_create(
+        [QueuedSubmission(attempt=attempt, answers=answers)],
+        ignore_conflicts=True,
+    )
+    return bool(created)
+
+
+def is_pending(attempt):
+    return QueuedSubmission.objects.filter(attempt=attempt, processed_at__isnull=True).exists()
+
+
+async def ais_pending(attempt):
+    return await QueuedSubmission.objects.filter(attempt=attempt, processed_at__isnull=True).aexists()
+
+
+def process_batch(batch_size=200):
+    """
+    Grade and persist up to ``batch_size`` queued submissions.
+
+    Returns the number of submissions processed.
+    """
+    with transaction.atomic():
+        batch = list(
+            QueuedSubmission.objects.select_for_update(skip_locked=True, of=("self",))
+            .filter(processed_at__isnull=True)
+            .select_related("attempt__quiz")
+            .order_by("id")[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        entries = [
+            (sub.attempt, sub.answers, clip_to_deadline(sub.attempt, sub.received_at))
+            for sub in batch
+            if sub.attempt.finished_at is None
+        ]
+        finalize_attempts(entries)
+        QueuedSubmission.objects.filter(pk__in=[sub.pk for sub in batch]).update(
+            processed_at=timezone.now()
+        )
+    return len(batch)
@@ -0,0 +1,147 @@
+"""
+Batch regrade of stored short answers.
+
+When the accepted answers of a question change, ``regrade_question``
+streams every stored answer of it, judges the texts again with the
+current rules and writes the verdicts that changed with ``bulk_update``.
+Backlogs of ``POOL_THRESHOLD`` answers or more are judged in a process
+pool (``myapp.answer_rules.grade_texts`` needs no Django) while the
+next chunks are read. The finished attempts of the quiz are then
+rescored in keyset batches, only changed scores are written, and the
+gradebooks of the rooms the quiz is assigned to are rebuilt, which
+also drops their cached leaderboards. Item statistics only cover MCQs
+and are left alone.
+
+An edit in the question form regrades inline (``regrade_or_defer``)
+only below ``POOL_THRESHOLD`` answers; larger backlogs are flagged
+``Question.needs_regrade`` for ``regrade_short_answers --pending``.
+"""
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+from django.db import transaction
+
+from myapp.answer_key import get_answer_key
+from myapp.answer_rules import grade_texts
+from myapp.models import Answer, Attempt, Question, Quiz
+from room import gradebook
+from room.models import RoomQuizAssignment
+from .grading import score_stored
+
+CHUNK_SIZE = 2000
+# judging takes ~13us an answer in one process and spawning a pool ~0.5s,
+# so below this many answers a pool costs more to start than it saves
+POOL_THRESHOLD = 50000
+WRITE_BATCH_SIZE = 500
+
+
+class RegradeResult(NamedTuple):
+    answers: int
+    changed: int
+    rescored: int
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _judge(rules, chunks, workers):
+    """Yield ``(chunk, verdicts)`` for chunks of ``(pk, text, is_correct)`` rows."""
+    if workers <= 1:
+        for chunk in chunks:
+            yield chunk, grade_texts(rules, [text for _, text, _ in chunk])
+        return
+    # spawned workers start clean: no Django, no inherited database connections
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, pool.submit(grade_texts, rules, [text for _, text, _ in chunk])))
+            if len(pending) >= 2 * workers:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+
+
+def regrade_question(question, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Judge every stored answer of ``question`` with its current accepted
+    answers and rescore the quiz's finished attempts. ``workers`` is the
+    pool size for large backlogs (default: one per CPU; 0 or 1 judges
+    in this process).
+    """
+    # cleared first, so an edit made while this runs flags it again
+    Question.objects.filter(pk=question.pk, needs_regrade=True).update(needs_regrade=False)
+    # read afresh: the caller may just have bumped the content version
+    quiz = Quiz.objects.get(pk=question.quiz_id)
+    key = get_answer_key(quiz)
+    rules = key.accepted[key.index_of(question.pk)]
+    answers = Answer.objects.filter(question_id=question.pk)
+    total = answers.count()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if total < POOL_THRESHOLD:
+        workers = 0
+
+    changed = []
+    rows = answers.order_by().values_list("pk", "text", "is_correct").iterator(chunk_size=chunk_size)
+    for chunk, verdicts in _judge(rules, _chunks(rows, chunk_size), workers):
+        changed.extend(
+            Answer(pk=pk, is_correct=verdict)
+            for (pk, _, old), verdict in zip(chunk, verdicts)
+            if verdict != old
+        )
+    with transaction.atomic():
+        Answer.objects.bulk_update(changed, ["is_correct"], batch_size=WRITE_BATCH_SIZE)
+        rescored = rescore_quiz(quiz)
+    return RegradeResult(total, len(changed), rescored)
+
+
+def regrade_or_defer(question):
+    """
+    Regrade ``question`` in this process when its backlog is below
+    ``POOL_THRESHOLD``; otherwise flag it for ``regrade_short_answers
+    --pending``. Returns the ``RegradeResult``, or None when deferred.
+    """
+    if Answer.objects.filter(question_id=question.pk).count() >= POOL_THRESHOLD:
+        Question.objects.filter(pk=question.pk).update(needs_regrade=True)
+        return None
+    return regrade_question(question, workers=0)
+
+
+def rescore_quiz(quiz, batch_size=WRITE_BATCH_SIZE):
+    """
+    Recompute the scores of ``quiz``'s finished attempts from their
+    stored answers. Returns the number of scores that changed.
+    """
+    rescored, last = 0, 0
+    while True:
+        attempts = list(
+            Attempt.objects.filter(quiz=quiz, finished_at__isnull=False, pk__gt=last).order_by("pk")[:batch_size]
+        )
+        if not attempts:
+            break
+        before = {}
+        for attempt in attempts:
+            attempt.quiz = quiz
+            before[attempt.pk] = attempt.score
+        score_stored(attempts)
+        moved = [a for a in attempts if a.score != before[a.pk]]
+        Attempt.objects.bulk_update(moved, ["score"])
+        rescored += len(moved)
+        last = attempts[-1].pk
+    if rescored:
+        gradebook.rebuild(RoomQuizAssignment.objects.filter(quiz=quiz).values_list("room_id", flat=True))
+    return rescored
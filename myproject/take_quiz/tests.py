@@ -1,14 +1,20 @@
-from django.test import TestCase, Client
+from django.http import Http404
+from django.test import AsyncRequestFactory, TestCase, Client, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from django.core.cache import cache
+import json
 
-from myapp.models import Quiz, Question, Choice, Attempt, Answer
+from myapp.models import AcceptedAnswer, Quiz, Question, Choice, Attempt, Answer
+from room.models import GradebookEntry, Room, RoomMembership, RoomQuizAssignment
+from take_quiz import async_views
 
 User = get_user_model()
 
 class TakeQuizFlowTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.teacher = User.objects.create_user(username="teacher", password="teachpw")
         self.student = User.objects.create_user(username="student", password="studpw")
         self.other_student = User.objects.create_user(username="other", password="otherpw")
@@ -26,6 +32,11 @@ class TakeQuizFlowTests(TestCase):
 
         self.q_short = Question.objects.create(quiz=self.quiz, text="Explain 2+2", qtype="short", order=2)
 
+        # the catalogue only lists quizzes assigned to one of the student's rooms
+        room = Room.objects.create(name="Class", owner=self.teacher)
+        RoomMembership.objects.create(room=room, user=self.student, role=RoomMembership.ROLE_STUDENT)
+        RoomQuizAssignment.objects.create(room=room, quiz=self.quiz, assigned_by=self.teacher)
+
         self.client = Client()
 
     def test_happy_path_start_take_submit_and_result(self):
@@ -118,3 +129,684 @@ class TakeQuizFlowTests(TestCase):
             f"question_{self.q_short.id}": "answer"
         })
         self.assertEqual(r_other.status_code, 404)
+
+
+class SubmitQueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher", password="teachpw")
+        self.student = User.objects.create_user(username="student", password="studpw")
+        self.client.login(username="student", password="studpw")
+
+    def _make_quiz(self, n_questions):
+        quiz = Quiz.objects.create(title=f"Quiz {n_questions}", creator=self.teacher, is_published=True)
+        post = {}
+        for i in range(n_questions):
+            q = Question.objects.create(quiz=quiz, text=f"Q{i}", qtype="mcq", order=i + 1)
+            Choice.objects.create(question=q, text="wrong", is_correct=False)
+            right = Choice.objects.create(question=q, text="right", is_correct=True)
+            post[f"question_{q.id}"] = str(right.id)
+        return quiz, post
+
+    def _submit_queries(self, n_questions):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        quiz, post = self._make_quiz(n_questions)
+        attempt = Attempt.objects.create(quiz=quiz, taker=self.student)
+        url = reverse("take_quiz:submit_quiz", args=[attempt.id])
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(url, post)
+        self.assertEqual(resp.status_code, 302)
+        attempt.refresh_from_db()
+        self.assertAlmostEqual(attempt.score, 100.0, places=3)
+        self.assertEqual(attempt.answers.count(), n_questions)
+        return len(ctx.captured_queries)
+
+    def test_query_count_independent_of_question_count(self):
+        self.assertEqual(self._submit_queries(2), self._submit_queries(25))
+
+
+class AnswerKeySnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher", password="teachpw")
+        self.quiz = Quiz.objects.create(title="Snap", creator=self.teacher, is_published=True)
+        self.q = Question.objects.create(quiz=self.quiz, text="Pick", qtype="mcq", order=1)
+        self.a = Choice.objects.create(question=self.q, text="A", is_correct=True)
+        self.b = Choice.objects.create(question=self.q, text="B", is_correct=False)
+
+    def test_snapshot_is_cached_and_invalidated_on_change(self):
+        from myapp.answer_key import get_answer_key
+
+        self.quiz.refresh_from_db()
+        key = get_answer_key(self.quiz)
+        self.assertEqual(key.question_ids, (self.q.id,))
+        self.assertEqual(key.correct_choice_ids, (self.a.id,))
+        self.assertEqual(key.choice_ids, ((self.a.id, self.b.id),))
+        with self.assertNumQueries(0):
+            get_answer_key(self.quiz)
+
+        version = self.quiz.content_version
+        self.a.is_correct = False
+        self.a.save()
+        self.b.is_correct = True
+        self.b.save()
+        self.quiz.refresh_from_db()
+        self.assertGreater(self.quiz.content_version, version)
+        self.assertEqual(get_answer_key(self.quiz).correct_choice_ids, (self.b.id,))
+
+
+    def test_deletes_invalidate_the_snapshot(self):
+        from myapp.answer_key import get_answer_key
+
+        other = Question.objects.create(quiz=self.quiz, text="Gone", qtype="mcq", order=2)
+        Choice.objects.create(question=other, text="X", is_correct=True)
+        self.quiz.refresh_from_db()
+        self.assertEqual(len(get_answer_key(self.quiz).question_ids), 2)
+
+        other.delete()
+        self.quiz.refresh_from_db()
+        self.assertEqual(get_answer_key(self.quiz).question_ids, (self.q.id,))
+        self.b.delete()
+        self.quiz.refresh_from_db()
+        self.assertEqual(get_answer_key(self.quiz).choice_ids, ((self.a.id,),))
+
+        # a full marks submit scores 100 once the deleted question is gone
+        student = User.objects.create_user(username="student", password="studpw")
+        attempt = Attempt.objects.create(quiz=self.quiz, taker=student)
+        self.client.force_login(student)
+        self.client.post(reverse("take_quiz:submit_quiz", args=[attempt.id]), {f"question_{self.q.id}": str(self.a.id)})
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.score, 100.0)
+
+class PaperCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher", password="teachpw")
+        self.student = User.objects.create_user(username="student", password="studpw")
+        self.quiz = Quiz.objects.create(title="Paper", creator=self.teacher, is_published=True)
+        for i in range(5):
+            q = Question.objects.create(quiz=self.quiz, text=f"Paper Q{i}", qtype="mcq", order=i + 1)
+            Choice.objects.create(question=q, text="yes", is_correct=True)
+            Choice.objects.create(question=q, text="no", is_correct=False)
+        self.client.login(username="student", password="studpw")
+
+    @override_settings(TAKEQ_SHARED_CACHE=True)  # warm invite badge
+    def test_warm_paper_skips_question_queries(self):
+        a1 = Attempt.objects.create(quiz=self.quiz, taker=self.student)
+        a2 = Attempt.objects.create(quiz=self.quiz, taker=self.student)
+        r1 = self.client.get(reverse("take_quiz:take_quiz", args=[self.quiz.id, a1.id]))
+        self.assertContains(r1, "Paper Q4")
+        self.assertContains(r1, reverse("take_quiz:submit_quiz", args=[a1.id]))
+
+        # session, user, attempt+quiz, saved answers
+        with self.assertNumQueries(4):
+            r2 = self.client.get(reverse("take_quiz:take_quiz", args=[self.quiz.id, a2.id]))
+        self.assertContains(r2, "Paper Q4")
+        self.assertContains(r2, reverse("take_quiz:submit_quiz", args=[a2.id]))
+
+    def test_paper_invalidated_on_question_change(self):
+        attempt = Attempt.objects.create(quiz=self.quiz, taker=self.student)
+        url = reverse("take_quiz:take_quiz", args=[self.quiz.id, attempt.id])
+        self.client.get(url)
+        Question.objects.create(quiz=self.quiz, text="Brand new question", qtype="short", order=99)
+        self.assertContains(self.client.get(url), "Brand new question")
+
+
+class QueuedSubmitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher", password="teachpw")
+        self.student = User.objects.create_user(username="student", password="studpw")
+        self.quiz = Quiz.objects.create(title="Queued", creator=self.teacher, is_published=True)
+        self.q = Question.objects.create(quiz=self.quiz, text="1 + 1 = ?", qtype="mcq", order=1)
+        self.right = Choice.objects.create(question=self.q, text="2", is_correct=True)
+        Choice.objects.create(question=self.q, text="3", is_correct=False)
+        self.client.login(username="student", password="studpw")
+
+    @override_settings(TAKEQ_QUEUED_SUBMIT=True)
+    def test_queued_submit_is_graded_by_worker(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from take_quiz.models import QueuedSubmission
+
+        attempt = Attempt.objects.create(quiz=self.quiz, taker=self.student)
+        resp = self.client.post(
+            reverse("take_quiz:submit_quiz", args=[attempt.id]),
+            {f"question_{self.q.id}": str(self.right.id), "question_999999": "ignored"},
+        )
+        self.assertEqual(resp.status_code, 302)
+        attempt.refresh_from_db()
+        self.assertIsNone(attempt.finished_at)
+        self.assertEqual(
+            QueuedSubmission.objects.get(attempt=attempt).answers,
+            {f"question_{self.q.id}": str(self.right.id)},
+        )
+        self.assertContains(self.client.get(resp.url), "Grading")
+
+        call_command("grade_submissions", stdout=StringIO())
+        attempt.refresh_from_db()
+        self.assertIsNotNone(attempt.finished_at)
+        self.assertAlmostEqual(attempt.score, 100.0, places=3)
+        self.assertContains(self.client.get(resp.url), "Score")
+
+
+    @override_settings(TAKEQ_QUEUED_SUBMIT=True)
+    def test_queued_submit_clears_emptied_answers_and_locks_the_attempt(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from take_quiz.models import QueuedSubmission
+
+        short = Question.objects.create(quiz=self.quiz, text="Say hi", qtype="short", order=2)
+        attempt = Attempt.objects.create(quiz=self.quiz, taker=self.student)
+        autosave = reverse("take_quiz:autosave", args=[attempt.id])
+        self.client.post(autosave, data=json.dumps({"answers": {str(short.id): "draft"}}),
+                         content_type="application/json")
+
+        # the student empties the text box before submitting
+        submit = reverse("take_quiz:submit_quiz", args=[attempt.id])
+        resp = self.client.post(submit, {f"question_{self.q.id}": str(self.right.id), f"question_{short.id}": ""})
+        self.assertEqual(QueuedSubmission.objects.get(attempt=attempt).answers[f"question_{short.id}"], "")
+
+        # waiting for the worker: no more edits
+        take = reverse("take_quiz:take_quiz", args=[self.quiz.id, attempt.id])
+        self.assertRedirects(self.client.get(take), resp.url, fetch_redirect_response=False)
+        late = self.client.post(autosave, data=json.dumps({"answers": {str(short.id): "again"}}),
+                                content_type="application/json")
+        self.assertEqual(late.status_code, 409)
+        self.assertRedirects(self.client.post(submit, {f"question_{short.id}": "again"}), resp.url,
+                             fetch_redirect_response=False)
+        self.assertEqual(QueuedSubmission.objects.count(), 1)
+
+        call_command("grade_submissions", stdout=StringIO())
+        self.assertEqual(attempt.answers.get(question=short).text, "")
+
+class DeadlineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher", password="teachpw")
+        self.student = User.objects.create_user(username="student", password="studpw")
+        self.quiz = Quiz.objects.create(
+            title="Timed", creator=self.teacher, is_published=True, time_limit_minutes=10
+        )
+        self.q = Question.objects.create(quiz=self.quiz, text="1 + 1 = ?", qtype="mcq", order=1)
+        self.right = Choice.objects.create(question=self.q, text="2", is_correct=True)
+        Choice.objects.create(question=self.q, text="3", is_correct=False)
+        self.client.login(username="student", password="studpw")
+
+    def _expired_attempt(self, minutes_ago):
+        deadline = timezone.now() - timezone.timedelta(minutes=minutes_ago)
+        return Attempt.objects.create(quiz=self.quiz, taker=self.student, deadline=deadline)
+
+    def test_start_sets_deadline(self):
+        self.client.get(reverse("take_quiz:start_quiz", args=[self.quiz.id]))
+        attempt = Attempt.objects.get(taker=self.student)
+        self.assertAlmostEqual(
+            (attempt.deadline - attempt.started_at).total_seconds(), 600, delta=1
+        )
+
+    def test_late_submit_is_rejected(self):
+        attempt = self._expired_attempt(5)
+        self.client.post(
+            reverse("take_quiz:submit_quiz", args=[attempt.id]),
+            {f"question_{self.q.id}": str(self.right.id)},
+        )
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.finished_at, attempt.deadline)
+        self.assertAlmostEqual(attempt.score, 0.0, places=3)
+        self.assertFalse(attempt.answers.exists())
+
+    def test_sweeper_closes_expired_attempts_only(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        expired = [self._expired_attempt(5) for _ in range(3)]
+        Answer.objects.create(attempt=expired[0], question=self.q, selected_choice=self.right)
+        running = Attempt.objects.create(
+            quiz=self.quiz, taker=self.student, deadline=timezone.now() + timezone.timedelta(minutes=5)
+        )
+
+        call_command("finalize_expired_attempts", stdout=StringIO())
+
+        for attempt in expired:
+            attempt.refresh_from_db()
+            self.assertEqual(attempt.finished_at, attempt.deadline)
+        self.assertAlmostEqual(expired[0].score, 100.0, places=3)
+        self.assertAlmostEqual(expired[1].score, 0.0, places=3)
+        running.refresh_from_db()
+        self.assertIsNone(running.finished_at)
+
+
+    def test_sweeper_skips_attempts_submitted_meanwhile(self):
+        from unittest import mock
+        from take_quiz import deadlines, grading
+
+        expired = [self._expired_attempt(1) for _ in range(2)]
+        submitted = expired[0]
+
+        def submit_first(attempts):
+            # a submit within the grace period lands between the SELECT and the claim
+            grading.finalize_attempt(
+                Attempt.objects.select_related("quiz").get(pk=submitted.pk),
+                {f"question_{self.q.id}": str(self.right.id)}, finished_at=submitted.deadline,
+            )
+            return grading.claim_open(attempts)
+
+        with mock.patch.object(deadlines, "claim_open", side_effect=submit_first), \
+                mock.patch.object(deadlines, "grade_stored", wraps=grading.grade_stored) as graded:
+            self.assertEqual(deadlines.finalize_expired(), 1)
+        self.assertEqual([a.pk for a in graded.call_args_list[0].args[0]], [expired[1].pk])
+        submitted.refresh_from_db()
+        self.assertAlmostEqual(submitted.score, 100.0, places=3)
+
+class AutosaveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher", password="teachpw")
+        self.student = User.objects.create_user(username="student", password="studpw")
+        self.quiz = Quiz.objects.create(title="Autosave", creator=self.teacher, is_published=True)
+        self.q = Question.objects.create(quiz=self.quiz, text="1 + 1 = ?", qtype="mcq", order=1)
+        self.right = Choice.objects.create(question=self.q, text="2", is_correct=True)
+        self.wrong = Choice.objects.create(question=self.q, text="3", is_correct=False)
+        self.q_short = Question.objects.create(quiz=self.quiz, text="Why?", qtype="short", order=2)
+        self.attempt = Attempt.objects.create(quiz=self.quiz, taker=self.student)
+        self.url = reverse("take_quiz:autosave", args=[self.attempt.id])
+        self.client.login(username="student", password="studpw")
+
+    def _autosave(self, answers):
+        return self.client.post(self.url, json.dumps({"answers": answers}), content_type="application/json")
+
+    def test_deltas_are_written_through(self):
+        self._autosave({str(self.q.id): str(self.wrong.id)})
+        resp = self._autosave({str(self.q.id): str(self.right.id), str(self.q_short.id): "draft"})
+        self.assertEqual(resp.json(), {"ok": True, "saved": 2})
+        resp = self._autosave({str(self.q_short.id): "final text", "999999": "x"})
+        self.assertEqual(resp.json(), {"ok": True, "saved": 1})
+        stored = dict(Answer.objects.filter(attempt=self.attempt).values_list("question_id", "selected_choice_id"))
+        self.assertEqual(stored[self.q.id], self.right.id)
+
+        page = self.client.get(reverse("take_quiz:take_quiz", args=[self.quiz.id, self.attempt.id]))
+        self.assertContains(page, "final text")
+
+        # submit without any answers in the POST grades what was stored
+        self.client.post(reverse("take_quiz:submit_quiz", args=[self.attempt.id]), {})
+        self.attempt.refresh_from_db()
+        self.assertAlmostEqual(self.attempt.score, 100.0, places=3)
+        self.assertEqual(self.attempt.answers.get(question=self.q_short).text, "final text")
+
+    def test_autosave_survives_a_cold_cache(self):
+        # another worker or the sweeper process does not share this cache
+        self._autosave({str(self.q.id): str(self.right.id)})
+        cache.clear()
+        self.client.post(reverse("take_quiz:submit_quiz", args=[self.attempt.id]), {})
+        self.attempt.refresh_from_db()
+        self.assertAlmostEqual(self.attempt.score, 100.0, places=3)
+
+    def test_sweeper_grades_autosaved_answers(self):
+        from take_quiz.deadlines import finalize_expired
+
+        self._autosave({str(self.q.id): str(self.right.id)})
+        cache.clear()
+        Attempt.objects.filter(pk=self.attempt.pk).update(deadline=timezone.now() - timezone.timedelta(hours=1))
+        self.assertEqual(finalize_expired(), 1)
+        self.attempt.refresh_from_db()
+        self.assertAlmostEqual(self.attempt.score, 100.0, places=3)
+
+    def test_autosave_rejected_for_closed_attempt(self):
+        self.attempt.finished_at = timezone.now()
+        self.attempt.save()
+        self.assertEqual(self._autosave({str(self.q.id): str(self.right.id)}).status_code, 409)
+
+
+@override_settings(TAKEQ_CATALOGUE_PAGE_SIZE=2)
+class CatalogueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher", password="pw")
+        self.student = User.objects.create_user(username="student", password="pw")
+        self.room = Room.objects.create(name="Class", owner=self.teacher)
+        RoomMembership.objects.create(room=self.room, user=self.student, role=RoomMembership.ROLE_STUDENT)
+        self.quizzes = [
+            Quiz.objects.create(title=f"Quiz {i}", creator=self.teacher, is_published=True) for i in range(5)
+        ]
+        # same created_at for all: the id tie-breaker must keep pages disjoint
+        Quiz.objects.update(created_at=timezone.now())
+        for quiz in self.quizzes:
+            RoomQuizAssignment.objects.create(room=self.room, quiz=quiz, assigned_by=self.teacher)
+        Question.objects.create(quiz=self.quizzes[4], text="q", qtype="short", order=1)
+        self.client.force_login(self.student)
+
+    def test_keyset_pages_cover_assigned_quizzes_once(self):
+        seen, url = [], reverse("take_quiz:quiz_list")
+        while url:
+            r = self.client.get(url)
+            page = r.context["quizzes"]
+            self.assertLessEqual(len(page), 2)
+            seen.extend(q.pk for q in page)
+            cursor = r.context["next_cursor"]
+            url = f"{reverse('take_quiz:quiz_list')}?after={cursor}" if cursor else None
+        self.assertEqual(seen, [q.pk for q in reversed(self.quizzes)])
+
+    @override_settings(TAKEQ_SHARED_CACHE=True)  # warm invite badge
+    def test_rows_carry_creator_and_question_count_in_one_query(self):
+        self.client.get(reverse("take_quiz:quiz_list"))  # warm the invite counter
+        with self.assertNumQueries(3):  # session, user, page
+            r = self.client.get(reverse("take_quiz:quiz_list"))
+        first = r.context["quizzes"][0]
+        self.assertEqual((first.creator_name, first.question_count), ("teacher", 1))
+        self.assertContains(r, "By teacher")
+
+    def test_only_quizzes_of_own_rooms_are_listed(self):
+        other_room = Room.objects.create(name="Other", owner=self.teacher)
+        hidden = Quiz.objects.create(title="Elsewhere", creator=self.teacher, is_published=True)
+        RoomQuizAssignment.objects.create(room=other_room, quiz=hidden, assigned_by=self.teacher)
+        Quiz.objects.create(title="Unassigned", creator=self.teacher, is_published=True)
+        r = self.client.get(reverse("take_quiz:quiz_list"))
+        self.assertNotContains(r, "Elsewhere")
+        self.assertNotContains(r, "Unassigned")
+
+    def test_malformed_cursor_falls_back_to_first_page(self):
+        r = self.client.get(reverse("take_quiz:quiz_list") + "?after=!!bogus")
+        self.assertEqual([q.pk for q in r.context["quizzes"]], [self.quizzes[4].pk, self.quizzes[3].pk])
+
+
+class AsyncViewTests(TestCase):
+    """The async twins of the hot views, called directly (routing depends on TAKEQ_ASYNC_VIEWS)."""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher", password="teachpw")
+        self.student = User.objects.create_user(username="student", password="studpw")
+        self.quiz = Quiz.objects.create(title="Async", creator=self.teacher, is_published=True)
+        self.q = Question.objects.create(quiz=self.quiz, text="2 + 2 = ?", qtype="mcq", order=1)
+        self.right = Choice.objects.create(question=self.q, text="four", is_correct=True)
+        Choice.objects.create(question=self.q, text="five", is_correct=False)
+        self.attempt = Attempt.objects.create(quiz=self.quiz, taker=self.student)
+        self.factory = AsyncRequestFactory()
+
+    def _request(self, method, path, user=None, data=None):
+        request = getattr(self.factory, method)(path, data or {})
+        user = user or self.student
+
+        async def auser():
+            return user
+        request.auser = auser
+        return request
+
+    async def test_take_submit_and_result(self):
+        take = await async_views.take_quiz(self._request("get", "/"), self.quiz.id, self.attempt.id)
+        self.assertEqual(take.status_code, 200)
+        self.assertIn(b"2 + 2 = ?", take.content)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            submit = await async_views.submit_quiz(
+                self._request("post", "/", data={f"question_{self.q.id}": self.right.id}), self.attempt.id
+            )
+        self.assertEqual(submit.url, reverse("take_quiz:attempt_result", args=[self.attempt.id]))
+        attempt = await Attempt.objects.aget(pk=self.attempt.pk)
+        self.assertEqual(attempt.score, 100.0)
+        self.assertIsNotNone(attempt.finished_at)
+
+        result = await async_views.attempt_result(self._request("get", "/"), self.attempt.id)
+        self.assertEqual(result.status_code, 200)
+        self.assertIn(b"four", result.content)
+
+        again = await async_views.take_quiz(self._request("get", "/"), self.quiz.id, self.attempt.id)
+        self.assertEqual(again.url, submit.url)
+
+    async def test_other_users_attempt_is_not_found(self):
+        other = await User.objects.acreate(username="other")
+        with self.assertRaises(Http404):
+            await async_views.attempt_result(self._request("get", "/", user=other), self.attempt.id)
+        with self.assertRaises(Http404):
+            await async_views.submit_quiz(self._request("post", "/", user=other), self.attempt.id)
+
+
+class AttemptLayoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher", password="teachpw")
+        self.student = User.objects.create_user(username="student", password="studpw")
+        self.quiz = Quiz.objects.create(
+            title="Pool", creator=self.teacher, is_published=True,
+            draw_count=4, shuffle_questions=True, shuffle_choices=True,
+        )
+        self.right = {}
+        for i in range(10):
+            q = Question.objects.create(quiz=self.quiz, text=f"Pool Q{i}", qtype="mcq", order=i + 1)
+            self.right[q.id] = Choice.objects.create(question=q, text=f"right {i}", is_correct=True).id
+            for k in range(3):
+                Choice.objects.create(question=q, text=f"wrong {i}.{k}", is_correct=False)
+        self.client.login(username="student", password="studpw")
+
+    def _attempt(self, seed):
+        return Attempt.objects.select_related("quiz").get(
+            pk=Attempt.objects.create(quiz=self.quiz, taker=self.student, seed=seed).pk
+        )
+
+    def test_layout_is_derived_from_the_seed(self):
+        from myapp.answer_key import get_answer_key
+        from myapp.layout import attempt_layout
+
+        key = get_answer_key(self.quiz)
+        a, b = self._attempt(1), self._attempt(2)
+        layout = attempt_layout(a, key)
+        self.assertEqual(len(layout.question_ids), 4)
+        self.assertEqual(layout, attempt_layout(self._attempt(1), key))
+        self.assertNotEqual(layout, attempt_layout(b, key))
+        for qid, choice_ids in zip(layout.question_ids, layout.choice_ids):
+            self.assertCountEqual(choice_ids, key.choice_ids[key.index_of(qid)])
+
+        # a new question can only displace drawn ones; the rest keep their order
+        Question.objects.create(quiz=self.quiz, text="Late addition", qtype="short", order=99)
+        self.quiz.refresh_from_db()
+        a.quiz = self.quiz
+        kept = [qid for qid in attempt_layout(a).question_ids if qid in layout.question_ids]
+        self.assertEqual(kept, [qid for qid in layout.question_ids if qid in kept])
+
+    def test_unshuffled_quiz_keeps_key_order(self):
+        from myapp.layout import attempt_layout
+
+        Quiz.objects.filter(pk=self.quiz.pk).update(draw_count=None, shuffle_questions=False, shuffle_choices=False)
+        attempt = self._attempt(7)
+        layout = attempt_layout(attempt)
+        self.assertEqual(list(layout.question_ids), sorted(self.right))
+        self.assertEqual(layout.scored_count, 10)
+
+    def test_started_attempt_keeps_its_draw(self):
+        from myapp.layout import attempt_layout
+
+        self.client.post(reverse("take_quiz:start_quiz", args=[self.quiz.id]))
+        attempt = Attempt.objects.select_related("quiz").get(quiz=self.quiz, taker=self.student)
+        drawn = attempt_layout(attempt).question_ids
+        self.assertCountEqual(attempt.question_ids, drawn)
+
+        # new questions stay out of started attempts; deleted ones drop out
+        for i in range(10):
+            Question.objects.create(quiz=self.quiz, text=f"Late {i}", qtype="short", order=20 + i)
+        Question.objects.filter(pk=drawn[0]).delete()
+        attempt.quiz.refresh_from_db()
+        self.assertEqual(attempt_layout(attempt).question_ids, drawn[1:])
+
+    @override_settings(TAKEQ_SHARED_CACHE=True)  # warm invite badge
+    def test_take_submit_and_result_follow_the_layout(self):
+        from myapp.layout import attempt_layout
+
+        attempt = self._attempt(12345)
+        layout = attempt_layout(attempt)
+        texts = {q.id: q.text for q in self.quiz.questions.all()}
+        url = reverse("take_quiz:take_quiz", args=[self.quiz.id, attempt.id])
+        self.client.get(url)
+
+        # session, user, attempt+quiz, saved answers: the layout costs no query
+        with self.assertNumQueries(4):
+            page = self.client.get(url).content.decode()
+        positions = [page.index(texts[qid] + "<") for qid in layout.question_ids]
+        self.assertEqual(positions, sorted(positions))
+        for qid in set(texts) - set(layout.question_ids):
+            self.assertNotIn(texts[qid] + "<", page)
+        first = layout.question_ids[0]
+        choice_positions = [page.index(f'id="choice_{cid}"') for cid in layout.choice_ids[0]]
+        self.assertEqual(choice_positions, sorted(choice_positions))
+        self.assertIn(f"Q1. {texts[first]}", page)
+
+        # two right answers out of four drawn; an undrawn question is ignored
+        undrawn = next(qid for qid in self.right if qid not in layout.question_ids)
+        data = {f"question_{qid}": self.right[qid] for qid in layout.question_ids[:2]}
+        data[f"question_{undrawn}"] = self.right[undrawn]
+        self.client.post(reverse("take_quiz:submit_quiz", args=[attempt.id]), data)
+        attempt.refresh_from_db()
+        self.assertAlmostEqual(attempt.score, 50.0)
+        self.assertFalse(attempt.answers.filter(question_id=undrawn).exists())
+
+        result = self.client.get(reverse("take_quiz:attempt_result", args=[attempt.id]))
+        self.assertEqual([row["question_text"] for row in result.context["answers"]],
+                         [texts[qid] for qid in layout.question_ids])
+
+
+class ShortAnswerGradingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user(username="teacher", password="teachpw")
+        self.student = User.objects.create_user(username="student", password="studpw")
+        self.quiz = Quiz.objects.create(title="Rules", creator=self.teacher, is_published=True)
+        self.q_mcq = Question.objects.create(quiz=self.quiz, text="Pick 4", qtype="mcq", order=1)
+        self.right = Choice.objects.create(question=self.q_mcq, text="4", is_correct=True)
+        Choice.objects.create(question=self.q_mcq, text="5", is_correct=False)
+        self.q_short = Question.objects.create(quiz=self.quiz, text="Water in Thai, or pi", qtype="short", order=2)
+        AcceptedAnswer.objects.create(question=self.q_short, value="น้ำ")
+        AcceptedAnswer.objects.create(question=self.q_short, kind="numeric", value="3.14", tolerance=0.01)
+        self.room = Room.objects.create(name="Class", owner=self.teacher)
+        RoomMembership.objects.create(room=self.room, user=self.student, role=RoomMembership.ROLE_STUDENT)
+        RoomQuizAssignment.objects.create(room=self.room, quiz=self.quiz, assigned_by=self.teacher)
+        self.client.login(username="student", password="studpw")
+
+    def _submit(self, text):
+        attempt = Attempt.objects.create(quiz=self.quiz, taker=self.student)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("take_quiz:submit_quiz", args=[attempt.id]), {
+                f"question_{self.q_mcq.id}": str(self.right.id), f"question_{self.q_short.id}": text,
+            })
+        attempt.refresh_from_db()
+        return attempt
+
+    def test_rules(self):
+        from myapp.answer_rules import Matcher, normalize
+
+        # sara am typed as nikhahit + sara aa, tone mark typed last
+        self.assertEqual(normalize("นํ้า"), normalize("น้ำ"))
+        self.assertEqual(normalize("  ٣ Apples  "), "3 apples")
+        self.assertEqual(normalize("مُحَمَّد"), normalize("محمد"))
+        match = Matcher([("exact", "H2O", 0), ("numeric", "1,000", 0.5), ("regex", r"(?i)h\d?o", 0)])
+        self.assertTrue(match(" H2O "))
+        self.assertTrue(match("๑๐๐๐.๔"))
+        self.assertTrue(match("HO"))
+        self.assertFalse(match("h2o2"))
+        self.assertFalse(match("1001"))
+
+    def test_regex_rules_are_limited_to_a_safe_subset(self):
+        import time
+        from myapp.answer_rules import REGEX_MAX_TEXT, Matcher, check_rule
+
+        for pattern in (r"(a+)+$", r"(a|ab)*c", r"(a?){30}a{30}", r"(\w)\1", r"\s*\w*\s*\w*x"):
+            with self.assertRaises(ValueError, msg=pattern):
+                check_rule("regex", pattern)
+        check_rule("regex", r"\d{4}-\d{2}-\d{2}|(cat|dog)s?")
+
+        # an unsafe pattern stored before the check never runs
+        match = Matcher([("regex", r"(a+)+$", 0), ("regex", r"a+b?", 0)])
+        start = time.perf_counter()
+        self.assertFalse(match("a" * 40 + "!"))
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertTrue(match("a" * REGEX_MAX_TEXT))
+        self.assertFalse(match("a" * (REGEX_MAX_TEXT + 1)))
+
+        self.client.login(username="teacher", password="teachpw")
+        resp = self.client.post(reverse("create_quiz:edit_question", args=[self.q_short.id]), {
+            "text": self.q_short.text, "qtype": "short", "order": 2, "accepted_answers": "regex: (a+)+",
+        })
+        self.assertContains(resp, "line 1: a quantifier inside a repeated group")
+
+    def test_submit_scores_short_answers(self):
+        self.assertEqual(self._submit("  ๓.๑๔๕ ").score, 100.0)
+        wrong = self._submit("fire")
+        self.assertEqual(wrong.score, 50.0)
+        self.assertIs(wrong.answers.get(question=self.q_short).is_correct, False)
+        self.assertEqual(self._submit("นํ้า").score, 100.0)
+
+        result = self.client.get(reverse("take_quiz:attempt_result", args=[wrong.id]))
+        self.assertEqual([row["is_correct"] for row in result.context["answers"]], [True, False])
+
+    def test_short_question_without_rules_is_left_out(self):
+        self.q_short.accepted_answers.all().delete()
+        self.q_short.save()  # bumps the content version
+        attempt = self._submit("anything")
+        self.assertEqual(attempt.score, 100.0)
+        self.assertIsNone(attempt.answers.get(question=self.q_short).is_correct)
+
+    def test_editing_rules_regrades_stored_answers(self):
+        fire = self._submit("fire")
+        water = self._submit("น้ำ")
+        self.assertEqual(GradebookEntry.objects.get(student=self.student).best_score, 100.0)
+
+        self.client.login(username="teacher", password="teachpw")
+        resp = self.client.post(reverse("create_quiz:edit_question", args=[self.q_short.id]), {
+            "text": self.q_short.text, "qtype": "short", "order": 2,
+            "accepted_answers": "exact: fire\nnumeric: 3.14 ± 0.01",
+        })
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(
+            list(self.q_short.accepted_answers.values_list("kind", "value")),
+            [("exact", "fire"), ("numeric", "3.14")],
+        )
+        fire.refresh_from_db()
+        water.refresh_from_db()
+        self.assertEqual((fire.score, water.score), (100.0, 50.0))
+        self.assertIs(water.answers.get(question=self.q_short).is_correct, False)
+        self.assertEqual(GradebookEntry.objects.get(student=self.student).best_score, 100.0)
+
+        bad = self.client.post(reverse("create_quiz:edit_question", args=[self.q_short.id]), {
+            "text": self.q_short.text, "qtype": "short", "order": 2, "accepted_answers": "regex: (",
+        })
+        self.assertEqual(bad.status_code, 200)
+        self.assertContains(bad, "line 1: invalid regular expression")
+
+    def test_large_backlog_is_deferred_to_the_command(self):
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+
+        attempt = self._submit("ice")
+        self.client.login(username="teacher", password="teachpw")
+        with mock.patch("take_quiz.regrade.POOL_THRESHOLD", 1):
+            resp = self.client.post(reverse("create_quiz:edit_question", args=[self.q_short.id]), {
+                "text": self.q_short.text, "qtype": "short", "order": 2, "accepted_answers": "ice",
+            }, follow=True)
+        self.assertContains(resp, "too many stored answers to regrade now")
+        self.assertContains(resp, "Regrade pending")
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.score, 50.0)
+
+        out = StringIO()
+        call_command("regrade_short_answers", "--pending", stdout=out)
+        self.assertIn(f"Question {self.q_short.id}: 1 answer(s), 1 verdict(s) changed", out.getvalue())
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.score, 100.0)
+        self.q_short.refresh_from_db()
+        self.assertFalse(self.q_short.needs_regrade)
+
+    def test_batch_regrade_in_a_process_pool(self):
+        from unittest import mock
+        from take_quiz.regrade import regrade_question
+
+        attempts = [self._submit(text) for text in ("fire", "3.14", "ice", "fire ")]
+        AcceptedAnswer.objects.create(question=self.q_short, kind="regex", value=r"fire|ice")
+        with mock.patch("take_quiz.regrade.POOL_THRESHOLD", 0):
+            result = regrade_question(self.q_short, workers=2, chunk_size=1)
+        self.assertEqual((result.answers, result.changed, result.rescored), (4, 3, 3))
+        for attempt in attempts:
+            attempt.refresh_from_db()
+            self.assertEqual(attempt.score, 100.0)
+        # nothing left to change
+        self.assertEqual(regrade_question(self.q_short, workers=0), (4, 0, 0))
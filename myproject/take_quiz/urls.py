@@ -1,12 +1,17 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# the exam hot paths have async twins for ASGI deployments
+hot = async_views if getattr(settings, "TAKEQ_ASYNC_VIEWS", False) else views
 
 app_name = "take_quiz"
 
 urlpatterns = [
     path("", views.QuizListView.as_view(), name="quiz_list"),
     path("<int:quiz_id>/start/", views.start_quiz, name="start_quiz"),
-    path("<int:quiz_id>/take/<int:attempt_id>/", views.take_quiz, name="take_quiz"),
-    path("<int:attempt_id>/submit/", views.submit_quiz, name="submit_quiz"),
-    path("attempt/<int:attempt_id>/result/", views.attempt_result, name="attempt_result"),
+    path("<int:quiz_id>/take/<int:attempt_id>/", hot.take_quiz, name="take_quiz"),
+    path("<int:attempt_id>/submit/", hot.submit_quiz, name="submit_quiz"),
+    path("<int:attempt_id>/autosave/", views.autosave, name="autosave"),
+    path("attempt/<int:attempt_id>/result/", hot.attempt_result, name="attempt_result"),
 ]
\ No newline at end of file
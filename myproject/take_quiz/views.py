@@ -4,10 +4,22 @@ from django.views import View
 from django.views.generic import ListView
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
 from django.utils.decorators import method_decorator
-from myapp.models import Quiz, Question, Choice, Attempt, Answer
+from myapp.models import Quiz, Question, Choice, Attempt, Answer, new_seed
+from myapp.answer_key import get_answer_key
+from myapp.layout import attempt_layout, draw_question_ids
+from myapp.live import publish_on_commit, quiz_channel
+from .autosave import flush_interval, record as record_autosave, saved_answers
+from .grading import finalize_attempt
+from .deadlines import deadline_for, is_late, clip_to_deadline
+from .catalogue import catalogue_page
+from .paper import get_paper_html
+from .queue import queued_submit_enabled, enqueue_submission, is_pending
 
 from django.db import transaction
+import json
 
 @method_decorator(login_required, name='dispatch')
 class QuizListView(ListView):
@@ -16,98 +28,147 @@ class QuizListView(ListView):
     context_object_name = "quizzes"
 
     def get_queryset(self):
-        return Quiz.objects.filter(is_published=True).order_by("-created_at")
+        self.page = catalogue_page(self.request.user, self.request.GET.get("after"))
+        return self.page.quizzes
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["next_cursor"] = self.page.next_cursor
+        context["is_first_page"] = "after" not in self.request.GET
+        return context
 
 
 @login_required
 def start_quiz(request, quiz_id):
     quiz = get_object_or_404(Quiz, pk=quiz_id, is_published=True)
-    attempt = Attempt.objects.create(quiz=quiz, taker=request.user, started_at=timezone.now())
+    now = timezone.now()
+    seed = new_seed()
+    attempt = Attempt.objects.create(
+        quiz=quiz, taker=request.user, started_at=now, deadline=deadline_for(quiz, now),
+        seed=seed, question_ids=draw_question_ids(get_answer_key(quiz), quiz, seed),
+    )
+    publish_on_commit(quiz_channel(quiz.id), {
+        "type": "started", "attempt": attempt.id, "quiz": quiz.id, "taker": request.user.pk,
+        "started_at": attempt.started_at, "deadline": attempt.deadline,
+    })
     return redirect(reverse("take_quiz:take_quiz", args=[quiz.id, attempt.id]))
 
 
 @login_required
 def take_quiz(request, quiz_id, attempt_id):
-    quiz = get_object_or_404(Quiz, pk=quiz_id, is_published=True)
-    attempt = get_object_or_404(Attempt, pk=attempt_id, quiz=quiz, taker=request.user)
+    attempt = get_object_or_404(
+        Attempt.objects.select_related("quiz"),
+        pk=attempt_id, quiz_id=quiz_id, quiz__is_published=True, taker=request.user,
+    )
+    quiz = attempt.quiz
 
-    if attempt.finished_at:
+    if attempt.finished_at or attempt.submitted_at:
         return redirect("take_quiz:attempt_result", attempt_id=attempt.id)
 
-    questions = quiz.questions.all().order_by("order", "id").prefetch_related("choices")
-
     return render(request, "take_quiz/take_quiz.html", {
         "quiz": quiz,
         "attempt": attempt,
-        "questions": questions,
+        "paper": get_paper_html(attempt),
+        "saved_answers": saved_answers(attempt),
+        "autosave_ms": int(flush_interval() * 1000),
     })
 
 
 @login_required
-@transaction.atomic
+@require_POST
+def autosave(request, attempt_id):
+    """
+    Expect JSON body: {"answers": {"<question_id>": "<choice id or text>", ...}}
+    holding only the answers changed since the last autosave.
+    """
+    attempt = get_object_or_404(
+        Attempt.objects.select_related("quiz"), pk=attempt_id, taker=request.user
+    )
+    if attempt.finished_at or attempt.submitted_at or is_late(attempt, timezone.now()):
+        return JsonResponse({"ok": False, "error": "attempt closed"}, status=409)
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+        deltas = payload.get("answers", {})
+        if not isinstance(deltas, dict):
+            return JsonResponse({"ok": False, "error": "invalid payload"}, status=400)
+    except Exception:
+        return JsonResponse({"ok": False, "error": "invalid json"}, status=400)
+
+    written = record_autosave(attempt, deltas)
+    return JsonResponse({"ok": True, "saved": written})
+
+
+@login_required
 def submit_quiz(request, attempt_id):
     if request.method != "POST":
         return redirect("home")
 
-    attempt = get_object_or_404(Attempt, pk=attempt_id, taker=request.user)
-    quiz = attempt.quiz
+    attempt = get_object_or_404(
+        Attempt.objects.select_related("quiz"), pk=attempt_id, taker=request.user
+    )
 
-    if attempt.finished_at:
+    if attempt.finished_at or attempt.submitted_at:
         return redirect("take_quiz:attempt_result", attempt_id=attempt.id)
 
-    questions = quiz.questions.all().order_by("order", "id").prefetch_related("choices")
-
-    correct_count = 0
-    total_questions = questions.count()
-
-    attempt.answers.all().delete()
-
-    for q in questions:
-        field_name = f"question_{q.id}"
-        selected_choice_id = request.POST.get(field_name)
-        if q.qtype == "mcq":
-            selected_choice = None
-            if selected_choice_id:
-                try:
-                    selected_choice = q.choices.get(pk=int(selected_choice_id))
-                except (Choice.DoesNotExist, ValueError):
-                    selected_choice = None
-
-            Answer.objects.create(
-                attempt=attempt,
-                question=q,
-                selected_choice=selected_choice,
-                text=""
-            )
-            if selected_choice and selected_choice.is_correct:
-                correct_count += 1
-        else:
-            text_ans = request.POST.get(field_name, "").strip()
-            Answer.objects.create(
-                attempt=attempt,
-                question=q,
-                selected_choice=None,
-                text=text_ans
-            )
-
-    mcq_questions = questions.filter(qtype="mcq").count()
-    if mcq_questions > 0:
-        score = (correct_count / mcq_questions) * 100.0
-    else:
-        score = None
+    close_attempt(attempt, request.POST)
+    return redirect("take_quiz:attempt_result", attempt_id=attempt.id)
 
-    attempt.finished_at = timezone.now()
-    attempt.score = score
-    attempt.save()
 
-    return redirect("take_quiz:attempt_result", attempt_id=attempt.id)
+@transaction.atomic
+def close_attempt(attempt, post):
+    """Grade (or queue) the submitted ``post`` data of an open attempt."""
+    now = timezone.now()
+    if is_late(attempt, now):
+        # too late: ignore the POST and close with what was already saved
+        finalize_attempt(attempt, {}, finished_at=attempt.deadline)
+    elif queued_submit_enabled():
+        enqueue_submission(attempt, post)
+    else:
+        finalize_attempt(attempt, post.dict(), finished_at=clip_to_deadline(attempt, now))
 
 
 @login_required
 def attempt_result(request, attempt_id):
-    attempt = get_object_or_404(Attempt, pk=attempt_id, taker=request.user)
-    answers = attempt.answers.select_related("question", "selected_choice").all()
+    attempt = get_object_or_404(
+        Attempt.objects.select_related("quiz"), pk=attempt_id, taker=request.user
+    )
+    if attempt.finished_at is None and is_pending(attempt):
+        return render(request, "take_quiz/grading.html", {"attempt": attempt})
+
+    key = get_answer_key(attempt.quiz)
+    stored = {
+        qid: (choice_id, text, is_correct)
+        for qid, choice_id, text, is_correct in attempt.answers.values_list(
+            "question_id", "selected_choice_id", "text", "is_correct"
+        )
+    }
     return render(request, "take_quiz/result.html", {
         "attempt": attempt,
-        "answers": answers,
+        "answers": result_rows(key, attempt_layout(attempt, key), stored),
     })
+
+
+def result_rows(key, layout, stored):
+    """
+    Rows of the result page, in the attempt's ``layout`` order, from the
+    answer key and ``{question_id: (choice_id, text, is_correct)}``.
+    Short answers are marked only when their question has accepted answers.
+    """
+    answers = []
+    for i in layout.positions:
+        qid = key.question_ids[i]
+        choice_id, text, verdict = stored.get(qid, (None, "", None))
+        choice_text = None
+        if choice_id in key.choice_ids[i]:
+            choice_text = key.choice_texts[i][key.choice_ids[i].index(choice_id)]
+        if key.qtypes[i] == "mcq":
+            is_correct = choice_id is not None and choice_id == key.correct_choice_ids[i]
+        else:
+            is_correct = bool(verdict) if key.accepted[i] else None
+        answers.append({
+            "question_text": key.question_texts[i],
+            "choice_text": choice_text,
+            "is_correct": is_correct,
+            "text": text,
+        })
+    return answers